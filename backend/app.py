@@ -1,21 +1,43 @@
+import io
 import os
-from datetime import datetime, timedelta, timezone
+import shutil
+from datetime import datetime, timezone
 import time
 import traceback
+import uuid
+import zipfile
+import tempfile
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, send_file
 from flask_cors import CORS
-from pymongo import MongoClient, DESCENDING
-from werkzeug.security import generate_password_hash, check_password_hash
-import jwt
+from pymongo import DESCENDING
+from pymongo.errors import BulkWriteError
+from werkzeug.exceptions import RequestEntityTooLarge
 from dotenv import load_dotenv
 from bson import ObjectId
 
-from ocr import image_paths_from_upload, ocr_text_from_paths
-from parse import parse_fields
+from db import LazyDatabase, close_client
+from auth import (create_token, decode_token, bearer_token, lookup_user, user_cache, hasher,
+	login_limiter, AuthBusy, LOGINS)
+import payloads
+from pipeline import run_pipeline, extract_document, fill_from_filenames
+from pairing import PoIndex, AUTO_PAIR_MIN_SCORE
 from compare import compare_docs
-from export import generate_csv_from_records
+from jobs import JobQueue, QueueFull
+from batch import BatchError, BATCH_CONCURRENCY, BATCH_MAX_PAIRS, extract_zip, pair_files
+from ocr_cache import get_cache
+from stats import StatsStore
+from blobstore import get_blob_store, blob_names, offload_document, get_text, get_bytes, put_bytes
+from ocr import page_refs_from_upload, load_page_image, shutdown_pool, PREPROCESSORS
+from ocr_engine import get_engine
+from zonal import ZonalOcr, OCR_ZONAL
+from uploads import UploadRequest, store_upload, ARCHIVE_EXTS, UPLOAD_MAX_REQUEST_MB, MB
+from storage import StorageManager, batch_dir, TMP_DIRNAME
+import metrics
+from indexes import ensure_indexes, MONGO_ENSURE_INDEXES
+from export import generate_csv_from_records, iter_csv_export, gzip_chunks, write_columnar_export, EXPORT_PROJECTION, COLUMNAR_FORMATS, COLUMNAR_TABLES
 
 # Logging
 logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s %(name)s: %(message)s')
@@ -23,35 +45,33 @@ logger = logging.getLogger('backend')
 
 load_dotenv()
 
-MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/futurix')
-JWT_SECRET = os.getenv('JWT_SECRET', 'dev-secret-change-me')
-JWT_EXP_MIN = int(os.getenv('JWT_EXP_MIN', '60'))
 UPLOAD_DIR = os.getenv('UPLOAD_DIR', os.path.join(os.path.dirname(__file__), 'uploads'))
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '500'))
 
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-client = MongoClient(MONGO_URI)
-db = client.get_default_database()
+# connects on first use in each process (db.py), so importing the app is fork-safe
+db = LazyDatabase()
 users = db['users']
 verifications = db['verifications']
 exports = db['exports']
+stats_store = StatsStore(db)
+blob_store = get_blob_store(db)
+po_index = PoIndex(db)
+zonal_ocr = ZonalOcr(db)
+storage = StorageManager(db, blob_store, UPLOAD_DIR)
 
 app = Flask(__name__)
+# multipart file parts stream to disk (hashed, size-limited) while the body is parsed
+app.request_class = UploadRequest
+UploadRequest.tmp_dir = os.path.join(UPLOAD_DIR, TMP_DIRNAME)
+app.config['MAX_CONTENT_LENGTH'] = UPLOAD_MAX_REQUEST_MB * MB
 CORS(app, resources={r"/api/*": {"origins": os.getenv('CORS_ORIGIN', '*')}}, supports_credentials=True, allow_headers=["*"], methods=["GET","POST","OPTIONS"], expose_headers=["*"])
 
 
-def create_token(user_id: str):
-	now = datetime.now(timezone.utc)
-	payload = {
-		"sub": str(user_id),
-		"exp": now + timedelta(minutes=JWT_EXP_MIN),
-		"iat": now,
-	}
-	return jwt.encode(payload, JWT_SECRET, algorithm="HS256")
-
-
-def decode_token(token: str):
-	return jwt.decode(token, JWT_SECRET, algorithms=["HS256"])  # raises on error
+def _auth_busy(e: AuthBusy):
+	logger.warning("Auth rejected, hashing pool busy: %s", e)
+	resp = jsonify({"error": "auth_busy"})
+	resp.headers['Retry-After'] = '1'
+	return resp, 503
 
 
 @app.post('/api/auth/signup')
@@ -65,16 +85,19 @@ def signup():
 			return jsonify({"error": "email and password required"}), 400
 		if users.find_one({"email": email}):
 			return jsonify({"error": "email already registered"}), 409
-		hash_ = generate_password_hash(password)
-		res = users.insert_one({
+		hash_ = hasher.hash(password)
+		user = {
 			"email": email,
 			"name": name,
 			"password": hash_,
 			"createdAt": datetime.now(timezone.utc),
-		})
-		token = create_token(res.inserted_id)
+		}
+		user["_id"] = users.insert_one(user).inserted_id
+		token = create_token(user)
 		logger.info("User signup: email=%s", email)
-		return jsonify({"token": token, "user": {"id": str(res.inserted_id), "email": email, "name": name}}), 200
+		return jsonify({"token": token, "user": user_cache.put(user)}), 200
+	except AuthBusy as e:
+		return _auth_busy(e)
 	except Exception as e:
 		logger.exception("Signup error: %s", e)
 		return jsonify({"error": "signup_failed"}), 500
@@ -88,13 +111,26 @@ def login():
 		password = data.get('password') or ''
 		if not email or not password:
 			return jsonify({"error": "email and password required"}), 400
+		wait = login_limiter.hit(email)
+		if wait:
+			LOGINS.inc(result='throttled')
+			logger.warning("Login throttled for email=%s", email)
+			resp = jsonify({"error": "too_many_attempts"})
+			resp.headers['Retry-After'] = str(int(wait + 0.5))
+			return resp, 429
 		user = users.find_one({"email": email})
-		if not user or not check_password_hash(user.get('password', ''), password):
+		if not user or not hasher.check(user.get('password', ''), password):
+			LOGINS.inc(result='invalid')
 			logger.warning("Login failed for email=%s", email)
 			return jsonify({"error": "invalid credentials"}), 401
-		token = create_token(user['_id'])
+		login_limiter.reset(email)
+		LOGINS.inc(result='ok')
+		token = create_token(user)
 		logger.info("User login: email=%s", email)
-		return jsonify({"token": token, "user": {"id": str(user['_id']), "email": user['email'], "name": user.get('name', '')}}), 200
+		return jsonify({"token": token, "user": user_cache.put(user)}), 200
+	except AuthBusy as e:
+		LOGINS.inc(result='busy')
+		return _auth_busy(e)
 	except Exception as e:
 		logger.exception("Login error: %s", e)
 		return jsonify({"error": "login_failed"}), 500
@@ -103,28 +139,166 @@ def login():
 @app.get('/api/auth/me')
 def me():
 	try:
-		auth = request.headers.get('Authorization', '')
-		if not auth.startswith('Bearer '):
+		token = bearer_token(request.headers.get('Authorization'))
+		if token is None:
 			return jsonify({"error": "missing token"}), 401
-		token = auth.split(' ', 1)[1]
 		try:
 			payload = decode_token(token)
 		except Exception as e:
 			logger.warning("Token decode failed: %s", e)
 			return jsonify({"error": "invalid token"}), 401
-		user = users.find_one({"_id": ObjectId(payload['sub'])})
+		user = lookup_user(users, payload['sub'])
 		if not user:
 			return jsonify({"error": "user not found"}), 404
-		return jsonify({"user": {"id": str(user['_id']), "email": user['email'], "name": user.get('name', '')}}), 200
+		return jsonify({"user": user}), 200
 	except Exception as e:
 		logger.exception("Me endpoint error: %s", e)
 		return jsonify({"error": "authentication_failed"}), 500
 
 
+ALLOWED_EXTS = {'.pdf', '.png', '.jpg', '.jpeg', '.tif', '.tiff'}
+
+# job state is shared through Mongo so any server process can answer a poll
+verify_jobs = JobQueue(store=db['verify_jobs'])
+
+STAGE_SECONDS = metrics.histogram('verify_stage_seconds', 'Per-stage latency of a verification', ['stage'])
+VERIFY_SECONDS = metrics.histogram('verify_seconds', 'Upload-to-saved latency of a verification')
+HTTP_SECONDS = metrics.histogram('http_request_seconds', 'API request latency', ['endpoint', 'method', 'status'])
+metrics.callback('verify_queue_depth', 'Verification jobs waiting for a worker', verify_jobs.depth)
+metrics.callback('ocr_cache_events_total', 'OCR cache events (hits, misses, pageHits, pageMisses, writes, evictions)',
+	lambda: get_cache().stats() if get_cache() is not None else {}, kind='counter', labelname='event')
+metrics.callback('storage_upload_bytes', 'Size of UPLOAD_DIR at the last storage sweep', lambda: storage.upload_bytes, aggregate='max')
+
+_STAGES = (('save', 't0', 't_saved'), ('images', 't_saved', 't_images'), ('ocr', 't_images', 't_ocr'),
+	('parse', 't_ocr', 't_parse'), ('compare', 't_parse', 't_compare'), ('db', 't_compare', 't_saved_db'))
+
+
+def _observe_stages(stage: dict) -> None:
+	for name, start, end in _STAGES:
+		if start in stage and end in stage:
+			STAGE_SECONDS.observe(stage[end] - stage[start], stage=name)
+	if 't0' in stage and 't_saved_db' in stage:
+		VERIFY_SECONDS.observe(stage['t_saved_db'] - stage['t0'])
+
+
+@app.before_request
+def _start_timer():
+	request.environ['invosync.t0'] = time.perf_counter()
+
+
+@app.before_request
+def _parse_uploads():
+	# parse multipart bodies up front so an oversized upload becomes a 413, not a view's 500
+	if request.method == 'POST' and request.mimetype == 'multipart/form-data':
+		request.files
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def _too_large(e):
+	return jsonify({"error": "upload_too_large", "detail": e.description}), 413
+
+
+@app.after_request
+def _observe_request(resp):
+	t0 = request.environ.get('invosync.t0')
+	if t0 is not None and request.url_rule is not None:
+		HTTP_SECONDS.observe(time.perf_counter() - t0, endpoint=request.url_rule.rule, method=request.method, status=resp.status_code)
+	return resp
+
+
+def _bad_preprocess():
+	return jsonify({"error": "preprocess must be one of: " + ", ".join(sorted(PREPROCESSORS))}), 400
+
+
+def _zonal():
+	"""The zonal OCR engine when ?zonal=1 (default OCR_ZONAL), else None."""
+	return zonal_ocr if request.args.get('zonal', '1' if OCR_ZONAL else '0') == '1' else None
+
+
+def _save_upload(file, dest: str = UPLOAD_DIR) -> str:
+	"""Content-addressed path of an upload (identical files share one copy)."""
+	return store_upload(file, dest, ALLOWED_EXTS)
+
+
+def _verification_doc(out: dict, inv_path: str, po_path: str, batch_id: str | None = None) -> dict:
+	doc = {
+		"invoice": dict(out['invoice']),
+		"po": dict(out['po']),
+		"result": out['result'],
+		"createdAt": datetime.now(timezone.utc),
+	}
+	if batch_id:
+		doc["batchId"] = batch_id
+	# raw OCR text (and the source files) live in the blob store; the document keeps references
+	offload_document(blob_store, doc, inv_path, po_path)
+	return doc
+
+
+def _record_stats(docs: list) -> None:
+	try:
+		stats_store.record(docs)
+	except Exception as e:
+		# counters are reconciled by a rebuild; never fail the verification over them
+		logger.warning("Stats counter update failed: %s", e)
+
+
+def _verify_saved(inv_path: str, po_path: str, inv_name: str, po_name: str, debug: bool = False, stage: dict | None = None, preprocess: str | None = None, zonal=None) -> dict:
+	"""Run the pipeline on an already-saved pair, persist it and build the /verify payload."""
+	stage = stage if stage is not None else {'t0': time.perf_counter(), 't_saved': time.perf_counter()}
+	out = run_pipeline(inv_path, po_path, inv_name, po_name, stage, preprocess, zonal)
+	inv_data, po_data, result = out['invoice'], out['po'], out['result']
+	inv_text, po_text = out['invoiceText'], out['poText']
+
+	doc = _verification_doc(out, inv_path, po_path)
+	created = doc["createdAt"]
+	res = verifications.insert_one(doc)
+	logger.info("Saved verification id=%s", res.inserted_id)
+	_record_stats([doc])
+	stage['t_saved_db'] = time.perf_counter()
+	_observe_stages(stage)
+
+	payload = {
+		"id": str(res.inserted_id),
+		"invoice": inv_data,
+		"po": po_data,
+		"result": result,
+		"createdAt": created.isoformat()
+	}
+	if debug:
+		payload["debug"] = {
+			"invoiceTextLen": len(inv_text or ''),
+			"poTextLen": len(po_text or ''),
+			"invoiceTextHead": '\n'.join((inv_text or '').splitlines()[:15]),
+			"poTextHead": '\n'.join((po_text or '').splitlines()[:15]),
+			"invoiceParsed": inv_data,
+			"poParsed": po_data,
+			"ocrPagesMs": {k: [{"ms": pg["ms"], "error": pg["error"]} for pg in v] for k, v in out['ocrPages'].items()},
+			"timingsMs": {
+				"save": int((stage['t_saved']-stage['t0'])*1000),
+				"images": int((stage['t_images']-stage['t_saved'])*1000),
+				"ocr": int((stage['t_ocr']-stage['t_images'])*1000),
+				"parse": int((stage['t_parse']-stage['t_ocr'])*1000),
+				"compare": int((stage['t_compare']-stage['t_parse'])*1000),
+				"db": int((stage['t_saved_db']-stage['t_compare'])*1000),
+			},
+		}
+	return payload
+
+
 @app.post('/api/verify')
 def verify():
-	"""Accepts multipart/form-data with fields invoice and po. Returns extraction and comparison."""
+	"""Accepts multipart/form-data with fields invoice and po. Returns extraction and comparison.
+
+	With ?async=1 the pair is queued for the OCR workers and a job id is returned immediately;
+	poll GET /api/verify/jobs/<id> for the result. ?preprocess=basic|cv picks the OCR preprocessing;
+	?zonal=1 OCRs only the header and line-item regions of vendors with a learned layout.
+	"""
 	debug = request.args.get('debug') == '1'
+	run_async = request.args.get('async') == '1'
+	preprocess = request.args.get('preprocess') or None
+	if preprocess is not None and preprocess not in PREPROCESSORS:
+		return _bad_preprocess()
+	zonal = _zonal()
 	stage = {}
 	try:
 		stage['t0'] = time.perf_counter()
@@ -135,99 +309,24 @@ def verify():
 		po_file = request.files['po']
 		logger.info("/verify received files invoice=%s po=%s", invoice_file.filename, po_file.filename)
 
-		allowed = {'.pdf', '.png', '.jpg', '.jpeg', '.tif', '.tiff'}
-		def _save(file):
-			name = file.filename or 'upload'
-			ext = os.path.splitext(name)[1].lower()
-			if ext not in allowed:
-				raise ValueError('Unsupported file type: ' + ext)
-			path = os.path.join(UPLOAD_DIR, f"{datetime.now(timezone.utc).timestamp()}_{name}")
-			file.save(path)
-			return path
-
-		inv_path = _save(invoice_file)
-		po_path = _save(po_file)
+		inv_path = _save_upload(invoice_file)
+		po_path = _save_upload(po_file)
 		logger.info("Saved uploads to inv_path=%s po_path=%s", inv_path, po_path)
 		stage['t_saved'] = time.perf_counter()
 
-		inv_imgs = image_paths_from_upload(inv_path)
-		po_imgs = image_paths_from_upload(po_path)
-		logger.info("Image paths expanded inv=%s po=%s", inv_imgs, po_imgs)
-		stage['t_images'] = time.perf_counter()
-
-		inv_text = ocr_text_from_paths(inv_imgs)
-		po_text = ocr_text_from_paths(po_imgs)
-		logger.info("OCR text lens inv=%d po=%d", len(inv_text or ''), len(po_text or ''))
-		# Log first few lines for quick inspection
-		logger.info("OCR inv head: %s", (inv_text or '').splitlines()[:5])
-		logger.info("OCR po head: %s", (po_text or '').splitlines()[:5])
-		stage['t_ocr'] = time.perf_counter()
-
-		inv_data = parse_fields(inv_text)
-		po_data = parse_fields(po_text)
-		logger.info("Parsed invoice fields: %s", {k: inv_data.get(k) for k in ['vendor','invoiceNo','orderId','date','total']})
-		logger.info("Parsed PO fields: %s", {k: po_data.get(k) for k in ['vendor','invoiceNo','orderId','date','total']})
-		stage['t_parse'] = time.perf_counter()
-
-		# Heuristics from file names if fields missing
-		import re as _re
-		def _from_name(name: str, pats):
-			for p in pats:
-				m = _re.search(p, name, _re.I)
-				if m:
-					return m.group(1)
-			return ''
 		inv_name = invoice_file.filename or ''
 		po_name = po_file.filename or ''
-		if not inv_data.get('invoiceNo'):
-			inv_data['invoiceNo'] = _from_name(inv_name, [r"inv(?:oice)?[_-]?([A-Za-z0-9-_/]+)", r"([A-Za-z]{2,}-?\d+)"])
-		if not inv_data.get('orderId'):
-			inv_data['orderId'] = _from_name(inv_name, [r"po[_-]?([A-Za-z0-9-_/]+)"])
-		if not po_data.get('orderId'):
-			po_data['orderId'] = _from_name(po_name, [r"po[_-]?([A-Za-z0-9-_/]+)", r"order[_-]?id[_-]?([A-Za-z0-9-_/]+)"])
-		if not po_data.get('invoiceNo'):
-			po_data['invoiceNo'] = _from_name(po_name, [r"inv(?:oice)?[_-]?([A-Za-z0-9-_/]+)"])
-
-		result = compare_docs(inv_data, po_data)
-		logger.info("Compare result: status=%s, discrepancies=%d", result.get('status'), len(result.get('discrepancies', [])))
-		stage['t_compare'] = time.perf_counter()
-
-		created = datetime.now(timezone.utc)
-		doc = {
-			"invoice": inv_data,
-			"po": po_data,
-			"result": result,
-			"createdAt": created,
-		}
-		res = verifications.insert_one(doc)
-		logger.info("Saved verification id=%s", res.inserted_id)
-		stage['t_saved_db'] = time.perf_counter()
-
-		payload = {
-			"id": str(res.inserted_id),
-			"invoice": inv_data,
-			"po": po_data,
-			"result": result,
-			"createdAt": created.isoformat()
-		}
-		if debug:
-			payload["debug"] = {
-				"invoiceTextLen": len(inv_text or ''),
-				"poTextLen": len(po_text or ''),
-				"invoiceTextHead": '\n'.join((inv_text or '').splitlines()[:15]),
-				"poTextHead": '\n'.join((po_text or '').splitlines()[:15]),
-				"invoiceParsed": inv_data,
-				"poParsed": po_data,
-				"timingsMs": {
-					"save": int((stage['t_saved']-stage['t0'])*1000),
-					"images": int((stage['t_images']-stage['t_saved'])*1000),
-					"ocr": int((stage['t_ocr']-stage['t_images'])*1000),
-					"parse": int((stage['t_parse']-stage['t_ocr'])*1000),
-					"compare": int((stage['t_compare']-stage['t_parse'])*1000),
-					"db": int((stage['t_saved_db']-stage['t_compare'])*1000),
-				},
-			}
-		return jsonify(payload)
+		if run_async:
+			try:
+				job_id = verify_jobs.submit(_verify_saved, inv_path, po_path, inv_name, po_name, debug, None, preprocess, zonal)
+			except QueueFull as e:
+				logger.warning("/verify rejected, queue full: %s", e)
+				resp = jsonify({"error": "queue_full"})
+				resp.headers['Retry-After'] = '5'
+				return resp, 503
+			return jsonify({"jobId": job_id, "status": "queued", "queueDepth": verify_jobs.depth()}), 202
+
+		return jsonify(_verify_saved(inv_path, po_path, inv_name, po_name, debug, stage, preprocess, zonal))
 	except Exception as e:
 		logger.exception("/verify error: %s", e)
 		if debug:
@@ -235,86 +334,383 @@ def verify():
 		return jsonify({"error": "verification_failed"}), 500
 
 
+@app.get('/api/verify/jobs/<job_id>')
+def verify_job(job_id: str):
+	job = verify_jobs.get(job_id)
+	if not job:
+		return jsonify({"error": "not found"}), 404
+	out = {
+		"id": job["id"],
+		"status": job["status"],
+		"submittedAt": job["submittedAt"].isoformat() if job["submittedAt"] else None,
+		"startedAt": job["startedAt"].isoformat() if job["startedAt"] else None,
+		"finishedAt": job["finishedAt"].isoformat() if job["finishedAt"] else None,
+	}
+	if job["status"] == "done":
+		out["result"] = job["result"]
+	elif job["status"] == "failed":
+		out["error"] = "verification_failed"
+	elif job["status"] == "queued" and job.get("queueDepth") is not None:
+		out["queueDepth"] = job["queueDepth"]
+	return jsonify(out), 200
+
+
+def _verify_batch(pairs: list, unpaired: list, batch_id: str, preprocess: str | None = None, zonal=None) -> dict:
+	"""Run every pair through the pipeline with bounded concurrency and bulk-insert the results."""
+	t0 = time.perf_counter()
+
+	def run(pair):
+		(inv_name, inv_path, _), (po_name, po_path, _), _key = pair
+		stage = {'t0': time.perf_counter(), 't_saved': time.perf_counter()}
+		out = run_pipeline(inv_path, po_path, os.path.basename(inv_name), os.path.basename(po_name), stage=stage, preprocess=preprocess, zonal=zonal)
+		_observe_stages(stage)
+		return _verification_doc(out, inv_path, po_path, batch_id)
+
+	items = []
+	docs = []
+	with ThreadPoolExecutor(max_workers=max(1, BATCH_CONCURRENCY), thread_name_prefix='batch') as pool:
+		futures = [pool.submit(run, pair) for pair in pairs]
+		for pair, fut in zip(pairs, futures):
+			item = {"invoice": pair[0][0], "po": pair[1][0], "key": pair[2], "id": None, "status": None, "discrepancies": None, "error": None}
+			try:
+				doc = fut.result()
+				docs.append((item, doc))
+				item["status"] = doc["result"].get("status")
+				item["discrepancies"] = len(doc["result"].get("discrepancies", []))
+			except Exception as e:
+				logger.exception("Batch %s pair %s / %s failed: %s", batch_id, pair[0][0], pair[1][0], e)
+				item["error"] = "verification_failed"
+			items.append(item)
+
+	if docs:
+		failed = {}
+		try:
+			verifications.insert_many([d for _, d in docs], ordered=False)
+		except BulkWriteError as e:
+			# unordered: every other document was inserted
+			failed = {err["index"]: err for err in e.details.get("writeErrors", [])}
+			logger.error("Batch %s: %d of %d results not stored: %s", batch_id, len(failed), len(docs), [err.get("errmsg") for err in failed.values()])
+		inserted = []
+		for i, (item, doc) in enumerate(docs):
+			if i in failed:
+				item["error"] = "store_failed"
+				item["status"] = None
+				item["discrepancies"] = None
+			else:
+				# insert_many sets _id on the documents it is given
+				item["id"] = str(doc["_id"])
+				inserted.append(doc)
+		_record_stats(inserted)
+
+	counts = {}
+	for item in items:
+		key = item["status"] or "failed"
+		counts[key] = counts.get(key, 0) + 1
+	logger.info("Batch %s verified %d pairs in %.1fs: %s", batch_id, len(items), time.perf_counter() - t0, counts)
+	return {"batchId": batch_id, "pairs": items, "unpaired": unpaired, "counts": counts}
+
+
+@app.post('/api/verify/batch')
+def verify_batch():
+	"""Verify many invoice/PO pairs in one request.
+
+	multipart/form-data with either an ``archive`` zip, a list of ``files``, or parallel
+	``invoice``/``po`` lists. Files are paired by order id / name (inv_1001.pdf <-> po_1001.pdf,
+	or invoices/ and pos/ folders); explicit invoice/po lists fall back to upload order.
+	With ?async=1 the batch is queued and a job id is returned.
+	"""
+	run_async = request.args.get('async') == '1'
+	preprocess = request.args.get('preprocess') or None
+	if preprocess is not None and preprocess not in PREPROCESSORS:
+		return _bad_preprocess()
+	zonal = _zonal()
+	batch_id = uuid.uuid4().hex
+	work_dir = batch_dir(UPLOAD_DIR, batch_id)
+	try:
+		os.makedirs(work_dir, exist_ok=True)
+		files = []
+		by_position = False
+		archive = request.files.get('archive')
+		if archive is not None:
+			archive_path = store_upload(archive, work_dir, ARCHIVE_EXTS)
+			files = extract_zip(archive_path, work_dir, ALLOWED_EXTS)
+			os.remove(archive_path)
+		else:
+			for field, kind in (('files', None), ('invoice', 'invoice'), ('po', 'po')):
+				for f in request.files.getlist(field):
+					name = f.filename or 'upload'
+					path = _save_upload(f)
+					files.append((name, path, kind))
+			by_position = bool(request.files.getlist('invoice'))
+		pairs, unpaired = pair_files(files, by_position=by_position)
+		if not pairs:
+			shutil.rmtree(work_dir, ignore_errors=True)
+			return jsonify({"error": "no invoice/po pairs found", "unpaired": unpaired}), 400
+		if len(pairs) > BATCH_MAX_PAIRS:
+			shutil.rmtree(work_dir, ignore_errors=True)
+			return jsonify({"error": f"batch exceeds {BATCH_MAX_PAIRS} pairs"}), 400
+		logger.info("/verify/batch %s: %d pairs, %d unpaired", batch_id, len(pairs), len(unpaired))
+
+		if run_async:
+			try:
+				job_id = verify_jobs.submit(_verify_batch, pairs, unpaired, batch_id, preprocess, zonal)
+			except QueueFull as e:
+				logger.warning("/verify/batch rejected, queue full: %s", e)
+				shutil.rmtree(work_dir, ignore_errors=True)
+				resp = jsonify({"error": "queue_full"})
+				resp.headers['Retry-After'] = '5'
+				return resp, 503
+			return jsonify({"jobId": job_id, "batchId": batch_id, "status": "queued", "pairs": len(pairs), "unpaired": unpaired}), 202
+		return jsonify(_verify_batch(pairs, unpaired, batch_id, preprocess, zonal))
+	except (BatchError, ValueError, zipfile.BadZipFile) as e:
+		shutil.rmtree(work_dir, ignore_errors=True)
+		return jsonify({"error": str(e)}), 400
+	except Exception as e:
+		logger.exception("/verify/batch error: %s", e)
+		return jsonify({"error": "verification_failed"}), 500
+
+
+def _ingest_po(path: str, name: str, preprocess: str | None = None, zonal=None) -> dict:
+	out = extract_document(path, preprocess, zonal)
+	po_data = out['data']
+	fill_from_filenames({}, po_data, '', name)
+	blobs = offload_document(blob_store, {"po": dict(po_data)}, None, path)["blobs"]
+	entry = po_index.add(po_data, blobs, name)
+	return {"id": str(entry["_id"]), "name": name, "orderId": entry["orderId"], "vendor": entry["vendor"], "lineItems": len(po_data.get("line_items") or [])}
+
+
+@app.post('/api/pos')
+def ingest_pos():
+	"""Parse and index purchase orders (multipart ``po`` files) for /api/verify/auto."""
+	files = request.files.getlist('po')
+	preprocess = request.args.get('preprocess') or None
+	if preprocess is not None and preprocess not in PREPROCESSORS:
+		return _bad_preprocess()
+	zonal = _zonal()
+	if not files:
+		return jsonify({"error": "at least one 'po' file is required"}), 400
+	items = []
+	for f in files:
+		try:
+			items.append(_ingest_po(_save_upload(f), f.filename or '', preprocess, zonal))
+		except ValueError as e:
+			items.append({"name": f.filename, "error": str(e)})
+		except Exception as e:
+			logger.exception("PO ingest failed for %s: %s", f.filename, e)
+			items.append({"name": f.filename, "error": "ingest_failed"})
+	return jsonify({"items": items})
+
+
+def _verify_auto_one(path: str, name: str, preprocess: str | None = None, zonal=None) -> dict:
+	out = extract_document(path, preprocess, zonal)
+	inv_data = out['data']
+	fill_from_filenames(inv_data, {}, name, '')
+	cands = po_index.candidates(inv_data)
+	item = {
+		"invoice": name,
+		"orderId": inv_data.get("orderId"),
+		"candidates": [{"poId": str(c["_id"]), "orderId": c.get("orderId"), "vendor": c.get("vendor"), "score": round(c["score"], 1)} for c in cands],
+		"poId": None,
+		"id": None,
+		"result": None,
+	}
+	for cand in cands:
+		if cand["score"] < AUTO_PAIR_MIN_SCORE:
+			break
+		entry = po_index.claim(cand["_id"])
+		if entry is None:
+			continue  # paired by a concurrent request
+		inv_doc = {"invoice": dict(inv_data), "po": {}}
+		offload_document(blob_store, inv_doc, path, None)
+		doc = {
+			"invoice": inv_doc["invoice"],
+			"po": entry["po"],
+			"result": compare_docs(inv_data, entry["po"]),
+			"createdAt": datetime.now(timezone.utc),
+			"blobs": {**{k: v for k, v in (entry.get("blobs") or {}).items() if k.startswith("po")}, **inv_doc["blobs"]},
+			"poIndexId": entry["_id"],
+			"pairScore": cand["score"],
+		}
+		doc["artifacts"] = blob_names(doc["blobs"])
+		res = verifications.insert_one(doc)
+		po_index.attach_verification(entry["_id"], res.inserted_id)
+		_record_stats([doc])
+		item.update({"poId": str(entry["_id"]), "id": str(res.inserted_id), "result": doc["result"]})
+		break
+	return item
+
+
+@app.post('/api/verify/auto')
+def verify_auto():
+	"""Verify invoices uploaded without a PO (multipart ``invoice`` files, one or many).
+
+	Each invoice is paired with the best open PO from /api/pos when the match score reaches
+	AUTO_PAIR_MIN_SCORE; otherwise only the ranked candidates are returned.
+	"""
+	files = request.files.getlist('invoice')
+	preprocess = request.args.get('preprocess') or None
+	if preprocess is not None and preprocess not in PREPROCESSORS:
+		return _bad_preprocess()
+	zonal = _zonal()
+	if not files:
+		return jsonify({"error": "at least one 'invoice' file is required"}), 400
+	items = []
+	for f in files:
+		try:
+			items.append(_verify_auto_one(_save_upload(f), f.filename or '', preprocess, zonal))
+		except ValueError as e:
+			items.append({"invoice": f.filename, "error": str(e)})
+		except Exception as e:
+			logger.exception("/verify/auto failed for %s: %s", f.filename, e)
+			items.append({"invoice": f.filename, "error": "verification_failed"})
+	return jsonify({"items": items})
+
+
 @app.get('/api/stats')
 def stats():
-	matched = verifications.count_documents({"result.status": "matched"})
-	partial = verifications.count_documents({"result.status": "partial"})
-	mismatch = verifications.count_documents({"result.status": "mismatch"})
-	pending = 0
-	last_doc = verifications.find_one(sort=[("createdAt", DESCENDING)])
-	last_export = last_doc.get('createdAt') if last_doc else None
-	return jsonify({
-		"matched": matched,
-		"discrepancies": partial + mismatch,
-		"pending": pending,
-		"lastExport": last_export.isoformat() if last_export else None,
-	})
+	return jsonify(stats_store.summary())
+
+
+@app.get('/api/stats/rollups')
+def stats_rollups():
+	by = request.args.get('by', 'day')
+	if by not in ('day', 'vendor'):
+		return jsonify({"error": "by must be day or vendor"}), 400
+	limit = int(request.args.get('limit', '30'))
+	return jsonify({"by": by, "items": stats_store.rollups(by, limit)})
 
 
 @app.get('/api/records')
 def records():
-	limit = int(request.args.get('limit', '20'))
-	items = []
-	for d in verifications.find().sort("createdAt", DESCENDING).limit(limit):
-		inv = d.get("invoice", {})
-		po = d.get("po", {})
-		items.append({
-			"id": str(d["_id"]),
-			"vendor": (inv.get("vendor") or po.get("vendor") or ""),
-			"invoiceNo": inv.get("invoiceNo") or po.get("invoiceNo"),
-			"orderId": inv.get("orderId") or po.get("orderId"),
-			"invoiceDate": inv.get("date"),
-			"amount": inv.get("total"),
-			"status": d.get("result", {}).get("status"),
-			"createdAt": d.get("createdAt").isoformat() if d.get("createdAt") else None,
-		})
-	return jsonify({"items": items})
+	"""Newest-first record list with keyset pagination (see payloads.records_query)."""
+	try:
+		query, sort, limit, after, before = payloads.records_query(request.args)
+	except Exception:
+		return jsonify({"error": "invalid limit or cursor"}), 400
+	docs = list(verifications.find(query, payloads.RECORD_LIST_PROJECTION).sort(sort).limit(limit + 1))
+	return jsonify(payloads.records_page(docs, limit, after, before))
 
 
 @app.get('/api/records/<rid>')
 def record_detail(rid: str):
+	"""One verification. Raw OCR text is loaded from the blob store only with ?raw=1."""
+	try:
+		obj_id = ObjectId(rid)
+	except Exception:
+		return jsonify({"error": "invalid id"}), 400
+	with_raw = request.args.get('raw') == '1'
+	d = verifications.find_one({"_id": obj_id}, payloads.record_projection(with_raw))
+	if not d:
+		return jsonify({"error": "not found"}), 404
+	raw = {side: get_text(blob_store, ref) for side, ref in payloads.raw_refs(d).items()} if with_raw else None
+	return jsonify(payloads.record_detail(d, raw))
+
+
+@app.get('/api/records/<rid>/pages/<side>/<int:index>')
+def record_page_image(rid: str, side: str, index: int):
+	"""PNG of one page of the stored invoice/PO, rendered on first request and kept in the blob store."""
+	if side not in ('invoice', 'po'):
+		return jsonify({"error": "side must be invoice or po"}), 400
 	try:
 		obj_id = ObjectId(rid)
 	except Exception:
 		return jsonify({"error": "invalid id"}), 400
-	d = verifications.find_one({"_id": obj_id})
+	d = verifications.find_one({"_id": obj_id}, {"blobs": 1})
 	if not d:
 		return jsonify({"error": "not found"}), 404
-	return jsonify({
-		"id": str(d["_id"]),
-		"invoice": d.get("invoice"),
-		"po": d.get("po"),
-		"result": d.get("result"),
-		"createdAt": d.get("createdAt").isoformat() if d.get("createdAt") else None,
-	})
+	blobs = d.get("blobs") or {}
+	page_ref = (blobs.get(side + "Pages") or {}).get(str(index))
+	data = get_bytes(blob_store, page_ref) if page_ref else None
+	if data is None:
+		source = blobs.get(side + "Source")
+		if not source:
+			return jsonify({"error": "source not stored"}), 404
+		with blob_store.local_path(source["key"] + source["ext"]) as path:
+			if path is None:
+				return jsonify({"error": "source not stored"}), 404
+			refs = page_refs_from_upload(path)
+			if index < 0 or index >= len(refs):
+				return jsonify({"error": "page out of range"}), 404
+			buf = io.BytesIO()
+			load_page_image(refs[index]).save(buf, format='PNG')
+		data = buf.getvalue()
+		page_ref = put_bytes(blob_store, data, '.png')
+		verifications.update_one({"_id": obj_id}, {"$set": {f"blobs.{side}Pages.{index}": page_ref},
+			"$addToSet": {"artifacts": page_ref["key"] + page_ref["ext"]}})
+	return send_file(io.BytesIO(data), mimetype='image/png', download_name=f"{rid}_{side}_p{index}.png")
+
+
+def _export_query(data: dict, with_status: bool = True) -> dict:
+	record_ids = data.get('recordIds', [])
+	date_from = data.get('dateFrom')
+	date_to = data.get('dateTo')
+	status_filter = data.get('status') if with_status else None
+
+	# Build query
+	query = {}
+	if record_ids:
+		query['_id'] = {'$in': [ObjectId(rid) for rid in record_ids]}
+	if date_from or date_to:
+		date_q = {}
+		if date_from:
+			date_q['$gte'] = datetime.fromisoformat(date_from.replace('Z', '+00:00'))
+		if date_to:
+			date_q['$lte'] = datetime.fromisoformat(date_to.replace('Z', '+00:00'))
+		if date_q:
+			query['createdAt'] = date_q
+	if status_filter:
+		query['result.status'] = status_filter
+	return query
+
+
+def _stream_export(query: dict, export_type: str, history_type: str, filename_prefix: str):
+	"""Chunked text/csv response fed from a projected Mongo cursor (?stream=1, optionally &gzip=1)."""
+	if not verifications.find_one(query, {"_id": 1}):
+		return jsonify({"error": "no records found"}), 404
+	use_gzip = request.args.get('gzip') == '1'
+	cursor = verifications.find(query, EXPORT_PROJECTION).sort("createdAt", DESCENDING).batch_size(EXPORT_BATCH_SIZE)
+	seen = {"records": 0}
+
+	def _records():
+		for d in cursor:
+			seen["records"] += 1
+			yield d
+
+	def _body():
+		try:
+			chunks = iter_csv_export(_records(), export_type=export_type)
+			yield from (gzip_chunks(chunks) if use_gzip else chunks)
+		finally:
+			cursor.close()
+			exports.insert_one({
+				"type": history_type,
+				"recordCount": seen["records"],
+				"createdAt": datetime.now(timezone.utc),
+				"query": query,
+				"streamed": True,
+			})
+			logger.info("Streamed %s export: %d records", history_type, seen["records"])
+
+	filename = f"{filename_prefix}_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.csv"
+	headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+	if use_gzip:
+		headers["Content-Encoding"] = "gzip"
+	return Response(_body(), mimetype='text/csv', headers=headers)
 
 
 @app.post('/api/export/csv')
 def export_csv():
-	"""Generate corrected invoice CSV from selected records."""
+	"""Generate corrected invoice CSV from selected records.
+
+	With ?stream=1 the CSV is streamed as a chunked text/csv download instead of a JSON body.
+	"""
 	try:
 		data = request.get_json(force=True) or {}
-		record_ids = data.get('recordIds', [])
-		date_from = data.get('dateFrom')
-		date_to = data.get('dateTo')
-		status_filter = data.get('status')
-
-		# Build query
-		query = {}
-		if record_ids:
-			query['_id'] = {'$in': [ObjectId(rid) for rid in record_ids]}
-		if date_from or date_to:
-			date_q = {}
-			if date_from:
-				date_q['$gte'] = datetime.fromisoformat(date_from.replace('Z', '+00:00'))
-			if date_to:
-				date_q['$lte'] = datetime.fromisoformat(date_to.replace('Z', '+00:00'))
-			if date_q:
-				query['createdAt'] = date_q
-		if status_filter:
-			query['result.status'] = status_filter
-
-		records = list(verifications.find(query).sort("createdAt", DESCENDING))
+		query = _export_query(data)
+		if request.args.get('stream') == '1':
+			return _stream_export(query, "corrected", "corrected_invoice", "corrected_invoice")
+
+		records = list(verifications.find(query, EXPORT_PROJECTION).sort("createdAt", DESCENDING))
 		if not records:
 			return jsonify({"error": "no records found"}), 404
 
@@ -339,26 +735,17 @@ def export_csv():
 
 @app.post('/api/export/report')
 def export_report():
-	"""Generate discrepancy report CSV from selected records."""
+	"""Generate discrepancy report CSV from selected records.
+
+	With ?stream=1 the CSV is streamed as a chunked text/csv download instead of a JSON body.
+	"""
 	try:
 		data = request.get_json(force=True) or {}
-		record_ids = data.get('recordIds', [])
-		date_from = data.get('dateFrom')
-		date_to = data.get('dateTo')
-
-		query = {}
-		if record_ids:
-			query['_id'] = {'$in': [ObjectId(rid) for rid in record_ids]}
-		if date_from or date_to:
-			date_q = {}
-			if date_from:
-				date_q['$gte'] = datetime.fromisoformat(date_from.replace('Z', '+00:00'))
-			if date_to:
-				date_q['$lte'] = datetime.fromisoformat(date_to.replace('Z', '+00:00'))
-			if date_q:
-				query['createdAt'] = date_q
-
-		records = list(verifications.find(query).sort("createdAt", DESCENDING))
+		query = _export_query(data, with_status=False)
+		if request.args.get('stream') == '1':
+			return _stream_export(query, "report", "discrepancy_report", "discrepancy_report")
+
+		records = list(verifications.find(query, EXPORT_PROJECTION).sort("createdAt", DESCENDING))
 		if not records:
 			return jsonify({"error": "no records found"}), 404
 
@@ -380,19 +767,62 @@ def export_report():
 		return jsonify({"error": "export_failed"}), 500
 
 
+@app.post('/api/export/columnar')
+def export_columnar():
+	"""Typed Parquet / Arrow IPC export for analytics.
+
+	Query: format=parquet|arrow, table=lines|summary|report. Body: same filters as /api/export/csv.
+	"""
+	try:
+		fmt = request.args.get('format', 'parquet')
+		table = request.args.get('table', 'lines')
+		if fmt not in COLUMNAR_FORMATS or table not in COLUMNAR_TABLES:
+			return jsonify({"error": "format must be parquet|arrow and table lines|summary|report"}), 400
+		data = request.get_json(force=True, silent=True) or {}
+		query = _export_query(data, with_status=table != "report")
+		if not verifications.find_one(query, {"_id": 1}):
+			return jsonify({"error": "no records found"}), 404
+
+		cursor = verifications.find(query, EXPORT_PROJECTION).sort("createdAt", DESCENDING).batch_size(EXPORT_BATCH_SIZE)
+		seen = {"records": 0}
+
+		def _records():
+			for d in cursor:
+				seen["records"] += 1
+				yield d
+
+		out = tempfile.SpooledTemporaryFile(max_size=32 * 1024 * 1024)
+		try:
+			rows = write_columnar_export(_records(), out, fmt=fmt, table=table)
+		except RuntimeError as e:
+			# pyarrow not installed
+			return jsonify({"error": str(e)}), 400
+		finally:
+			cursor.close()
+		out.seek(0)
+
+		exports.insert_one({
+			"type": f"{table}_{fmt}",
+			# records read, as for the CSV exports; lines/report tables have one row per item/mismatch
+			"recordCount": seen["records"],
+			"rowCount": rows,
+			"createdAt": datetime.now(timezone.utc),
+			"query": query
+		})
+		mimetype, ext = COLUMNAR_FORMATS[fmt]
+		logger.info("Columnar export generated: table=%s format=%s records=%d rows=%d", table, fmt, seen["records"], rows)
+		return send_file(out, mimetype=mimetype, as_attachment=True, download_name=f"{table}_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.{ext}")
+	except Exception as e:
+		logger.exception("Export columnar error: %s", e)
+		return jsonify({"error": "export_failed"}), 500
+
+
 @app.get('/api/export/history')
 def export_history():
 	"""Get export history."""
 	try:
 		limit = int(request.args.get('limit', '20'))
-		items = []
-		for d in exports.find().sort("createdAt", DESCENDING).limit(limit):
-			items.append({
-				"id": str(d["_id"]),
-				"type": d.get("type"),
-				"recordCount": d.get("recordCount", 0),
-				"createdAt": d.get("createdAt").isoformat() if d.get("createdAt") else None,
-			})
+		items = [payloads.export_item(d) for d in exports.find().sort("createdAt", DESCENDING).limit(limit)]
 		return jsonify({"items": items}), 200
 	except Exception as e:
 		logger.exception("Export history error: %s", e)
@@ -403,8 +833,53 @@ def export_history():
 def clear_records():
 	if request.headers.get('X-Admin-Key') != os.getenv('ADMIN_KEY', 'dev'):
 		return jsonify({"error": "unauthorized"}), 401
-	res = verifications.delete_many({})
-	return jsonify({"deleted": res.deleted_count})
+	# blobs and uploads no remaining record or indexed PO uses are deleted with the records
+	out = storage.delete_records({})
+	stats_store.reset()
+	return jsonify(out)
+
+
+@app.post('/api/admin/storage/sweep')
+def sweep_storage():
+	"""Run a storage sweep now (retention, quota, orphaned blobs) and return its report."""
+	if request.headers.get('X-Admin-Key') != os.getenv('ADMIN_KEY', 'dev'):
+		return jsonify({"error": "unauthorized"}), 401
+	return jsonify(storage.sweep())
+
+
+@app.post('/api/admin/stats/rebuild')
+def rebuild_stats():
+	if request.headers.get('X-Admin-Key') != os.getenv('ADMIN_KEY', 'dev'):
+		return jsonify({"error": "unauthorized"}), 401
+	n = stats_store.rebuild()
+	return jsonify({"rebuilt": True, "verifications": n})
+
+
+@app.get('/api/admin/ocr-cache')
+def ocr_cache_stats():
+	if request.headers.get('X-Admin-Key') != os.getenv('ADMIN_KEY', 'dev'):
+		return jsonify({"error": "unauthorized"}), 401
+	cache = get_cache()
+	if cache is None:
+		return jsonify({"enabled": False})
+	return jsonify({"enabled": True, **cache.stats()})
+
+
+@app.get('/api/ocr/health')
+def ocr_health():
+	"""Runs a tiny recognition on this process's OCR engine; 503 when OCR cannot run."""
+	engine = get_engine()
+	if engine is None:
+		return jsonify({"engine": None, "ok": False, "error": "no OCR engine installed"}), 503
+	out = engine.health()
+	return jsonify(out), 200 if out["ok"] else 503
+
+
+@app.get('/api/metrics')
+def metrics_endpoint():
+	"""Prometheus text exposition of the server's metrics: merged over all worker processes when
+	METRICS_MULTIPROC_DIR is set (as serve.py does), otherwise this process's own."""
+	return Response(metrics.render(), mimetype=None, content_type=metrics.CONTENT_TYPE)
 
 
 @app.get('/api/health')
@@ -412,5 +887,36 @@ def health():
 	return jsonify({"ok": True})
 
 
+_initialized_pid: int | None = None
+
+
+def create_app() -> Flask:
+	"""The app, with this process's one-time setup done: upload dir, indexes, abandoned jobs, stats counters, storage sweeper.
+
+	Servers call this in each worker (``gunicorn 'app:create_app()'``, see serve.py); it is
+	idempotent within a process. Importing the module alone does no I/O.
+	"""
+	global _initialized_pid
+	if _initialized_pid != os.getpid():
+		_initialized_pid = os.getpid()
+		os.makedirs(UPLOAD_DIR, exist_ok=True)
+		if MONGO_ENSURE_INDEXES:
+			ensure_indexes(db)
+		verify_jobs.recover()
+		stats_store.materialize()
+		storage.start()
+	return app
+
+
+def shutdown_app() -> None:
+	"""Graceful stop: finish queued verifications, then release OCR workers and the Mongo client."""
+	verify_jobs.shutdown(wait=True, drain=True)
+	storage.stop()
+	hasher.shutdown()
+	shutdown_pool()
+	close_client()
+
+
 if __name__ == '__main__':
-	app.run(host='0.0.0.0', port=int(os.getenv('PORT', '5000')), debug=True)
+	# development server (single process, reloader); python serve.py for production
+	create_app().run(host='0.0.0.0', port=int(os.getenv('PORT', '5000')), debug=True)
@@ -0,0 +1,234 @@
+"""Async read API: python async_api.py (or uvicorn async_api:app)
+
+The read-heavy JSON routes of app.py on asyncio and Motor, so many concurrent dashboard polls
+share one event loop per process instead of each holding a gunicorn thread while it waits on Mongo:
+
+  GET /api/records, /api/records/<rid>, /api/stats, /api/export/history, /api/auth/me
+  GET /api/health, /api/metrics
+
+Payloads come from the same helpers as the Flask routes (payloads.py, stats.summary_payload,
+auth.py), so either server answers these routes identically. Work without an async client
+(reading raw OCR text from the blob store) runs on a bounded pool of ASYNC_BLOCKING_THREADS
+threads. Uploads, OCR, exports and admin routes stay on the Flask pools; serve.py runs this app
+as its ``async`` role and the proxy sends ASYNC_ROUTES here.
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+import dataclasses
+import decimal
+import uuid
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Any, Dict
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import DESCENDING
+from werkzeug.http import http_date
+
+try:
+	from motor.motor_asyncio import AsyncIOMotorClient  # type: ignore
+	from starlette.applications import Starlette  # type: ignore
+	from starlette.middleware import Middleware  # type: ignore
+	from starlette.middleware.base import BaseHTTPMiddleware  # type: ignore
+	from starlette.middleware.cors import CORSMiddleware  # type: ignore
+	from starlette.requests import Request  # type: ignore
+	from starlette.responses import Response  # type: ignore
+	from starlette.routing import Route  # type: ignore
+except Exception:  # pragma: no cover
+	AsyncIOMotorClient = None  # type: ignore
+	Starlette = Request = Response = None  # type: ignore
+
+load_dotenv()
+
+import db as dbmod  # noqa: E402
+import metrics  # noqa: E402
+import payloads  # noqa: E402
+from auth import bearer_token, decode_token, lookup_user_async  # noqa: E402
+from blobstore import get_blob_store, get_text  # noqa: E402
+from stats import STATS_CACHE_TTL_SEC, GLOBAL_ID, summary_payload  # noqa: E402
+
+logger = logging.getLogger('async_api')
+
+# threads for blocking calls (blob store reads, stats rebuilds); bounds what one process runs off-loop
+ASYNC_BLOCKING_THREADS = int(os.getenv('ASYNC_BLOCKING_THREADS', '8'))
+
+HTTP_SECONDS = metrics.histogram('http_request_seconds', 'API request latency', ['endpoint', 'method', 'status'])
+
+_blocking = ThreadPoolExecutor(max_workers=max(1, ASYNC_BLOCKING_THREADS), thread_name_prefix='async-blocking')
+# sync handles for the blocking calls only; they connect on first use (db.py)
+_sync_db = dbmod.LazyDatabase()
+_stats_cache: Dict[str, Any] = {"at": 0.0, "out": None}
+
+
+def _json_default(o: Any) -> Any:
+	# what Flask's jsonify does with these types, so both servers emit the same bytes
+	if isinstance(o, date):
+		return http_date(o)
+	if isinstance(o, (decimal.Decimal, uuid.UUID)):
+		return str(o)
+	if dataclasses.is_dataclass(o) and not isinstance(o, type):
+		return dataclasses.asdict(o)
+	raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _json(payload: Any, status: int = 200) -> Response:
+	body = json.dumps(payload, default=_json_default, ensure_ascii=True, sort_keys=True, separators=(",", ":")) + "\n"
+	return Response(body, status_code=status, media_type="application/json")
+
+
+async def _run_blocking(fn, *args):
+	return await asyncio.get_running_loop().run_in_executor(_blocking, fn, *args)
+
+
+def _load_raw(refs: Dict[str, Any]) -> Dict[str, str | None]:
+	store = get_blob_store(_sync_db)
+	return {side: get_text(store, ref) for side, ref in refs.items()}
+
+
+async def records(request: Request):
+	try:
+		query, sort, limit, after, before = payloads.records_query(request.query_params)
+	except Exception:
+		return _json({"error": "invalid limit or cursor"}, 400)
+	db = request.app.state.db
+	docs = await db['verifications'].find(query, payloads.RECORD_LIST_PROJECTION, sort=sort, limit=limit + 1).to_list(limit + 1)
+	return _json(payloads.records_page(docs, limit, after, before))
+
+
+async def record_detail(request: Request):
+	try:
+		obj_id = ObjectId(request.path_params['rid'])
+	except Exception:
+		return _json({"error": "invalid id"}, 400)
+	with_raw = request.query_params.get('raw') == '1'
+	d = await request.app.state.db['verifications'].find_one({"_id": obj_id}, payloads.record_projection(with_raw))
+	if not d:
+		return _json({"error": "not found"}, 404)
+	raw = None
+	if with_raw:
+		refs = payloads.raw_refs(d)
+		raw = await _run_blocking(_load_raw, refs) if refs else {}
+	return _json(payloads.record_detail(d, raw))
+
+
+async def stats(request: Request):
+	now = time.monotonic()
+	if _stats_cache["out"] is not None and now - _stats_cache["at"] < STATS_CACHE_TTL_SEC:
+		return _json(_stats_cache["out"])
+	# the Flask workers materialize the counters at startup (StatsStore.materialize)
+	out = summary_payload(await request.app.state.db['stats_counters'].find_one({"_id": GLOBAL_ID}) or {})
+	_stats_cache["out"], _stats_cache["at"] = out, now
+	return _json(out)
+
+
+async def export_history(request: Request):
+	try:
+		limit = int(request.query_params.get('limit', '20'))
+		docs = await request.app.state.db['exports'].find({}, sort=[("createdAt", DESCENDING)], limit=limit).to_list(None)
+		return _json({"items": [payloads.export_item(d) for d in docs]})
+	except Exception as e:
+		logger.exception("Export history error: %s", e)
+		return _json({"error": "history_failed"}, 500)
+
+
+async def me(request: Request):
+	try:
+		token = bearer_token(request.headers.get('Authorization'))
+		if token is None:
+			return _json({"error": "missing token"}, 401)
+		try:
+			payload = decode_token(token)
+		except Exception as e:
+			logger.warning("Token decode failed: %s", e)
+			return _json({"error": "invalid token"}, 401)
+		user = await lookup_user_async(request.app.state.db['users'], payload['sub'])
+		if not user:
+			return _json({"error": "user not found"}, 404)
+		return _json({"user": user})
+	except Exception as e:
+		logger.exception("Me endpoint error: %s", e)
+		return _json({"error": "authentication_failed"}, 500)
+
+
+async def metrics_endpoint(request: Request):
+	return Response(metrics.render(), headers={"Content-Type": metrics.CONTENT_TYPE})
+
+
+async def health(request: Request):
+	return _json({"ok": True})
+
+
+ROUTES = (
+	('/api/records', records),
+	('/api/records/{rid}', record_detail),
+	('/api/stats', stats),
+	('/api/export/history', export_history),
+	('/api/auth/me', me),
+	('/api/metrics', metrics_endpoint),
+	('/api/health', health),
+)
+
+# path patterns (nginx/PCRE) the proxy routes to this app
+ASYNC_ROUTES = (
+	r'^/api/records$',
+	r'^/api/records/[^/]+$',
+	r'^/api/stats$',
+	r'^/api/export/history$',
+	r'^/api/auth/me$',
+)
+
+# metric labels use the Flask rule of each route, so both servers report the same endpoints
+_RULES = {fn: re.sub(r'\{(\w+)\}', r'<\1>', path) for path, fn in ROUTES}
+
+
+async def _observe_request(request: Request, call_next):
+	t0 = time.perf_counter()
+	resp = await call_next(request)
+	rule = _RULES.get(request.scope.get('endpoint'))
+	if rule is not None:
+		HTTP_SECONDS.observe(time.perf_counter() - t0, endpoint=rule, method=request.method, status=resp.status_code)
+	return resp
+
+
+@asynccontextmanager
+async def _lifespan(app):
+	client = AsyncIOMotorClient(os.getenv('MONGO_URI', dbmod.DEFAULT_URI), **dbmod.client_options())
+	app.state.db = client.get_default_database()
+	logger.info("Async API ready (pid %d, %d blocking threads)", os.getpid(), ASYNC_BLOCKING_THREADS)
+	try:
+		yield
+	finally:
+		client.close()
+		_blocking.shutdown(wait=True)
+		dbmod.close_client()
+
+
+def create_app() -> Starlette:
+	if Starlette is None or AsyncIOMotorClient is None:
+		raise RuntimeError("the async API needs starlette and motor (pip install -r requirements.txt)")
+	return Starlette(
+		routes=[Route(path, fn, methods=['GET']) for path, fn in ROUTES],
+		middleware=[
+			Middleware(CORSMiddleware, allow_origins=[os.getenv('CORS_ORIGIN', '*')], allow_credentials=True,
+				allow_methods=["GET", "OPTIONS"], allow_headers=["*"], expose_headers=["*"]),
+			Middleware(BaseHTTPMiddleware, dispatch=_observe_request),
+		],
+		lifespan=_lifespan,
+	)
+
+
+app = create_app() if Starlette is not None else None
+
+
+if __name__ == '__main__':
+	# python async_api.py  (development; serve.py --role async runs it under uvicorn workers)
+	import uvicorn  # type: ignore
+
+	logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s %(name)s: %(message)s')
+	uvicorn.run('async_api:app', host=os.getenv('SERVE_HOST', '0.0.0.0'), port=int(os.getenv('SERVE_ASYNC_PORT', '5002')))
@@ -0,0 +1,240 @@
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Tuple
+
+import jwt
+from bson import ObjectId
+from dotenv import load_dotenv
+from werkzeug.security import generate_password_hash, check_password_hash
+
+import metrics
+from payloads import user_info
+
+logger = logging.getLogger('auth')
+
+# the signing secret normally comes from .env, and this module may be imported before the app
+# loads it; load_dotenv never overrides variables already set in the environment
+load_dotenv()
+
+JWT_SECRET = os.getenv('JWT_SECRET', 'dev-secret-change-me')
+JWT_EXP_MIN = int(os.getenv('JWT_EXP_MIN', '60'))
+# in-process cache of user records behind /api/auth/me (entries, seconds)
+AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', '10000'))
+AUTH_USER_CACHE_TTL_SEC = float(os.getenv('AUTH_USER_CACHE_TTL_SEC', '60'))
+# how long an unknown (e.g. deleted) user id is remembered as missing
+AUTH_USER_MISS_TTL_SEC = float(os.getenv('AUTH_USER_MISS_TTL_SEC', '10'))
+# password hashing: threads per process, hashes allowed to wait for one, max wait
+AUTH_HASH_THREADS = int(os.getenv('AUTH_HASH_THREADS', '2'))
+AUTH_HASH_QUEUE_MAX = int(os.getenv('AUTH_HASH_QUEUE_MAX', '16'))
+AUTH_HASH_TIMEOUT_SEC = float(os.getenv('AUTH_HASH_TIMEOUT_SEC', '10'))
+# login attempts per account (email) per window; a successful login resets the count
+AUTH_LOGIN_MAX_ATTEMPTS = int(os.getenv('AUTH_LOGIN_MAX_ATTEMPTS', '5'))
+AUTH_LOGIN_WINDOW_SEC = float(os.getenv('AUTH_LOGIN_WINDOW_SEC', '300'))
+
+LOGINS = metrics.counter('auth_logins_total', 'Login attempts by outcome (ok, invalid, throttled, busy)', ['result'])
+
+
+class AuthBusy(Exception):
+	"""Raised when the password-hashing pool has AUTH_HASH_QUEUE_MAX hashes pending."""
+
+
+def create_token(user: Dict[str, Any]) -> str:
+	"""Signed token for a user document; carries its public fields for the frontend."""
+	now = datetime.now(timezone.utc)
+	payload = {
+		"sub": str(user['_id']),
+		"email": user.get('email', ''),
+		"name": user.get('name', ''),
+		"exp": now + timedelta(minutes=JWT_EXP_MIN),
+		"iat": now,
+	}
+	return jwt.encode(payload, JWT_SECRET, algorithm="HS256")
+
+
+def decode_token(token: str) -> Dict[str, Any]:
+	return jwt.decode(token, JWT_SECRET, algorithms=["HS256"])  # raises on error
+
+
+def bearer_token(header: str | None) -> str | None:
+	"""The token of an ``Authorization: Bearer <token>`` header, or None."""
+	if not header or not header.startswith('Bearer '):
+		return None
+	return header.split(' ', 1)[1]
+
+
+class UserCache:
+	"""Bounded TTL cache of public user info (payloads.user_info) keyed by user id.
+
+	Thread-safe LRU; entries expire after ``ttl`` seconds, ids known not to exist after
+	``miss_ttl``. Code that changes a user document calls ``invalidate`` (or ``put`` with the new
+	record); other processes see the change within ``ttl``.
+	"""
+
+	def __init__(self, maxsize: int = AUTH_USER_CACHE_SIZE, ttl: float = AUTH_USER_CACHE_TTL_SEC, miss_ttl: float = AUTH_USER_MISS_TTL_SEC):
+		self.maxsize = max(1, maxsize)
+		self.ttl = ttl
+		self.miss_ttl = miss_ttl
+		self._items: "OrderedDict[str, Tuple[float, Dict[str, Any] | bool]]" = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, user_id: str) -> Dict[str, Any] | bool | None:
+		"""Cached public info, False for an id cached as missing, None if not cached."""
+		with self._lock:
+			item = self._items.get(user_id)
+			if item is None:
+				return None
+			if time.monotonic() - item[0] >= (self.ttl if item[1] else self.miss_ttl):
+				del self._items[user_id]
+				return None
+			self._items.move_to_end(user_id)
+			return item[1]
+
+	def _store(self, user_id: str, value: Dict[str, Any] | bool) -> None:
+		with self._lock:
+			self._items[user_id] = (time.monotonic(), value)
+			self._items.move_to_end(user_id)
+			while len(self._items) > self.maxsize:
+				self._items.popitem(last=False)
+
+	def put(self, user: Dict[str, Any]) -> Dict[str, Any]:
+		"""Cache a user document; returns its public info."""
+		info = user_info(user)
+		self._store(info["id"], info)
+		return info
+
+	def miss(self, user_id: str) -> None:
+		"""Remember that no user has this id."""
+		self._store(str(user_id), False)
+
+	def invalidate(self, user_id: str | None = None) -> None:
+		"""Drop one user (or everything)."""
+		with self._lock:
+			if user_id is None:
+				self._items.clear()
+			else:
+				self._items.pop(str(user_id), None)
+
+	def __len__(self) -> int:
+		return len(self._items)
+
+
+user_cache = UserCache()
+USER_PROJECTION = {"email": 1, "name": 1}
+
+
+def lookup_user(users, user_id: str) -> Dict[str, Any] | None:
+	"""Public info of a user id through ``user_cache`` (None if it does not exist); ``users`` is the pymongo collection."""
+	info = user_cache.get(user_id)
+	if info is None:
+		user = users.find_one({"_id": ObjectId(user_id)}, USER_PROJECTION)
+		if user is None:
+			user_cache.miss(user_id)
+			return None
+		info = user_cache.put(user)
+	return info or None
+
+
+async def lookup_user_async(users, user_id: str) -> Dict[str, Any] | None:
+	"""lookup_user for a Motor collection."""
+	info = user_cache.get(user_id)
+	if info is None:
+		user = await users.find_one({"_id": ObjectId(user_id)}, USER_PROJECTION)
+		if user is None:
+			user_cache.miss(user_id)
+			return None
+		info = user_cache.put(user)
+	return info or None
+
+
+class PasswordHasher:
+	"""Runs password hashing (scrypt/PBKDF2, CPU-bound) on a small bounded thread pool.
+
+	At most ``threads`` hashes run at once per process, so a burst of logins cannot take more
+	cores than that from OCR; beyond ``queue_max`` waiting hashes callers get AuthBusy at once
+	instead of piling up request threads. hashlib releases the GIL while hashing.
+	"""
+
+	def __init__(self, threads: int = AUTH_HASH_THREADS, queue_max: int = AUTH_HASH_QUEUE_MAX, timeout: float = AUTH_HASH_TIMEOUT_SEC):
+		self.threads = max(1, threads)
+		self.timeout = timeout
+		self._slots = threading.BoundedSemaphore(self.threads + max(0, queue_max))
+		self._pool: ThreadPoolExecutor | None = None
+		self._lock = threading.Lock()
+
+	def _executor(self) -> ThreadPoolExecutor:
+		with self._lock:
+			if self._pool is None:
+				self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='auth-hash')
+			return self._pool
+
+	def _run(self, fn, *args):
+		if not self._slots.acquire(blocking=False):
+			raise AuthBusy(f"{self.threads} password hashes running and the queue is full")
+		try:
+			future = self._executor().submit(fn, *args)
+		except BaseException:
+			self._slots.release()
+			raise
+		# the slot is freed when the hash finishes (or is cancelled), not when a caller stops waiting
+		future.add_done_callback(lambda _: self._slots.release())
+		try:
+			return future.result(timeout=self.timeout)
+		except FutureTimeout:
+			future.cancel()
+			raise AuthBusy(f"password hash not done within {self.timeout:.0f}s")
+
+	def hash(self, password: str) -> str:
+		return self._run(generate_password_hash, password)
+
+	def check(self, pwhash: str, password: str) -> bool:
+		return self._run(check_password_hash, pwhash, password)
+
+	def shutdown(self) -> None:
+		with self._lock:
+			if self._pool is not None:
+				self._pool.shutdown(wait=True)
+				self._pool = None
+
+
+class LoginLimiter:
+	"""Per-account (email) login throttle: ``max_attempts`` per sliding ``window`` seconds.
+
+	Every attempt is counted before the password is checked, so concurrent guesses are limited too;
+	``reset`` after a successful login. State is per process: with N workers an account gets up to
+	N x max_attempts tries per window.
+	"""
+
+	def __init__(self, max_attempts: int = AUTH_LOGIN_MAX_ATTEMPTS, window: float = AUTH_LOGIN_WINDOW_SEC, maxsize: int = AUTH_USER_CACHE_SIZE):
+		self.max_attempts = max(1, max_attempts)
+		self.window = window
+		self.maxsize = max(1, maxsize)
+		self._hits: "OrderedDict[str, list]" = OrderedDict()
+		self._lock = threading.Lock()
+
+	def hit(self, key: str) -> float:
+		"""Count an attempt; returns 0 if allowed, else seconds until the next one is."""
+		now = time.monotonic()
+		with self._lock:
+			hits = [t for t in self._hits.get(key, ()) if now - t < self.window]
+			if len(hits) >= self.max_attempts:
+				self._hits[key] = hits
+				return max(1.0, self.window - (now - hits[0]))
+			hits.append(now)
+			self._hits[key] = hits
+			self._hits.move_to_end(key)
+			while len(self._hits) > self.maxsize:
+				self._hits.popitem(last=False)
+			return 0.0
+
+	def reset(self, key: str) -> None:
+		with self._lock:
+			self._hits.pop(key, None)
+
+
+hasher = PasswordHasher()
+login_limiter = LoginLimiter()
@@ -0,0 +1,125 @@
+import os
+import re
+import zipfile
+import logging
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger('batch')
+
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '4'))
+BATCH_MAX_PAIRS = int(os.getenv('BATCH_MAX_PAIRS', '500'))
+BATCH_MAX_UNZIPPED_MB = int(os.getenv('BATCH_MAX_UNZIPPED_MB', '2048'))
+
+# leading "inv"/"invoice" or "po"/"purchase order" token of a file name
+_INVOICE_PREFIX_RE = re.compile(r'^inv(?:oice)?(?:[_\- ]+|(?=\d))', re.I)
+_PO_PREFIX_RE = re.compile(r'^(?:po|purchase[_\- ]?order)(?:[_\- ]+|(?=\d))', re.I)
+# an order id embedded in an invoice name, e.g. inv_1001_po_4500.pdf
+_ORDER_IN_NAME_RE = re.compile(r'(?:^|[_\- ])po[_\- ]?([A-Za-z0-9]+(?:-[A-Za-z0-9]+)*)', re.I)
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9]')
+
+# (display name, saved path, "invoice" | "po" | None)
+BatchFile = Tuple[str, str, str | None]
+
+
+class BatchError(ValueError):
+	"""The uploaded batch is malformed or over the configured limits."""
+
+
+def _norm(s: str) -> str:
+	return _NON_ALNUM_RE.sub('', s.lower())
+
+
+def doc_kind(name: str) -> str | None:
+	"""'invoice' or 'po' from the file name, falling back to its folder (invoices/, pos/)."""
+	stem = os.path.splitext(os.path.basename(name))[0]
+	if _INVOICE_PREFIX_RE.match(stem):
+		return 'invoice'
+	if _PO_PREFIX_RE.match(stem):
+		return 'po'
+	folder = _norm(os.path.basename(os.path.dirname(name)))
+	if folder.startswith('inv'):
+		return 'invoice'
+	if folder in ('po', 'pos') or folder.startswith('purchaseorder'):
+		return 'po'
+	return None
+
+
+def pair_keys(name: str, kind: str) -> List[str]:
+	"""Candidate pairing keys for a file, most specific first."""
+	stem = os.path.splitext(os.path.basename(name))[0]
+	keys = []
+	if kind == 'invoice':
+		m = _ORDER_IN_NAME_RE.search(stem)
+		if m:
+			keys.append(_norm(m.group(1)))
+		rest = _INVOICE_PREFIX_RE.sub('', stem, count=1)
+	else:
+		rest = _PO_PREFIX_RE.sub('', stem, count=1)
+	keys.append(_norm(rest))
+	return [k for k in keys if k]
+
+
+def pair_files(files: List[BatchFile], by_position: bool = False) -> Tuple[List[Tuple[BatchFile, BatchFile, str]], List[str]]:
+	"""Pair invoices with POs by the order id / stem in their names.
+
+	Returns ([(invoice, po, key)], unpaired names). With ``by_position`` (explicit invoice/po
+	fields), whatever is left after name matching is paired in upload order when the counts agree.
+	"""
+	invoices: List[BatchFile] = []
+	pos: Dict[str, List[BatchFile]] = {}
+	po_order: List[BatchFile] = []
+	unpaired: List[str] = []
+	for f in files:
+		kind = f[2] or doc_kind(f[0])
+		if kind == 'invoice':
+			invoices.append((f[0], f[1], 'invoice'))
+		elif kind == 'po':
+			po = (f[0], f[1], 'po')
+			po_order.append(po)
+			for key in pair_keys(f[0], 'po')[:1]:
+				pos.setdefault(key, []).append(po)
+		else:
+			unpaired.append(f[0])
+
+	pairs: List[Tuple[BatchFile, BatchFile, str]] = []
+	used = set()
+	left_inv: List[BatchFile] = []
+	for inv in invoices:
+		for key in pair_keys(inv[0], 'invoice'):
+			cands = [p for p in pos.get(key, []) if id(p) not in used]
+			if cands:
+				used.add(id(cands[0]))
+				pairs.append((inv, cands[0], key))
+				break
+		else:
+			left_inv.append(inv)
+	left_po = [p for p in po_order if id(p) not in used]
+	if by_position and len(left_inv) == len(left_po):
+		pairs.extend((inv, po, '') for inv, po in zip(left_inv, left_po))
+		left_inv, left_po = [], []
+	unpaired.extend(f[0] for f in left_inv + left_po)
+	return pairs, unpaired
+
+
+def extract_zip(archive_path: str, dest: str, allowed_exts: set) -> List[BatchFile]:
+	"""Unpack the supported documents of a zip into ``dest`` (flat, no path traversal)."""
+	out: List[BatchFile] = []
+	total = 0
+	with zipfile.ZipFile(archive_path) as zf:
+		members = [m for m in zf.infolist() if not m.is_dir() and not m.filename.startswith('__MACOSX/')]
+		for i, m in enumerate(members):
+			if os.path.splitext(m.filename)[1].lower() not in allowed_exts:
+				continue
+			total += m.file_size
+			if total > BATCH_MAX_UNZIPPED_MB * 1024 * 1024:
+				raise BatchError(f"archive expands beyond {BATCH_MAX_UNZIPPED_MB} MB")
+			path = os.path.join(dest, f"{i}_{os.path.basename(m.filename)}")
+			with zf.open(m) as src, open(path, 'wb') as dst:
+				while True:
+					chunk = src.read(1 << 20)
+					if not chunk:
+						break
+					dst.write(chunk)
+			out.append((m.filename, path, None))
+	logger.info("Extracted %d documents from %s", len(out), archive_path)
+	return out
@@ -0,0 +1,85 @@
+"""Benchmark: compare_docs across PO sizes vs the previous nested-loop matcher.
+
+Usage: python bench/bench_compare.py [--sizes 10,50,100,500,1000,2000] [--json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import compare  # noqa: E402
+import _legacy_compare  # noqa: E402
+from corpus import make_items  # noqa: E402
+
+
+def _typo(rng: random.Random, name: str) -> str:
+	i = rng.randrange(len(name))
+	return name[:i] + rng.choice('abcdefghijklmnopqrstuvwxyz') + name[i + 1:]
+
+
+def make_pair(rng: random.Random, n: int, typo_rate: float = 0.3, drop_rate: float = 0.05, extra_rate: float = 0.05):
+	"""PO with n lines and an invoice with typos, dropped lines, extra lines and some qty changes."""
+	po_items = make_items(rng, n)
+	inv_items = []
+	for name, qty, price, sub in po_items:
+		if rng.random() < drop_rate:
+			continue
+		if rng.random() < typo_rate:
+			name = _typo(rng, name)
+		if rng.random() < 0.05:
+			qty += 1
+		inv_items.append((name, qty, price, sub))
+	inv_items.extend(make_items(rng, int(n * extra_rate)))
+	rng.shuffle(inv_items)
+	po = {"vendor": "Acme Industrial Supply", "line_items": po_items}
+	inv = {"vendor": "ACME Industrial Supply", "line_items": inv_items}
+	return inv, po
+
+
+def _time(fn, *args, repeat=3):
+	best = float('inf')
+	out = None
+	for _ in range(repeat):
+		t0 = time.perf_counter()
+		out = fn(*args)
+		best = min(best, time.perf_counter() - t0)
+	return best, out
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument('--sizes', default='10,50,100,500,1000,2000')
+	ap.add_argument('--repeat', type=int, default=3)
+	ap.add_argument('--json', action='store_true')
+	args = ap.parse_args()
+	rng = random.Random(11)
+	rows = []
+	for n in [int(x) for x in args.sizes.split(',')]:
+		inv, po = make_pair(rng, n)
+		t_old, r_old = _time(_legacy_compare.compare_docs, inv, po, repeat=args.repeat)
+		t_new, r_new = _time(compare.compare_docs, inv, po, repeat=args.repeat)
+		rows.append({
+			"poLines": n,
+			"invoiceLines": len(inv["line_items"]),
+			"legacyMs": round(t_old * 1000, 2),
+			"currentMs": round(t_new * 1000, 2),
+			"speedup": round(t_old / t_new, 1) if t_new else None,
+			"legacyDiscrepancies": len(r_old["discrepancies"]),
+			"currentDiscrepancies": len(r_new["discrepancies"]),
+		})
+	if args.json:
+		print(json.dumps(rows))
+	else:
+		cols = list(rows[0].keys())
+		print('  '.join(f"{c:>20}" for c in cols))
+		for r in rows:
+			print('  '.join(f"{str(r[c]):>20}" for c in cols))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,283 @@
+"""End-to-end benchmark: synthetic invoice/PO files -> OCR -> parse -> compare -> /api/verify.
+
+Usage: python bench/bench_e2e.py [--pairs 20] [--items 20] [--pages 1] [--format pdf|png] [--noise 0.1]
+       [--image-noise 0.0] [--mismatch-rate 0.1] [--preprocess basic|cv] [--zonal] [--skip-verify] [--cache] [--out run.json] [--baseline prev.json]
+
+Runs against mongomock (no MongoDB needed) with throwaway upload/blob/cache directories. Reports latency
+percentiles and throughput per stage, peak traced memory per stage, max RSS and extraction accuracy
+against the generator's ground truth as JSON; --baseline prints the change against an earlier run.
+The OCR cache is off unless --cache, so repeated runs measure OCR rather than cache hits.
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import resource
+import subprocess
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import numpy as np
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def _summary(samples: List[float], units: int) -> Dict[str, Any]:
+	"""Latency percentiles (ms) and throughput (units per second of summed latency)."""
+	if not samples:
+		return {"n": 0}
+	arr = np.asarray(samples) * 1000
+	total = float(np.sum(samples))
+	return {
+		"n": len(samples),
+		"mean_ms": round(float(arr.mean()), 3),
+		"p50_ms": round(float(np.percentile(arr, 50)), 3),
+		"p90_ms": round(float(np.percentile(arr, 90)), 3),
+		"p99_ms": round(float(np.percentile(arr, 99)), 3),
+		"max_ms": round(float(arr.max()), 3),
+		"throughput_per_s": round(units / total, 3) if total else None,
+	}
+
+
+def _norm(s: Any) -> str:
+	return ' '.join(str(s or '').lower().split())
+
+
+def _item_key(it) -> tuple:
+	# parse_fields splits letter/digit runs ("M10" -> "M 10"), so names compare without spaces
+	name, qty, price, sub = it
+	return (''.join(str(name).lower().split()), int(qty), round(float(price), 2), round(float(sub), 2))
+
+
+class Accuracy:
+	FIELDS = ("vendor", "invoiceNo", "orderId", "date")
+
+	def __init__(self):
+		self.fields = {f: [0, 0] for f in self.FIELDS}
+		self.tp = self.fp = self.fn = 0
+		self.status = [0, 0]
+
+	def add_doc(self, parsed: Dict[str, Any], truth: Dict[str, Any]) -> None:
+		for f in self.FIELDS:
+			if not truth.get(f):
+				continue
+			self.fields[f][1] += 1
+			self.fields[f][0] += _norm(parsed.get(f)) == _norm(truth[f])
+		got = {_item_key(it) for it in parsed.get("line_items") or []}
+		want = {_item_key(it) for it in truth["line_items"]}
+		self.tp += len(got & want)
+		self.fp += len(got - want)
+		self.fn += len(want - got)
+
+	def add_status(self, status: str | None, truth: str) -> None:
+		self.status[1] += 1
+		self.status[0] += status == truth
+
+	def report(self) -> Dict[str, Any]:
+		precision = self.tp / (self.tp + self.fp) if self.tp + self.fp else 0.0
+		recall = self.tp / (self.tp + self.fn) if self.tp + self.fn else 0.0
+		return {
+			"fields": {f: round(ok / n, 4) if n else None for f, (ok, n) in self.fields.items()},
+			"line_items": {
+				"precision": round(precision, 4),
+				"recall": round(recall, 4),
+				"f1": round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+			},
+			"status": round(self.status[0] / self.status[1], 4) if self.status[1] else None,
+		}
+
+
+def _git_rev() -> str | None:
+	try:
+		return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND, capture_output=True, text=True, timeout=5).stdout.strip() or None
+	except Exception:
+		return None
+
+
+def _stage(name: str, memory: Dict[str, Any]):
+	"""Context for one stage: resets the traced-memory peak and records it afterwards."""
+	class _Ctx:
+		def __enter__(self):
+			tracemalloc.reset_peak()
+			return self
+
+		def __exit__(self, *exc):
+			memory[name] = round(tracemalloc.get_traced_memory()[1] / 1e6, 2)
+	return _Ctx()
+
+
+def run(args) -> Dict[str, Any]:
+	work = tempfile.mkdtemp(prefix='invosync-bench-')
+	os.environ['UPLOAD_DIR'] = os.path.join(work, 'uploads')
+	os.environ['BLOB_DIR'] = os.path.join(work, 'blobs')
+	os.environ['OCR_CACHE_DIR'] = os.path.join(work, 'ocr_cache')
+	os.environ['OCR_CACHE_ENABLED'] = '1' if args.cache else '0'
+	os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017/invosync_bench')
+
+	import mongomock
+	import pymongo
+	pymongo.MongoClient = mongomock.MongoClient  # local stand-in; must happen before app is imported
+
+	from render import make_pair_files
+	import ocr
+	from parse import parse_fields
+	from compare import compare_docs
+	from zonal import ZonalOcr
+
+	logging.getLogger().setLevel(logging.WARNING)
+	tess = ocr.tesseract_version()
+	if tess is None:
+		print("warning: tesseract not found; OCR returns no text and accuracy will be 0", file=sys.stderr)
+	rng = random.Random(args.seed)
+	files_dir = os.path.join(work, 'corpus')
+	os.makedirs(files_dir)
+	tracemalloc.start()
+	memory: Dict[str, Any] = {}
+	stages: Dict[str, Any] = {}
+	acc = Accuracy()
+	# zone templates are learned as the run goes, so early documents of each vendor take the full-page path
+	zonal = ZonalOcr(mongomock.MongoClient().invosync_bench_zones) if args.zonal else None
+
+	# 1. corpus
+	t = []
+	pairs = []
+	with _stage('generate', memory):
+		for i in range(args.pairs):
+			t0 = time.perf_counter()
+			pairs.append(make_pair_files(rng, files_dir, i, n_items=args.items, pages=args.pages, fmt=args.format,
+				noise=args.noise, image_noise=args.image_noise, mismatch_rate=args.mismatch_rate))
+			t.append(time.perf_counter() - t0)
+	stages['generate'] = _summary(t, len(t))
+	n_pages = sum(p['invoice']['pages'] + p['po']['pages'] for p in pairs)
+
+	# 2. OCR (one document at a time, like a single upload)
+	texts = []
+	t = []
+	with _stage('ocr', memory):
+		for p in pairs:
+			for kind in ('invoice', 'po'):
+				t0 = time.perf_counter()
+				(text, _pages), = ocr.ocr_uploads([p[kind]['path']], args.preprocess, zonal)
+				t.append(time.perf_counter() - t0)
+				texts.append((p, kind, text))
+	stages['ocr'] = _summary(t, len(t))
+	stages['ocr']['pages_per_s'] = round(n_pages / sum(t), 3) if sum(t) else None
+	stages['ocr']['chars'] = sum(len(x[2] or '') for x in texts)
+
+	# 3. parse
+	parsed: Dict[int, Dict[str, Any]] = {}
+	t = []
+	with _stage('parse', memory):
+		for p, kind, text in texts:
+			t0 = time.perf_counter()
+			data = parse_fields(text)
+			t.append(time.perf_counter() - t0)
+			parsed.setdefault(id(p), {})[kind] = data
+			acc.add_doc(data, p['truth'][kind])
+	stages['parse'] = _summary(t, len(t))
+
+	# 4. compare
+	t = []
+	with _stage('compare', memory):
+		for p in pairs:
+			docs = parsed[id(p)]
+			t0 = time.perf_counter()
+			compare_docs(docs['invoice'], docs['po'])
+			t.append(time.perf_counter() - t0)
+	stages['compare'] = _summary(t, len(t))
+
+	# 5. full HTTP path
+	if not args.skip_verify:
+		import app as appmod
+		logging.getLogger().setLevel(logging.WARNING)
+		client = appmod.create_app().test_client()
+		t = []
+		with _stage('verify', memory):
+			for p in pairs:
+				with open(p['invoice']['path'], 'rb') as inv_f, open(p['po']['path'], 'rb') as po_f:
+					t0 = time.perf_counter()
+					r = client.post(f'/api/verify?preprocess={args.preprocess}&zonal={int(args.zonal)}', data={'invoice': (inv_f, p['invoice']['name']), 'po': (po_f, p['po']['name'])}, content_type='multipart/form-data')
+					t.append(time.perf_counter() - t0)
+				body = r.get_json() or {}
+				acc.add_status((body.get('result') or {}).get('status'), p['truth']['status'])
+		stages['verify'] = _summary(t, len(t))
+
+	tracemalloc.stop()
+	return {
+		"meta": {
+			"timestamp": datetime.now(timezone.utc).isoformat(),
+			"git": _git_rev(),
+			"python": platform.python_version(),
+			"platform": platform.platform(),
+			"tesseract": tess,
+			"args": vars(args),
+			"pages": n_pages,
+		},
+		"stages": stages,
+		"memory": {
+			"peak_traced_mb": memory,
+			"max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+		},
+		"accuracy": acc.report(),
+	}
+
+
+def compare_runs(cur: Dict[str, Any], base: Dict[str, Any]) -> List[str]:
+	"""Human-readable deltas of the current run against a baseline run."""
+	lines = [f"baseline {base['meta'].get('git')} @ {base['meta'].get('timestamp')}"]
+	for stage, s in cur["stages"].items():
+		b = base["stages"].get(stage)
+		if not b or not s.get("n") or not b.get("n"):
+			continue
+		for k in ("p50_ms", "p99_ms"):
+			delta = (s[k] - b[k]) / b[k] * 100 if b[k] else 0.0
+			lines.append(f"{stage:9s} {k:7s} {b[k]:10.2f} -> {s[k]:10.2f}  ({delta:+.1f}%)")
+	ca, ba = cur["accuracy"], base["accuracy"]
+	for f, v in ca["fields"].items():
+		if v is not None and ba["fields"].get(f) is not None:
+			lines.append(f"accuracy  {f:9s} {ba['fields'][f]:.4f} -> {v:.4f}")
+	lines.append(f"accuracy  items f1  {ba['line_items']['f1']:.4f} -> {ca['line_items']['f1']:.4f}")
+	return lines
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument('--pairs', type=int, default=20)
+	ap.add_argument('--items', type=int, default=20)
+	ap.add_argument('--pages', type=int, default=1, help='pages per document (PDF only; PNGs are one tall page)')
+	ap.add_argument('--format', choices=['pdf', 'png'], default='pdf')
+	ap.add_argument('--noise', type=float, default=0.1, help='probability of a filler line after each item')
+	ap.add_argument('--image-noise', type=float, default=0.0, help='0..1 skew/speckle/blur for PNGs')
+	ap.add_argument('--mismatch-rate', type=float, default=0.1, help='probability an invoice line has a wrong quantity')
+	ap.add_argument('--preprocess', choices=['basic', 'cv'], default='basic', help='OCR preprocessing mode')
+	ap.add_argument('--zonal', action='store_true', help='OCR only header/table regions once a vendor layout is learned')
+	ap.add_argument('--seed', type=int, default=7)
+	ap.add_argument('--skip-verify', action='store_true', help='skip the /api/verify stage')
+	ap.add_argument('--cache', action='store_true', help='leave the OCR cache on')
+	ap.add_argument('--out', help='write the JSON result here (default: stdout)')
+	ap.add_argument('--baseline', help='earlier --out file to compare against')
+	args = ap.parse_args()
+
+	result = run(args)
+	text = json.dumps(result, indent=2)
+	if args.out:
+		with open(args.out, 'w') as f:
+			f.write(text)
+	else:
+		print(text)
+	if args.baseline:
+		with open(args.baseline) as f:
+			base = json.load(f)
+		print('\n'.join(compare_runs(result, base)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+	main()
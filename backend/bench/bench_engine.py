@@ -0,0 +1,102 @@
+"""OCR engine benchmark: per-page latency of pytesseract (process per call) vs resident tesserocr engines.
+
+Usage: python bench/bench_engine.py [--pages 20] [--threads 1,4] [--zonal-crops 3] [--out run.json]
+
+Renders synthetic PNG pages and OCRs each with every installed engine, serially and from
+--threads concurrent threads. --zonal-crops also times small crops (the zonal OCR call shape),
+where per-call startup dominates.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ocr_engine  # noqa: E402
+from ocr import preprocess_image_basic  # noqa: E402
+from corpus import make_document  # noqa: E402
+from render import render_png  # noqa: E402
+from bench_e2e import _summary  # noqa: E402
+
+
+def _engines(pool: int) -> Dict[str, Any]:
+	out: Dict[str, Any] = {}
+	if ocr_engine.pytesseract is not None:
+		out['pytesseract'] = ocr_engine.PytesseractEngine()
+	if ocr_engine.tesserocr is not None:
+		try:
+			out['tesserocr'] = ocr_engine.TesserocrEngine(pool)
+		except Exception as e:
+			print(f"warning: tesserocr could not initialize: {e}", file=sys.stderr)
+	return out
+
+
+def _time(engine, images: List[Image.Image], threads: int) -> Dict[str, Any]:
+	def one(img):
+		t0 = time.perf_counter()
+		engine.image_to_string(img)
+		return time.perf_counter() - t0
+
+	t0 = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=threads) as ex:
+		samples = list(ex.map(one, images))
+	wall = time.perf_counter() - t0
+	out = _summary(samples, len(samples))
+	out["wall_pages_per_s"] = round(len(images) / wall, 3) if wall else None
+	return out
+
+
+def run(args) -> Dict[str, Any]:
+	rng = random.Random(args.seed)
+	work = tempfile.mkdtemp(prefix='invosync-engine-')
+	pages = []
+	for i in range(args.pages):
+		doc = make_document(rng, n_items=args.items)
+		pages.append(preprocess_image_basic(render_png(doc["lines"], os.path.join(work, f"p{i:04d}.png"), rng)))
+	crops = [p.crop((0, 40, p.width, 40 + 40 * args.zonal_crops)) for p in pages] if args.zonal_crops else []
+	threads = [int(t) for t in args.threads.split(',') if t]
+	engines = _engines(max(threads))
+	if not engines:
+		print("warning: no OCR engine installed", file=sys.stderr)
+	results: Dict[str, Any] = {}
+	for name, engine in engines.items():
+		try:
+			engine.image_to_string(pages[0])  # warm-up (and fail fast without a tesseract binary)
+		except Exception as e:
+			results[name] = {"error": str(e)}
+			continue
+		results[name] = {f"pages_t{t}": _time(engine, pages, t) for t in threads}
+		if crops:
+			results[name].update({f"crops_t{t}": _time(engine, crops, t) for t in threads})
+		engine.close()
+	return {"meta": {"args": vars(args), "tesseract": ocr_engine.tesseract_version()}, "engines": results}
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument('--pages', type=int, default=20)
+	ap.add_argument('--items', type=int, default=20)
+	ap.add_argument('--threads', default='1,4', help='comma-separated thread counts')
+	ap.add_argument('--zonal-crops', type=int, default=3, help='lines per crop for the small-image run (0 = skip)')
+	ap.add_argument('--seed', type=int, default=7)
+	ap.add_argument('--out', help='write the JSON result here (default: stdout)')
+	args = ap.parse_args()
+	text = json.dumps(run(args), indent=2)
+	if args.out:
+		with open(args.out, 'w') as f:
+			f.write(text)
+	else:
+		print(text)
+
+
+if __name__ == '__main__':
+	main()
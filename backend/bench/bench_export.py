@@ -0,0 +1,96 @@
+"""Benchmark: CSV export via the columnar engine vs per-record DataFrames + pd.concat.
+
+Usage: python bench/bench_export.py [--sizes 10000,100000] [--items 8] [--legacy-max 10000] [--json]
+Both paths read the stored match result, so neither does fuzzy matching; the difference is pandas overhead.
+The legacy path concatenates compare_and_fix_for_export frames; "identical" checks the CSVs byte for byte.
+Every third record has integer prices and totals, so per-record dtypes and their widening are covered.
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+from io import StringIO
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import export  # noqa: E402
+from compare import compare_docs  # noqa: E402
+from bench_compare import make_pair  # noqa: E402
+
+
+def legacy_generate_csv(records, export_type="corrected"):
+	"""generate_csv_from_records before the columnar engine: one DataFrame pair per record."""
+	all_corrected, all_reports = [], []
+	for rec in records:
+		inv, po = rec.get("invoice", {}), rec.get("po", {})
+		if not inv or not po:
+			continue
+		try:
+			corrected_df, report_df = export.compare_and_fix_for_export(po, inv, rec.get("result"))
+			if not corrected_df.empty:
+				all_corrected.append(corrected_df)
+			if not report_df.empty:
+				all_reports.append(report_df)
+		except Exception:
+			pass
+	frames = all_reports if export_type == "report" else all_corrected
+	if not frames:
+		return ""
+	output = StringIO()
+	pd.concat(frames, ignore_index=True).to_csv(output, index=False)
+	return output.getvalue()
+
+
+def _integer_items(items):
+	return [(name, qty, int(price), qty * int(price)) for name, qty, price, _ in items]
+
+
+def make_records(n: int, items: int, seed: int = 3):
+	rng = random.Random(seed)
+	templates = []
+	for i in range(min(n, 200)):
+		inv, po = make_pair(rng, items)
+		if i % 3 == 0:
+			inv["line_items"], po["line_items"] = _integer_items(inv["line_items"]), _integer_items(po["line_items"])
+		templates.append({"invoice": inv, "po": po, "result": compare_docs(inv, po)})
+	return [templates[i % len(templates)] for i in range(n)]
+
+
+def _time(fn, *args):
+	t0 = time.perf_counter()
+	out = fn(*args)
+	return time.perf_counter() - t0, out
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument('--sizes', default='10000,100000')
+	ap.add_argument('--items', type=int, default=8)
+	ap.add_argument('--legacy-max', type=int, default=10000, help='skip the legacy path above this many records')
+	ap.add_argument('--json', action='store_true')
+	args = ap.parse_args()
+	logging.disable(logging.WARNING)
+	rows = []
+	for n in [int(x) for x in args.sizes.split(',')]:
+		records = make_records(n, args.items)
+		for export_type in ("corrected", "report"):
+			t_new, new = _time(export.generate_csv_from_records, records, export_type)
+			row = {"records": n, "type": export_type, "rows": new.count('\n'), "currentSec": round(t_new, 3)}
+			if n <= args.legacy_max:
+				t_old, old = _time(legacy_generate_csv, records, export_type)
+				row.update({"legacySec": round(t_old, 3), "speedup": round(t_old / t_new, 1), "identical": old == new})
+			rows.append(row)
+			if not args.json:
+				print(row, flush=True)
+	if args.json:
+		print(json.dumps(rows))
+
+
+if __name__ == '__main__':
+	main()
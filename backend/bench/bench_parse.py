@@ -0,0 +1,63 @@
+"""Micro-benchmark: parse_fields throughput (documents/sec) vs the previous implementation.
+
+Usage: python bench/bench_parse.py [--docs 2000] [--items 40] [--pages 3] [--json]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import parse  # noqa: E402
+import _legacy_parse  # noqa: E402
+from corpus import make_corpus  # noqa: E402
+
+
+def _run(fn, texts, repeat):
+	best = float('inf')
+	for _ in range(repeat):
+		t0 = time.perf_counter()
+		for t in texts:
+			fn(t)
+		best = min(best, time.perf_counter() - t0)
+	return len(texts) / best
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument('--docs', type=int, default=2000)
+	ap.add_argument('--items', type=int, default=40)
+	ap.add_argument('--pages', type=int, default=3)
+	ap.add_argument('--noise', type=float, default=0.2)
+	ap.add_argument('--repeat', type=int, default=3)
+	ap.add_argument('--json', action='store_true')
+	args = ap.parse_args()
+	logging.disable(logging.INFO)
+
+	texts = [d["text"] for d in make_corpus(args.docs, n_items=args.items, pages=args.pages, noise=args.noise)]
+	mismatched = sum(1 for t in texts if parse.parse_fields(t) != _legacy_parse.parse_fields(t))
+	# lru_cache on the date normalizer would flatter repeat runs; clear it between runs
+	new_fn = lambda t: (parse._normalize_date_str.cache_clear(), parse.parse_fields(t))  # noqa: E731
+	legacy = _run(_legacy_parse.parse_fields, texts, args.repeat)
+	current = _run(new_fn, texts, args.repeat)
+	out = {
+		"docs": args.docs,
+		"itemsPerDoc": args.items,
+		"legacyDocsPerSec": round(legacy, 1),
+		"currentDocsPerSec": round(current, 1),
+		"speedup": round(current / legacy, 2),
+		"mismatchedOutputs": mismatched,
+	}
+	if args.json:
+		print(json.dumps(out))
+	else:
+		for k, v in out.items():
+			print(f"{k:>18}: {v}")
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,88 @@
+"""Preprocessing benchmark: per-page cost (and OCR accuracy when tesseract is present) of each PREPROCESSORS mode.
+
+Usage: python bench/bench_preprocess.py [--docs 10] [--items 20] [--image-noise 0.6] [--modes basic,cv] [--out run.json]
+
+Renders noisy PNG scans with known ground truth, times preprocessing alone for every mode and, if
+tesseract is installed, OCR + parse accuracy of each mode against the truth.
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ocr  # noqa: E402
+from parse import parse_fields  # noqa: E402
+from corpus import make_document, make_items  # noqa: E402
+from render import render_png  # noqa: E402
+from bench_e2e import Accuracy, _summary  # noqa: E402
+
+
+def run(args) -> Dict[str, Any]:
+	modes = [m for m in args.modes.split(',') if m]
+	for m in modes:
+		if m not in ocr.PREPROCESSORS:
+			raise SystemExit(f"unknown mode {m!r}; choose from {sorted(ocr.PREPROCESSORS)}")
+	tess = ocr.tesseract_version()
+	if tess is None:
+		print("warning: tesseract not found; reporting preprocessing time only", file=sys.stderr)
+
+	rng = random.Random(args.seed)
+	work = tempfile.mkdtemp(prefix='invosync-pre-')
+	docs: List[Dict[str, Any]] = []
+	for i in range(args.docs):
+		doc = make_document(rng, items=make_items(rng, args.items), kind='invoice')
+		path = render_png(doc["lines"], os.path.join(work, f"doc_{i:04d}.png"), rng, args.image_noise)
+		docs.append({"path": path, "truth": doc["truth"]})
+
+	results: Dict[str, Any] = {}
+	for mode in modes:
+		fn = ocr.PREPROCESSORS[mode]
+		pre_t: List[float] = []
+		ocr_t: List[float] = []
+		acc = Accuracy()
+		for d in docs:
+			img = Image.open(d["path"])
+			img.load()
+			t0 = time.perf_counter()
+			out = fn(img)
+			pre_t.append(time.perf_counter() - t0)
+			if tess is not None:
+				t0 = time.perf_counter()
+				text = ocr.get_engine().image_to_string(out)
+				ocr_t.append(time.perf_counter() - t0)
+				acc.add_doc(parse_fields(text), d["truth"])
+		results[mode] = {"preprocess": _summary(pre_t, len(pre_t))}
+		if tess is not None:
+			results[mode]["ocr"] = _summary(ocr_t, len(ocr_t))
+			results[mode]["accuracy"] = acc.report()
+	return {"meta": {"tesseract": tess, "args": vars(args)}, "modes": results}
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument('--docs', type=int, default=10)
+	ap.add_argument('--items', type=int, default=20)
+	ap.add_argument('--image-noise', type=float, default=0.6, help='0..1 skew/speckle/blur')
+	ap.add_argument('--modes', default=','.join(sorted(ocr.PREPROCESSORS)))
+	ap.add_argument('--seed', type=int, default=7)
+	ap.add_argument('--out', help='write the JSON result here (default: stdout)')
+	args = ap.parse_args()
+	text = json.dumps(run(args), indent=2)
+	if args.out:
+		with open(args.out, 'w') as f:
+			f.write(text)
+	else:
+		print(text)
+
+
+if __name__ == '__main__':
+	main()
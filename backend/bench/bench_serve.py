@@ -0,0 +1,180 @@
+"""HTTP load test: throughput and latency of a running server, or of one this script starts.
+
+Usage:
+  python bench/bench_serve.py --start dev   [--concurrency 1,8,32] [--duration 10] [--out dev.json]
+  python bench/bench_serve.py --start serve [--concurrency 1,8,32] [--duration 10] [--out serve.json]
+  python bench/bench_serve.py --url http://host:5000 [--verify-url http://host:5001] ...
+
+--start dev runs `python app.py` (Werkzeug dev server with the reloader), --start serve runs
+`python serve.py` (gunicorn api + ocr pools); both need MongoDB at MONGO_URI. Each concurrency
+level runs for --duration seconds: --concurrency client threads issue the JSON mix (health,
+stats, records) back to back, plus --verify-clients threads posting synthetic invoice/PO pairs
+to /api/verify. With --start serve the verifications go to the ocr pool, as a proxy would send them.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import signal
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from render import make_pair_files  # noqa: E402
+from bench_e2e import _summary  # noqa: E402
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+JSON_MIX = ('/api/health', '/api/stats', '/api/records?limit=20')
+
+
+def _multipart(files: List[Tuple[str, str, bytes]]) -> Tuple[bytes, str]:
+	boundary = uuid.uuid4().hex
+	body = b''
+	for field, name, data in files:
+		body += (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{name}"\r\n'
+			'Content-Type: application/octet-stream\r\n\r\n').encode() + data + b'\r\n'
+	return body + f'--{boundary}--\r\n'.encode(), f'multipart/form-data; boundary={boundary}'
+
+
+def _request(url: str, body: bytes | None = None, content_type: str | None = None, timeout: float = 300) -> int:
+	req = urllib.request.Request(url, data=body, headers={'Content-Type': content_type} if content_type else {})
+	try:
+		with urllib.request.urlopen(req, timeout=timeout) as resp:
+			resp.read()
+			return resp.status
+	except urllib.error.HTTPError as e:
+		return e.code
+
+
+def _wait_ready(url: str, timeout: float = 60) -> None:
+	deadline = time.monotonic() + timeout
+	while time.monotonic() < deadline:
+		try:
+			if _request(url + '/api/health', timeout=2) == 200:
+				return
+		except Exception:
+			pass
+		time.sleep(0.3)
+	raise RuntimeError(f"server at {url} not ready after {timeout:.0f}s")
+
+
+def _start(kind: str, port: int, ocr_port: int) -> subprocess.Popen:
+	env = dict(os.environ, PORT=str(port), SERVE_OCR_PORT=str(ocr_port))
+	cmd = [sys.executable, 'app.py'] if kind == 'dev' else [sys.executable, 'serve.py']
+	# own process group: the dev server's reloader child and the pools are stopped with it
+	return subprocess.Popen(cmd, cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+def _level(args, base: str, verify_base: str, clients: int, pairs: List[Tuple[bytes, str]]) -> Dict[str, Any]:
+	stop = time.monotonic() + args.duration
+	lock = threading.Lock()
+	samples: Dict[str, List[float]] = {"json": [], "verify": []}
+	errors: Dict[str, int] = {"json": 0, "verify": 0}
+
+	def client(kind: str, seed: int) -> None:
+		rng = random.Random(seed)
+		while time.monotonic() < stop:
+			t0 = time.perf_counter()
+			try:
+				if kind == 'json':
+					status = _request(base + rng.choice(JSON_MIX))
+				else:
+					body, ctype = rng.choice(pairs)
+					status = _request(verify_base + '/api/verify', body, ctype)
+				ok = status == 200
+			except Exception:
+				ok = False
+			elapsed = time.perf_counter() - t0
+			with lock:
+				if ok:
+					samples[kind].append(elapsed)
+				else:
+					errors[kind] += 1
+
+	threads = [threading.Thread(target=client, args=('json', i)) for i in range(clients)]
+	if pairs:
+		threads += [threading.Thread(target=client, args=('verify', 1000 + i)) for i in range(args.verify_clients)]
+	t0 = time.perf_counter()
+	for t in threads:
+		t.start()
+	for t in threads:
+		t.join()
+	wall = time.perf_counter() - t0
+	out: Dict[str, Any] = {}
+	for kind in ("json", "verify"):
+		if kind == "verify" and not pairs:
+			continue
+		out[kind] = {**_summary(samples[kind], len(samples[kind])), "errors": errors[kind],
+			"requests_per_s": round(len(samples[kind]) / wall, 2)}
+	return out
+
+
+def run(args) -> Dict[str, Any]:
+	proc = None
+	base = args.url.rstrip('/') if args.url else f"http://127.0.0.1:{args.port}"
+	verify_base = (args.verify_url or base).rstrip('/')
+	if args.start:
+		proc = _start(args.start, args.port, args.port + 1)
+		if args.start == 'serve' and not args.verify_url:
+			verify_base = f"http://127.0.0.1:{args.port + 1}"
+	try:
+		_wait_ready(base)
+		pairs: List[Tuple[bytes, str]] = []
+		if args.verify_clients:
+			work = tempfile.mkdtemp(prefix='invosync-serve-')
+			rng = random.Random(args.seed)
+			for i in range(args.pairs):
+				p = make_pair_files(rng, work, i, fmt='png')
+				files = []
+				for kind in ('invoice', 'po'):
+					with open(p[kind]['path'], 'rb') as f:
+						files.append((kind, p[kind]['name'], f.read()))
+				pairs.append(_multipart(files))
+		levels = {}
+		for c in [int(x) for x in args.concurrency.split(',') if x]:
+			levels[f"c{c}"] = _level(args, base, verify_base, c, pairs)
+			print(f"concurrency {c}: {json.dumps(levels[f'c{c}'])}", file=sys.stderr)
+		return {"meta": {"args": vars(args), "url": base, "verifyUrl": verify_base}, "levels": levels}
+	finally:
+		if proc is not None:
+			os.killpg(proc.pid, signal.SIGTERM)
+			try:
+				proc.wait(timeout=90)
+			except subprocess.TimeoutExpired:
+				os.killpg(proc.pid, signal.SIGKILL)
+
+
+def main():
+	ap = argparse.ArgumentParser()
+	ap.add_argument('--url', help='server to load (default: the one --start launches)')
+	ap.add_argument('--verify-url', help='where /api/verify goes (default: --url, or the ocr pool with --start serve)')
+	ap.add_argument('--start', choices=('dev', 'serve'), help='launch this server mode for the run')
+	ap.add_argument('--port', type=int, default=5050, help='port for --start (the ocr pool gets port+1)')
+	ap.add_argument('--concurrency', default='1,8,32', help='comma-separated JSON client counts')
+	ap.add_argument('--duration', type=float, default=10, help='seconds per concurrency level')
+	ap.add_argument('--verify-clients', type=int, default=0, help='concurrent /api/verify clients alongside the JSON mix')
+	ap.add_argument('--pairs', type=int, default=5, help='distinct synthetic pairs posted by verify clients')
+	ap.add_argument('--seed', type=int, default=7)
+	ap.add_argument('--out', help='write the JSON result here (default: stdout)')
+	args = ap.parse_args()
+	if not args.url and not args.start:
+		ap.error('give --url or --start')
+	text = json.dumps(run(args), indent=2)
+	if args.out:
+		with open(args.out, 'w') as f:
+			f.write(text)
+	else:
+		print(text)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,66 @@
+"""Synthetic invoice / PO text in the layout parse_fields expects."""
+import random
+from typing import Any, Dict, List, Tuple
+
+VENDORS = ["Acme Industrial Supply", "Globex Corporation", "Initech Tools Ltd", "Umbrella MRO Services", "Stark Fasteners Inc"]
+PARTS = ["Hex Bolt", "Washer", "Bearing", "Gasket", "Hydraulic Hose", "Drill Bit", "Cable Tie", "Safety Gloves", "Pipe Clamp", "Filter Cartridge", "Relay", "Fuse", "Valve", "Nozzle", "Spring"]
+SIZES = ["M6", "M8", "M10", "12mm", "20mm", "Large", "Small", "Type A", "Type B", "(pack of 10)"]
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+NOISE = ["Thank you for your business!", "Terms: Net 30", "Page {p}", "Bill to: Finance Department", "Ship to: Warehouse 4", "", "Notes: deliver to dock B"]
+
+
+def make_items(rng: random.Random, n: int) -> List[Tuple[str, int, float, float]]:
+	seen = set()
+	items = []
+	while len(items) < n:
+		name = f"{rng.choice(PARTS)} {rng.choice(SIZES)} {rng.randint(1, 999)}"
+		if name in seen:
+			continue
+		seen.add(name)
+		qty = rng.randint(1, 500)
+		price = round(rng.uniform(0.5, 900), 2)
+		items.append((name, qty, price, round(qty * price, 2)))
+	return items
+
+
+def make_document(rng: random.Random, n_items: int = 20, pages: int = 1, noise: float = 0.1, kind: str = 'invoice', items: List[Tuple[str, int, float, float]] | None = None, vendor: str | None = None, order_id: str | None = None) -> Dict[str, Any]:
+	"""Return {"text": ..., "truth": {...}} for one synthetic document."""
+	vendor = vendor or rng.choice(VENDORS)
+	order_id = order_id or f"PO-{rng.randint(10000, 99999)}"
+	invoice_no = f"INV-{rng.randint(1000, 9999)}"
+	day, month, year = rng.randint(1, 28), rng.randint(1, 12), rng.randint(2019, 2026)
+	items = items if items is not None else make_items(rng, n_items)
+	lines = [kind.upper(), f"Vendor: {vendor}"]
+	if kind == 'invoice':
+		lines.append(f"Invoice number: {invoice_no}")
+		lines.append(f"Invoice date: {MONTHS[month - 1]} {day}, {year}")
+	else:
+		lines.append(f"Date issued: {day:02d}/{month:02d}/{year}")
+	lines.append(f"PO number: {order_id}")
+	lines.append("")
+	lines.append("Item Qty Price Total")
+	per_page = max(1, -(-len(items) // max(1, pages)))
+	breaks = []
+	for i, (name, qty, price, sub) in enumerate(items):
+		if i and i % per_page == 0:
+			lines.append(NOISE[2].format(p=i // per_page))
+			breaks.append(len(lines))
+		lines.append(f"{i + 1} {name} {qty} {price:.2f} {sub:.2f}")
+		if rng.random() < noise:
+			lines.append(rng.choice(NOISE).format(p=i))
+	lines.append(f"Subtotal {round(sum(s for *_, s in items), 2):.2f}")
+	truth = {
+		"vendor": vendor,
+		"invoiceNo": invoice_no if kind == 'invoice' else '',
+		"orderId": order_id,
+		"date": f"{day:02d}/{month:02d}/{year}",
+		"line_items": items,
+	}
+	bounds = [0] + breaks + [len(lines)]
+	page_lines = [lines[a:b] for a, b in zip(bounds, bounds[1:])]
+	return {"text": '\n'.join(lines), "lines": lines, "pages": page_lines, "truth": truth}
+
+
+def make_corpus(n_docs: int, n_items: int = 20, pages: int = 1, noise: float = 0.1, seed: int = 7) -> List[Dict[str, Any]]:
+	rng = random.Random(seed)
+	return [make_document(rng, n_items=n_items, pages=pages, noise=noise, kind=rng.choice(['invoice', 'po'])) for _ in range(n_docs)]
@@ -0,0 +1,84 @@
+"""Render synthetic documents (corpus.make_document) to PDF / PNG files with known ground truth."""
+import os
+import random
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from corpus import make_document, make_items
+
+try:
+	import fitz  # PyMuPDF
+except Exception:  # pragma: no cover
+	fitz = None
+
+PNG_WIDTH = 1240  # A4 at 150 dpi
+PNG_MARGIN = 60
+PNG_FONT_SIZE = 26
+PNG_LINE_HEIGHT = 38
+
+
+def render_png(lines: List[str], path: str, rng: random.Random, image_noise: float = 0.0) -> str:
+	"""One tall page; image_noise (0..1) adds skew, speckle and blur like a phone scan."""
+	font = ImageFont.load_default(size=PNG_FONT_SIZE)
+	height = max(1754, 2 * PNG_MARGIN + PNG_LINE_HEIGHT * len(lines))
+	img = Image.new('L', (PNG_WIDTH, height), 255)
+	draw = ImageDraw.Draw(img)
+	for i, line in enumerate(lines):
+		draw.text((PNG_MARGIN, PNG_MARGIN + i * PNG_LINE_HEIGHT), line, fill=0, font=font)
+	if image_noise > 0:
+		img = img.rotate(rng.uniform(-3, 3) * image_noise, expand=True, fillcolor=255)
+		arr = np.asarray(img, dtype=np.int16)
+		noise = np.random.default_rng(rng.randrange(1 << 30)).normal(0, 40 * image_noise, arr.shape)
+		img = Image.fromarray(np.clip(arr + noise, 0, 255).astype(np.uint8))
+		img = img.filter(ImageFilter.GaussianBlur(radius=0.8 * image_noise))
+	img.save(path)
+	return path
+
+
+def render_pdf(pages: List[List[str]], path: str) -> str:
+	if fitz is None:
+		raise RuntimeError('PyMuPDF is required to render PDFs')
+	doc = fitz.open()
+	for page_lines in pages:
+		page = doc.new_page(width=595, height=842)  # A4 in points
+		y = 50
+		for line in page_lines:
+			page.insert_text((40, y), line, fontsize=11, fontname='helv')
+			y += 15
+	doc.save(path)
+	doc.close()
+	return path
+
+
+def make_pair_files(rng: random.Random, out_dir: str, idx: int, n_items: int = 20, pages: int = 1, fmt: str = 'pdf',
+		noise: float = 0.1, image_noise: float = 0.0, mismatch_rate: float = 0.1) -> Dict[str, Any]:
+	"""Write an invoice and its PO for pair ``idx``; returns paths, names and ground truth.
+
+	The invoice repeats the PO's vendor, order id and lines, except that each line's quantity is
+	bumped with probability ``mismatch_rate`` (known discrepancies).
+	"""
+	from compare import compare_docs
+
+	po_items = make_items(rng, n_items)
+	inv_items: List[Tuple[str, int, float, float]] = []
+	for name, qty, price, sub in po_items:
+		if rng.random() < mismatch_rate:
+			qty += 1
+		inv_items.append((name, qty, price, sub))
+	po_doc = make_document(rng, pages=pages, noise=noise, kind='po', items=po_items)
+	inv_doc = make_document(rng, pages=pages, noise=noise, kind='invoice', items=inv_items,
+		vendor=po_doc["truth"]["vendor"], order_id=po_doc["truth"]["orderId"])
+	out: Dict[str, Any] = {"truth": {"invoice": inv_doc["truth"], "po": po_doc["truth"]}}
+	out["truth"]["status"] = compare_docs(inv_doc["truth"], po_doc["truth"])["status"]
+	for kind, doc in (("invoice", inv_doc), ("po", po_doc)):
+		prefix = 'inv' if kind == 'invoice' else 'po'
+		name = f"{prefix}_{idx:05d}.{fmt}"
+		path = os.path.join(out_dir, name)
+		if fmt == 'pdf':
+			render_pdf(doc["pages"], path)
+		else:
+			render_png(doc["lines"], path, rng, image_noise)
+		out[kind] = {"path": path, "name": name, "pages": len(doc["pages"]) if fmt == 'pdf' else 1}
+	return out
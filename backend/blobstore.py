@@ -0,0 +1,297 @@
+import os
+import sys
+import zlib
+import shutil
+import hashlib
+import tempfile
+import threading
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Tuple
+
+from db import LazyDatabase
+
+logger = logging.getLogger('blobstore')
+
+# 'local' (content-addressed directory) or 'gridfs' (the app's MongoDB database)
+BLOB_BACKEND = os.getenv('BLOB_BACKEND', 'local')
+BLOB_DIR = os.getenv('BLOB_DIR', os.path.join(os.path.dirname(__file__), 'blobs'))
+BLOB_ZLIB_LEVEL = int(os.getenv('BLOB_ZLIB_LEVEL', '6'))
+# keep the uploaded source files so page images can be rendered on demand later
+BLOB_STORE_SOURCES = os.getenv('BLOB_STORE_SOURCES', '1') == '1'
+
+# A blob reference as stored in verification documents:
+# {"key": sha256 of the stored bytes, "ext": name suffix, "codec": "zlib"|"identity", "size": original bytes}
+BlobRef = Dict[str, Any]
+
+
+def _name(ref: BlobRef) -> str:
+	return ref["key"] + ref.get("ext", "")
+
+
+class LocalBlobStore:
+	"""Blobs as files under ``root/<key[:2]>/<key><ext>``; identical content is stored once."""
+
+	def __init__(self, root: str = BLOB_DIR):
+		self.root = root
+		os.makedirs(self.root, exist_ok=True)
+
+	def _path(self, name: str) -> str:
+		return os.path.join(self.root, name[:2], name)
+
+	def exists(self, name: str) -> bool:
+		return os.path.exists(self._path(name))
+
+	def write(self, name: str, data: bytes) -> None:
+		path = self._path(name)
+		if os.path.exists(path):
+			os.utime(path)  # reused: keeps the storage sweeper's orphan check off a blob about to be referenced
+			return
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+		with open(tmp, 'wb') as f:
+			f.write(data)
+		os.replace(tmp, path)
+
+	def write_file(self, name: str, src: str) -> None:
+		path = self._path(name)
+		if os.path.exists(path):
+			os.utime(path)  # see write()
+			return
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+		shutil.copyfile(src, tmp)
+		os.replace(tmp, path)
+
+	def read(self, name: str) -> bytes | None:
+		try:
+			with open(self._path(name), 'rb') as f:
+				return f.read()
+		except FileNotFoundError:
+			return None
+
+	@contextmanager
+	def local_path(self, name: str) -> Iterator[str | None]:
+		path = self._path(name)
+		yield path if os.path.exists(path) else None
+
+	def delete(self, name: str) -> bool:
+		try:
+			os.remove(self._path(name))
+			return True
+		except FileNotFoundError:
+			return False
+
+	def modified(self, name: str) -> float | None:
+		"""Epoch time the blob was last written (or reused), None if it does not exist."""
+		try:
+			return os.stat(self._path(name)).st_mtime
+		except FileNotFoundError:
+			return None
+
+	def names(self, older_than: float) -> Iterator[Tuple[str, int]]:
+		"""(name, size) of blobs last written before the ``older_than`` epoch time."""
+		for dirpath, _, files in os.walk(self.root):
+			for name in files:
+				if name.endswith('.tmp'):
+					continue
+				try:
+					st = os.stat(os.path.join(dirpath, name))
+				except FileNotFoundError:
+					continue
+				if st.st_mtime < older_than:
+					yield name, st.st_size
+
+
+class GridFSBlobStore:
+	"""Blobs in GridFS with the content name as the file _id, so writes are idempotent.
+
+	Each file document also carries ``lastUsed``, refreshed whenever a write reuses the blob, which
+	is the age the storage sweeper goes by.
+	"""
+
+	def __init__(self, db, collection: str = 'blobs'):
+		self.db = db
+		self.collection = collection
+		self.files = db[f"{collection}.files"]
+		self._fs = None
+		self._pid: int | None = None
+
+	@property
+	def fs(self):
+		# GridFS wraps a real Database of this process: built on first use, and again after fork
+		if self._pid != os.getpid():
+			import gridfs  # ships with pymongo
+			db = self.db.resolve() if isinstance(self.db, LazyDatabase) else self.db
+			self._fs = gridfs.GridFS(db, collection=self.collection)
+			self._pid = os.getpid()
+		return self._fs
+
+	def exists(self, name: str) -> bool:
+		return self.fs.exists(name)
+
+	def _reuse(self, name: str) -> bool:
+		# see LocalBlobStore.write: a reused blob must look recently used to the sweeper
+		return self.files.update_one({"_id": name}, {"$set": {"lastUsed": datetime.now(timezone.utc)}}).matched_count > 0
+
+	def write(self, name: str, data: bytes) -> None:
+		if not self._reuse(name):
+			self.fs.put(data, _id=name, filename=name, lastUsed=datetime.now(timezone.utc))
+
+	def write_file(self, name: str, src: str) -> None:
+		if not self._reuse(name):
+			with open(src, 'rb') as f:
+				self.fs.put(f, _id=name, filename=name, lastUsed=datetime.now(timezone.utc))
+
+	def read(self, name: str) -> bytes | None:
+		try:
+			return self.fs.get(name).read()
+		except Exception:
+			return None
+
+	@contextmanager
+	def local_path(self, name: str) -> Iterator[str | None]:
+		data = self.read(name)
+		if data is None:
+			yield None
+			return
+		fd, path = tempfile.mkstemp(suffix=os.path.splitext(name)[1])
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				f.write(data)
+			yield path
+		finally:
+			os.remove(path)
+
+	def delete(self, name: str) -> bool:
+		if not self.fs.exists(name):
+			return False
+		self.fs.delete(name)
+		return True
+
+	def modified(self, name: str) -> float | None:
+		"""Epoch time the blob was last written (or reused), None if it does not exist."""
+		doc = self.files.find_one({"_id": name}, {"lastUsed": 1, "uploadDate": 1})
+		if doc is None:
+			return None
+		return (doc.get("lastUsed") or doc["uploadDate"]).replace(tzinfo=timezone.utc).timestamp()
+
+	def names(self, older_than: float) -> Iterator[Tuple[str, int]]:
+		"""(name, size) of blobs last written (or reused) before the ``older_than`` epoch time."""
+		cutoff = datetime.fromtimestamp(older_than, timezone.utc)
+		query = {"$or": [{"lastUsed": {"$lt": cutoff}}, {"lastUsed": {"$exists": False}, "uploadDate": {"$lt": cutoff}}]}
+		for doc in self.files.find(query, {"length": 1}):
+			yield doc["_id"], doc["length"]
+
+
+def put_text(store, text: str) -> BlobRef:
+	raw = (text or '').encode('utf-8')
+	ref = {"key": hashlib.sha256(raw).hexdigest(), "ext": ".txt.z", "codec": "zlib", "size": len(raw)}
+	# always written: a reused blob gets its last-used time refreshed (see LocalBlobStore.write)
+	store.write(_name(ref), zlib.compress(raw, BLOB_ZLIB_LEVEL))
+	return ref
+
+
+def put_bytes(store, data: bytes, ext: str) -> BlobRef:
+	ref = {"key": hashlib.sha256(data).hexdigest(), "ext": ext, "codec": "identity", "size": len(data)}
+	store.write(_name(ref), data)
+	return ref
+
+
+def put_file(store, path: str) -> BlobRef:
+	from ocr_cache import file_sha256
+	ref = {"key": file_sha256(path), "ext": os.path.splitext(path)[1].lower(), "codec": "identity", "size": os.path.getsize(path)}
+	store.write_file(_name(ref), path)
+	return ref
+
+
+def blob_names(blobs: Dict[str, Any] | None) -> List[str]:
+	"""Store names of every blob a document's ``blobs`` map references, rendered pages included."""
+	names = set()
+	for ref in (blobs or {}).values():
+		if not isinstance(ref, dict):
+			continue
+		for r in ([ref] if "key" in ref else ref.values()):  # "<side>Pages" maps page index -> ref
+			if isinstance(r, dict) and "key" in r:
+				names.add(_name(r))
+	return sorted(names)
+
+
+def get_bytes(store, ref: BlobRef) -> bytes | None:
+	data = store.read(_name(ref))
+	if data is not None and ref.get("codec") == "zlib":
+		data = zlib.decompress(data)
+	return data
+
+
+def get_text(store, ref: BlobRef | None) -> str | None:
+	if not ref:
+		return None
+	data = get_bytes(store, ref)
+	return data.decode('utf-8') if data is not None else None
+
+
+def offload_document(store, doc: Dict[str, Any], inv_path: str | None = None, po_path: str | None = None) -> Dict[str, Any]:
+	"""Move raw OCR text (and optionally the source uploads) of a verification doc into the store.
+
+	Mutates ``doc``: ``invoice.raw``/``po.raw`` are removed, their references recorded under
+	``doc["blobs"]`` and every referenced blob name listed in ``doc["artifacts"]`` (what storage.py
+	checks before deleting a blob).
+	"""
+	blobs = doc.setdefault("blobs", {})
+	for side in ("invoice", "po"):
+		part = doc.get(side)
+		if isinstance(part, dict) and "raw" in part:
+			blobs[side + "Raw"] = put_text(store, part.pop("raw") or '')
+	if BLOB_STORE_SOURCES:
+		for side, path in (("invoice", inv_path), ("po", po_path)):
+			if path and os.path.exists(path):
+				blobs[side + "Source"] = put_file(store, path)
+	doc["artifacts"] = blob_names(blobs)
+	return doc
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store(db=None):
+	global _store
+	with _store_lock:
+		if _store is None:
+			if BLOB_BACKEND == 'gridfs':
+				if db is None:
+					raise RuntimeError('GridFS blob store needs a database')
+				_store = GridFSBlobStore(db)
+			else:
+				_store = LocalBlobStore()
+		return _store
+
+
+def migrate_embedded_raw(db, batch_size: int = 500) -> int:
+	"""Offload raw text still embedded in older verification documents; returns docs updated."""
+	store = get_blob_store(db)
+	coll = db['verifications']
+	n = 0
+	query = {"$or": [{"invoice.raw": {"$exists": True}}, {"po.raw": {"$exists": True}}]}
+	for d in coll.find(query, {"invoice.raw": 1, "po.raw": 1, "blobs": 1}).batch_size(batch_size):
+		offload_document(store, d)
+		coll.update_one({"_id": d["_id"]}, {"$set": {"blobs": d["blobs"], "artifacts": d["artifacts"]}, "$unset": {"invoice.raw": "", "po.raw": ""}})
+		n += 1
+	logger.info("Moved raw OCR text of %d verifications to the blob store", n)
+	return n
+
+
+if __name__ == '__main__':
+	# python blobstore.py migrate
+	from pymongo import MongoClient
+	from dotenv import load_dotenv
+
+	logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s %(name)s: %(message)s')
+	load_dotenv()
+	if sys.argv[1:] != ['migrate']:
+		print("usage: python blobstore.py migrate")
+		sys.exit(2)
+	client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/futurix'))
+	migrate_embedded_raw(client.get_default_database())
@@ -1,41 +1,138 @@
-from typing import Dict, Any, List
-from rapidfuzz import fuzz
+import os
+from typing import Dict, Any, List, Tuple
+from rapidfuzz import fuzz, process
+import numpy as np
+
+import metrics
+
+# Optional SciPy for the optimal one-to-one assignment; greedy best-score-first otherwise
+try:
+	from scipy.optimize import linear_sum_assignment  # type: ignore
+except Exception:  # pragma: no cover
+	linear_sum_assignment = None  # type: ignore
+
+# Item names match when fuzz.ratio is strictly above this; vendors when at least this
+ITEM_MATCH_THRESHOLD = 85
+VENDOR_MATCH_THRESHOLD = 90
+# rapidfuzz cdist worker threads (-1 = all cores); small matrices are scored on one thread
+COMPARE_WORKERS = int(os.getenv('COMPARE_WORKERS', '-1'))
+_PARALLEL_MIN_CELLS = 10_000
+
+COMPARE_RESULTS = metrics.counter('compare_results_total', 'compare_docs outcomes by status', ['status'])
+COMPARE_DISCREPANCIES = metrics.counter('compare_discrepancies_total', 'Discrepancies found by attribute', ['attribute'])
+COMPARE_FUZZY_CELLS = metrics.counter('compare_fuzzy_cells_total', 'PO x invoice name pairs scored by rapidfuzz')
+
+
+def _assign(scores: np.ndarray) -> List[Tuple[int, int]]:
+	"""One-to-one pairs (row, col) over cells above the threshold, maximizing the total score."""
+	rows, cols = np.nonzero(scores > ITEM_MATCH_THRESHOLD)
+	if rows.size == 0:
+		return []
+	if linear_sum_assignment is not None:
+		# solve only over lines that have at least one candidate; the rest cannot be paired
+		ur, uc = np.unique(rows), np.unique(cols)
+		sub = scores[np.ix_(ur, uc)]
+		r, c = linear_sum_assignment(sub, maximize=True)
+		return [(int(ur[i]), int(uc[j])) for i, j in zip(r, c) if sub[i, j] > ITEM_MATCH_THRESHOLD]
+	# highest score first; ties keep PO order then invoice order, like the old scan
+	order = np.lexsort((cols, rows, -scores[rows, cols]))
+	used_r, used_c = set(), set()
+	pairs = []
+	for k in order:
+		i, j = int(rows[k]), int(cols[k])
+		if i in used_r or j in used_c:
+			continue
+		used_r.add(i)
+		used_c.add(j)
+		pairs.append((i, j))
+	return pairs
+
+
+def match_line_items(po_items: List[Any], inv_items: List[Any]) -> Dict[int, int]:
+	"""Pair PO lines with invoice lines by item name; returns {po_index: inv_index}.
+
+	Identical names are paired first without scoring. The remaining names are scored in one batched
+	rapidfuzz.process.cdist call (multi-threaded, with a score cutoff so hopeless pairs exit early)
+	and then assigned one-to-one.
+	"""
+	po_names = [str(it[0]) for it in po_items]
+	inv_names = [str(it[0]) for it in inv_items]
+	pairs: Dict[int, int] = {}
+
+	# exact-name fast path
+	free_inv: Dict[str, List[int]] = {}
+	for j, name in enumerate(inv_names):
+		free_inv.setdefault(name, []).append(j)
+	used_inv = set()
+	for i, name in enumerate(po_names):
+		slots = free_inv.get(name)
+		if slots:
+			j = slots.pop(0)
+			pairs[i] = j
+			used_inv.add(j)
+
+	rest_po = [i for i in range(len(po_names)) if i not in pairs]
+	rest_inv = [j for j in range(len(inv_names)) if j not in used_inv]
+	if not rest_po or not rest_inv:
+		return pairs
+	COMPARE_FUZZY_CELLS.inc(len(rest_po) * len(rest_inv))
+	workers = COMPARE_WORKERS if len(rest_po) * len(rest_inv) >= _PARALLEL_MIN_CELLS else 1
+	scores = process.cdist(
+		[po_names[i] for i in rest_po],
+		[inv_names[j] for j in rest_inv],
+		scorer=fuzz.ratio,
+		score_cutoff=ITEM_MATCH_THRESHOLD,
+		dtype=np.float64,
+		workers=workers,
+	)
+	for r, c in _assign(scores):
+		pairs[rest_po[r]] = rest_inv[c]
+	return pairs
+
+
+def vendor_score(inv: Dict[str, Any], po: Dict[str, Any]) -> float | None:
+	"""fuzz.ratio of the (stripped, lowercased) vendor names; None when neither side has one."""
+	vendor_po = (po.get("vendor") or "").strip()
+	vendor_inv = (inv.get("vendor") or "").strip()
+	if not (vendor_po or vendor_inv):
+		return None
+	return fuzz.ratio(vendor_po.lower(), vendor_inv.lower())
 
 
 def compare_docs(inv: Dict[str, Any], po: Dict[str, Any]) -> Dict[str, Any]:
-	"""Mimic compare_and_fix logic from provided folder for status and mismatches."""
+	"""Mimic compare_and_fix logic from provided folder for status and mismatches.
+
+	The result also carries the match itself (``matches`` as [po_index, inv_index] pairs and
+	``vendorScore``) so exports can rebuild corrections without fuzzy matching again.
+	"""
 	mismatches: List[Dict[str, Any]] = []
 
 	# Vendor check (>=90 treated as match)
 	vendor_po = (po.get("vendor") or "").strip()
 	vendor_inv = (inv.get("vendor") or "").strip()
-	if vendor_po or vendor_inv:
-		score = fuzz.ratio(vendor_po.lower(), vendor_inv.lower())
-		if score < 90:
+	score = vendor_score(inv, po)
+	if score is not None:
+		if score < VENDOR_MATCH_THRESHOLD:
 			mismatches.append({"segment": "Vendor Info", "attribute": "Vendor", "invoice": vendor_inv, "expected": vendor_po, "similarity": score})
 
-	# Items comparison (by name >=85)
+	# Items comparison (by name >85, one invoice line per PO line)
 	po_items = po.get("line_items") or []  # [(name, qty, price, subtotal)]
 	inv_items = inv.get("line_items") or []
 
-	matched_inv_indices = set()
+	pairs = match_line_items(po_items, inv_items)
+	matched_inv_indices = set(pairs.values())
 	qty_only_issue = True
 
-	for po_name, po_qty, po_price, po_sub in po_items:
-		matched = False
-		for idx, (in_name, in_qty, in_price, in_sub) in enumerate(inv_items):
-			score = fuzz.ratio(str(po_name), str(in_name))
-			if score > 85:
-				matched = True
-				matched_inv_indices.add(idx)
-				if po_qty != in_qty:
-					mismatches.append({"segment": po_name, "attribute": "Quantity", "invoice": in_qty, "expected": po_qty})
-				if abs((po_price or 0) - (in_price or 0)) > 0.01:
-					mismatches.append({"segment": po_name, "attribute": "Price", "invoice": in_price, "expected": po_price})
-				if abs((po_sub or 0) - (in_sub or 0)) > 0.01:
-					mismatches.append({"segment": po_name, "attribute": "Total", "invoice": in_sub, "expected": po_sub})
-				break
-		if not matched:
+	for i, (po_name, po_qty, po_price, po_sub) in enumerate(po_items):
+		if i in pairs:
+			in_name, in_qty, in_price, in_sub = inv_items[pairs[i]]
+			if po_qty != in_qty:
+				mismatches.append({"segment": po_name, "attribute": "Quantity", "invoice": in_qty, "expected": po_qty})
+			if abs((po_price or 0) - (in_price or 0)) > 0.01:
+				mismatches.append({"segment": po_name, "attribute": "Price", "invoice": in_price, "expected": po_price})
+			if abs((po_sub or 0) - (in_sub or 0)) > 0.01:
+				mismatches.append({"segment": po_name, "attribute": "Total", "invoice": in_sub, "expected": po_sub})
+		else:
 			qty_only_issue = False
 			mismatches.append({"segment": po_name, "attribute": "Missing", "invoice": "Not in Invoice", "expected": "Present"})
 
@@ -47,4 +144,12 @@ def compare_docs(inv: Dict[str, Any], po: Dict[str, Any]) -> Dict[str, Any]:
 
 	# Determine status
 	status = "matched" if not mismatches else ("partial" if qty_only_issue else "mismatch")
-	return {"status": status, "discrepancies": mismatches}
+	COMPARE_RESULTS.inc(status=status)
+	for m in mismatches:
+		COMPARE_DISCREPANCIES.inc(attribute=m["attribute"])
+	return {
+		"status": status,
+		"discrepancies": mismatches,
+		"matches": [[i, j] for i, j in sorted(pairs.items())],
+		"vendorScore": score,
+	}
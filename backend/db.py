@@ -0,0 +1,106 @@
+import os
+import threading
+import logging
+from typing import Any, Dict
+
+from pymongo import MongoClient
+
+logger = logging.getLogger('db')
+
+# Settings are read when a process first connects (after the app has loaded .env):
+#   MONGO_URI
+#   MONGO_MAX_POOL_SIZE / MONGO_MIN_POOL_SIZE        connections per process
+#   MONGO_MAX_IDLE_TIME_MS                           idle pooled connections are closed after this
+#   MONGO_CONNECT_TIMEOUT_MS / MONGO_SOCKET_TIMEOUT_MS (0 = no socket timeout)
+#   MONGO_SERVER_SELECTION_TIMEOUT_MS                how long an operation waits for a usable server
+#   MONGO_WAIT_QUEUE_TIMEOUT_MS                      how long a thread waits for a pooled connection (0 = forever)
+DEFAULT_URI = 'mongodb://localhost:27017/futurix'
+
+
+def client_options() -> Dict[str, Any]:
+	opts = {
+		"maxPoolSize": int(os.getenv('MONGO_MAX_POOL_SIZE', '50')),
+		"minPoolSize": int(os.getenv('MONGO_MIN_POOL_SIZE', '0')),
+		"maxIdleTimeMS": int(os.getenv('MONGO_MAX_IDLE_TIME_MS', '300000')),
+		"connectTimeoutMS": int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '5000')),
+		"serverSelectionTimeoutMS": int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+	}
+	for key, env in (("socketTimeoutMS", 'MONGO_SOCKET_TIMEOUT_MS'), ("waitQueueTimeoutMS", 'MONGO_WAIT_QUEUE_TIMEOUT_MS')):
+		value = int(os.getenv(env, '0'))
+		if value:
+			opts[key] = value
+	return opts
+
+
+_client: MongoClient | None = None
+_db = None
+_client_pid: int | None = None
+_lock = threading.Lock()
+
+
+def get_client() -> MongoClient:
+	"""This process's MongoClient, created on first use.
+
+	A MongoClient must not be shared across fork (its pool and monitor threads do not survive
+	it), so a forked worker that inherited a client from its parent gets a fresh one.
+	"""
+	global _client, _db, _client_pid
+	pid = os.getpid()
+	if _client_pid != pid:
+		with _lock:
+			if _client_pid != pid:
+				# an inherited client is dropped, not closed: closing would act on the parent's sockets
+				opts = client_options()
+				_client = MongoClient(os.getenv('MONGO_URI', DEFAULT_URI), **opts)
+				_db = _client.get_default_database()
+				_client_pid = pid
+				logger.info("Mongo client for pid %d (pool %d)", pid, opts["maxPoolSize"])
+	return _client  # type: ignore[return-value]
+
+
+def get_db():
+	"""The URI's default database on this process's client."""
+	if _client_pid != os.getpid():
+		get_client()
+	return _db
+
+
+def close_client() -> None:
+	"""Close this process's client (graceful shutdown); the next use reconnects."""
+	global _client, _db, _client_pid
+	with _lock:
+		if _client is not None and _client_pid == os.getpid():
+			_client.close()
+		_client, _db, _client_pid = None, None, None
+
+
+class LazyCollection:
+	"""A collection of this process's database, looked up on every use (cheap: no I/O)."""
+
+	def __init__(self, name: str):
+		self.name = name
+
+	def __getattr__(self, attr: str) -> Any:
+		return getattr(get_db()[self.name], attr)
+
+	def __getitem__(self, sub: str) -> "LazyCollection":
+		return LazyCollection(f"{self.name}.{sub}")
+
+
+class LazyDatabase:
+	"""Stands in for the app's Database at import time without connecting.
+
+	Modules keep ``db['name']`` handles at module level; through this proxy they resolve to the
+	current process's client when used, so importing the app (e.g. in a prefork server's master)
+	opens no sockets.
+	"""
+
+	def __getitem__(self, name: str) -> LazyCollection:
+		return LazyCollection(name)
+
+	def __getattr__(self, attr: str) -> Any:
+		return getattr(get_db(), attr)
+
+	def resolve(self):
+		"""The real pymongo Database for this process (for APIs that type-check it, e.g. GridFS)."""
+		return get_db()
@@ -1,70 +1,95 @@
+import os
+import csv
+import time
+import math
+import zlib
 import pandas as pd
-from typing import Dict, Any, List
-from rapidfuzz import fuzz
+import numpy as np
+from typing import Dict, Any, List, Tuple, Iterable, Iterator
 from io import StringIO
+from itertools import islice
 import logging
 
+# Optional Arrow / Parquet output
+try:
+	import pyarrow as pa  # type: ignore
+	import pyarrow.ipc as pa_ipc  # type: ignore
+	import pyarrow.parquet as pq  # type: ignore
+except Exception:  # pragma: no cover
+	pa = None  # type: ignore
+	pa_ipc = None  # type: ignore
+	pq = None  # type: ignore
+
+from compare import match_line_items, vendor_score, VENDOR_MATCH_THRESHOLD
+import metrics
+
 logger = logging.getLogger('export')
 
+PARQUET_ROW_GROUP_ROWS = int(os.getenv('PARQUET_ROW_GROUP_ROWS', '128000'))
 
-def compare_and_fix_for_export(po_data: Dict[str, Any], inv_data: Dict[str, Any]) -> tuple[pd.DataFrame, pd.DataFrame]:
-	"""
-	Compare PO and Invoice, correct discrepancies, return corrected DataFrame and report DataFrame.
-	Based on user's provided code structure.
-	"""
-	corrected_items = []
-	mismatches = []
-	matched_inv_indices = set()
+EXPORT_ROWS = metrics.counter('export_rows_total', 'Rows written by exports', ['format', 'type'])
+EXPORT_RECORDS = metrics.counter('export_records_total', 'Verification records read by exports', ['format'])
+EXPORT_SECONDS = metrics.histogram('export_seconds', 'Time to build an export (streamed exports: until the last chunk)', ['format'])
 
+
+def _as_items(line_items: List[Any]) -> List[Dict[str, Any]]:
 	# Convert line_items to Items format
-	po_items = []
-	for item_tuple in po_data.get("line_items", []):
+	items = []
+	for item_tuple in line_items or []:
 		if len(item_tuple) >= 4:
-			po_items.append({
+			items.append({
 				"Item": item_tuple[0],
 				"Quantity": item_tuple[1],
 				"Price": item_tuple[2],
 				"Total": item_tuple[3]
 			})
+	return items
 
-	inv_items = []
-	for item_tuple in inv_data.get("line_items", []):
-		if len(item_tuple) >= 4:
-			inv_items.append({
-				"Item": item_tuple[0],
-				"Quantity": item_tuple[1],
-				"Price": item_tuple[2],
-				"Total": item_tuple[3]
-			})
+
+def _stored_match(po_data: Dict[str, Any], inv_data: Dict[str, Any], match: Dict[str, Any] | None) -> Tuple[Dict[int, int], bool]:
+	"""Item pairs and vendor-mismatch flag from the verify-time result; recomputed only for old records."""
+	if match and match.get("matches") is not None:
+		pairs = {int(i): int(j) for i, j in match["matches"]}
+		score = match.get("vendorScore")
+	else:
+		pairs = match_line_items(po_data.get("line_items") or [], inv_data.get("line_items") or [])
+		score = vendor_score(inv_data, po_data)
+	return pairs, score is not None and score < VENDOR_MATCH_THRESHOLD
+
+
+def _correct(po_data: Dict[str, Any], inv_data: Dict[str, Any], match: Dict[str, Any] | None) -> Tuple[List[Dict[str, Any]], List[List[Any]]]:
+	"""Corrected line items and mismatch rows for one record (plain Python, no DataFrames)."""
+	corrected_items = []
+	mismatches = []
+
+	po_items = _as_items(po_data.get("line_items", []))
+	inv_items = _as_items(inv_data.get("line_items", []))
+	pairs, vendor_mismatch = _stored_match(po_data, inv_data, match)
+	matched_inv_indices = set(pairs.values())
 
 	# Vendor check
 	vendor_po = po_data.get("vendor", "") or ""
 	vendor_inv = inv_data.get("vendor", "") or ""
-	if vendor_po or vendor_inv:
-		if fuzz.ratio(vendor_po.lower(), vendor_inv.lower()) < 90:
-			mismatches.append(["Vendor Info", "Vendor", vendor_inv, vendor_po])
-
-	# Compare PO items with Invoice items
-	for po_item in po_items:
-		matched = False
-		for idx, inv_item in enumerate(inv_items):
-			if fuzz.ratio(str(po_item["Item"]), str(inv_item["Item"])) > 85:
-				matched = True
-				matched_inv_indices.add(idx)
-				status = "Matched"
-
-				# Compare values and correct
-				for key in ["Quantity", "Price", "Total"]:
-					if abs((po_item.get(key) or 0) - (inv_item.get(key) or 0)) > 0.01:
-						mismatches.append([po_item["Item"], key, inv_item.get(key), po_item.get(key)])
-						inv_item[key] = po_item[key]
-						status = "Corrected"
-
-				inv_item["Status"] = status
-				corrected_items.append(inv_item)
-				break
+	if vendor_mismatch:
+		mismatches.append(["Vendor Info", "Vendor", vendor_inv, vendor_po])
 
-		if not matched:
+	# Walk PO items with their matched Invoice items
+	for i, po_item in enumerate(po_items):
+		j = pairs.get(i)
+		if j is not None and j < len(inv_items):
+			inv_item = inv_items[j]
+			status = "Matched"
+
+			# Compare values and correct
+			for key in ["Quantity", "Price", "Total"]:
+				if abs((po_item.get(key) or 0) - (inv_item.get(key) or 0)) > 0.01:
+					mismatches.append([po_item["Item"], key, inv_item.get(key), po_item.get(key)])
+					inv_item[key] = po_item[key]
+					status = "Corrected"
+
+			inv_item["Status"] = status
+			corrected_items.append(inv_item)
+		else:
 			po_item["Status"] = "Missing in Invoice (Added)"
 			mismatches.append([po_item["Item"], "Missing", "Not in Invoice", "Added"])
 			corrected_items.append(po_item)
@@ -76,6 +101,19 @@ def compare_and_fix_for_export(po_data: Dict[str, Any], inv_data: Dict[str, Any]
 			mismatches.append([inv_item["Item"], "Extra Item", "Exists only in Invoice", "Kept as-is"])
 			corrected_items.append(inv_item)
 
+	return corrected_items, mismatches
+
+
+def compare_and_fix_for_export(po_data: Dict[str, Any], inv_data: Dict[str, Any], match: Dict[str, Any] | None = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+	"""
+	Compare PO and Invoice, correct discrepancies, return corrected DataFrame and report DataFrame.
+	Based on user's provided code structure.
+
+	``match`` is the stored compare_docs result of the record; its item pairs and vendor score are
+	reused so no fuzzy matching happens here.
+	"""
+	corrected_items, mismatches = _correct(po_data, inv_data, match)
+
 	if not corrected_items:
 		return pd.DataFrame(), pd.DataFrame(columns=["Segment", "Attribute", "Invoice_Value", "Corrected_Value"])
 
@@ -113,38 +151,455 @@ def generate_csv_from_records(records: List[Dict[str, Any]], export_type: str =
 	"""
 	Generate CSV from list of verification records.
 	export_type: "corrected" (default) or "report"
+
+	Built by the columnar engine (gather_export_columns + *_frame); the output is byte-identical to
+	concatenating compare_and_fix_for_export frames per record.
 	"""
 	if not records:
 		return ""
 
-	all_corrected = []
-	all_reports = []
+	with EXPORT_SECONDS.time(format="csv"):
+		cols = gather_export_columns(records)
+		combined = report_frame(cols) if export_type == "report" else corrected_frame(cols)
+		EXPORT_RECORDS.inc(len(records), format="csv")
+		EXPORT_ROWS.inc(len(combined), format="csv", type=export_type)
+		if combined.empty:
+			return ""
+
+		output = StringIO()
+		combined.to_csv(output, index=False)
+		return output.getvalue()
+
+
+# --- columnar export engine ---
+
+CORRECTED_COLUMNS = ["Item", "Quantity", "Price", "Total", "Status", "Order_ID", "Vendor", "Grand_Total"]
+REPORT_COLUMNS = ["Segment", "Attribute", "Invoice_Value", "Corrected_Value"]
+
+
+def _to_number(v: Any) -> int | float | None:
+	"""pd.to_numeric(errors="coerce") for one value; None stands for NaN."""
+	if isinstance(v, bool):
+		return int(v)
+	if isinstance(v, int):
+		return v
+	if isinstance(v, float):
+		return None if math.isnan(v) else v
+	if isinstance(v, str):
+		try:
+			return int(v.strip())
+		except ValueError:
+			pass
+	try:
+		f = float(v)
+	except (TypeError, ValueError):
+		return None
+	return None if math.isnan(f) else f
+
+
+def _numeric_column(values: List[Any], fill: float) -> List[int | float]:
+	"""Coerce a column like pd.to_numeric(..., errors="coerce").fillna(fill): float if any value is."""
+	nums = [_to_number(v) for v in values]
+	if any(n is None or isinstance(n, float) for n in nums):
+		return [fill if n is None else float(n) for n in nums]
+	return nums  # type: ignore[return-value]
+
+
+def _line_numbers(corrected_items: List[Dict[str, Any]]) -> Tuple[List[int], List[int | float], List[int | float], int | float]:
+	"""Quantities, prices, totals and grand total of one record's corrected lines.
+
+	Prices and totals are ints when all of the record's values are, as in its own DataFrame in
+	compare_and_fix_for_export. Raises ValueError on a non-finite quantity (astype(int) did too).
+	"""
+	qty = _numeric_column([it.get("Quantity") for it in corrected_items], 0)
+	if not all(math.isfinite(q) for q in qty):
+		raise ValueError("non-finite quantity")
+	price = _numeric_column([it.get("Price") for it in corrected_items], 0.0)
+	total = _numeric_column([it.get("Total") for it in corrected_items], 0.0)
+	# same summation and rounding as round(Series.sum(), 2)
+	grand = round(np.asarray(total).sum(), 2)
+	return [int(q) for q in qty], price, total, float(grand) if isinstance(grand, np.floating) else int(grand)
+
+
+def _value_kind(values: List[Any]) -> str:
+	"""dtype pd.DataFrame(rows) infers for one column of one record: 'int', 'float' or 'obj'."""
+	if all(v is None for v in values):
+		return 'obj'
+	if not all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values):
+		return 'obj'
+	return 'float' if any(v is None or isinstance(v, float) for v in values) else 'int'
+
+
+def _report_column(values: List[Any]) -> Tuple[List[Any], str]:
+	"""One report column of one record as its DataFrame would hold it, and the inferred kind."""
+	kind = _value_kind(values)
+	if kind == 'float':
+		return [None if v is None else float(v) for v in values], kind
+	return values, kind
+
+
+class ExportColumns:
+	"""Corrected lines, record summaries and mismatches of many records as typed column lists.
+
+	``line_*`` hold one entry per corrected line, ``rec_*`` one per exported record (its lines are
+	contiguous and ``rec_lines`` long) and ``rep_*`` one per mismatch row, ``rep_rec`` being the
+	position of its record in ``rec_*``. Numbers keep the type the record's own DataFrame gave them
+	(see _line_numbers); ``rep_kinds`` holds the inferred kind of each report column per record that
+	has mismatches, from which report_frame widens the columns as pd.concat does.
+	"""
+
+	def __init__(self):
+		self.line_item: List[Any] = []
+		self.line_qty: List[int] = []
+		self.line_price: List[int | float] = []
+		self.line_total: List[int | float] = []
+		self.line_status: List[Any] = []
+		self.rec_id: List[str | None] = []
+		self.rec_order_id: List[Any] = []
+		self.rec_vendor: List[Any] = []
+		self.rec_lines: List[int] = []
+		self.rec_grand: List[int | float] = []
+		self.rep_rec: List[int] = []
+		self.rep_segment: List[Any] = []
+		self.rep_attribute: List[Any] = []
+		self.rep_invoice: List[Any] = []
+		self.rep_corrected: List[Any] = []
+		self.rep_kinds: List[Tuple[str, ...]] = []
+
 
+def gather_export_columns(records: Iterable[Dict[str, Any]]) -> ExportColumns:
+	cols = ExportColumns()
 	for rec in records:
 		inv = rec.get("invoice", {})
 		po = rec.get("po", {})
 		if not inv or not po:
 			continue
-		
 		try:
-			corrected_df, report_df = compare_and_fix_for_export(po, inv)
-			if not corrected_df.empty:
-				all_corrected.append(corrected_df)
-			if not report_df.empty:
-				all_reports.append(report_df)
+			corrected_items, mismatches = _correct(po, inv, rec.get("result"))
+			if not corrected_items:
+				continue
+			qty, price, total, grand = _line_numbers(corrected_items)
 		except Exception as e:
 			logger.warning("Export failed for record %s: %s", rec.get("_id"), e)
+			continue
+		cols.line_item.extend(it.get("Item") for it in corrected_items)
+		cols.line_qty.extend(qty)
+		cols.line_price.extend(price)
+		cols.line_total.extend(total)
+		cols.line_status.extend(it.get("Status") for it in corrected_items)
+		r = len(cols.rec_id)
+		cols.rec_id.append(None if rec.get("_id") is None else str(rec["_id"]))
+		cols.rec_order_id.append(po.get("orderId") or po.get("Order_ID") or "")
+		cols.rec_vendor.append(po.get("vendor") or po.get("Vendor") or "")
+		cols.rec_lines.append(len(corrected_items))
+		cols.rec_grand.append(grand)
+		if not mismatches:
+			continue
+		report = [_report_column([m[k] for m in mismatches]) for k in range(4)]
+		cols.rep_rec.extend([r] * len(mismatches))
+		for dest, (values, _) in zip((cols.rep_segment, cols.rep_attribute, cols.rep_invoice, cols.rep_corrected), report):
+			dest.extend(values)
+		cols.rep_kinds.append(tuple(kind for _, kind in report))
+	return cols
 
-	if export_type == "report":
-		if not all_reports:
-			return ""
-		combined = pd.concat(all_reports, ignore_index=True)
+
+def _object_array(values: List[Any]) -> np.ndarray:
+	out = np.empty(len(values), dtype=object)
+	out[:] = values
+	return out
+
+
+def corrected_frame(cols: ExportColumns) -> pd.DataFrame:
+	"""All corrected lines, each record's followed by its GRAND TOTAL row, in a single DataFrame.
+
+	Quantity and Price hold "" on GRAND TOTAL rows, so they stay object columns with each record's
+	own numbers; Total and Grand_Total are int64 only if every record's totals are integers.
+	"""
+	if not cols.rec_lines:
+		return pd.DataFrame()
+	n = len(cols.rec_lines)
+	lens = np.asarray(cols.rec_lines, dtype=np.int64)
+	total_dtype = np.int64 if all(isinstance(g, int) for g in cols.rec_grand) else np.float64
+	grand = np.asarray(cols.rec_grand, dtype=total_dtype)
+	order_ids = _object_array(cols.rec_order_id)
+	vendors = _object_array(cols.rec_vendor)
+	lines = pd.DataFrame({
+		"Item": _object_array(cols.line_item),
+		"Quantity": _object_array(cols.line_qty),
+		"Price": _object_array(cols.line_price),
+		"Total": np.asarray(cols.line_total, dtype=total_dtype),
+		"Status": _object_array(cols.line_status),
+		"Order_ID": np.repeat(order_ids, lens),
+		"Vendor": np.repeat(vendors, lens),
+		"Grand_Total": np.repeat(grand, lens),
+		"_rec": np.repeat(np.arange(n), lens),
+	})
+	summary = pd.DataFrame({
+		"Item": "GRAND TOTAL",
+		"Quantity": "",
+		"Price": "",
+		"Total": grand,
+		"Status": "",
+		"Order_ID": order_ids,
+		"Vendor": vendors,
+		"Grand_Total": grand,
+		"_rec": np.arange(n),
+	})
+	# a stable sort on the record position puts each GRAND TOTAL row right after its lines
+	rows = pd.concat([lines, summary], ignore_index=True).sort_values("_rec", kind="stable")
+	return rows.drop(columns="_rec").reset_index(drop=True)
+
+
+def report_frame(cols: ExportColumns) -> pd.DataFrame:
+	"""All mismatch rows in a single DataFrame.
+
+	Each column is int64 if it was for every record, float64 if it was numeric for every record,
+	else object with each record's values as its own DataFrame held them.
+	"""
+	if not cols.rep_rec:
+		return pd.DataFrame()
+	data = {}
+	values = (cols.rep_segment, cols.rep_attribute, cols.rep_invoice, cols.rep_corrected)
+	for k, (name, column) in enumerate(zip(REPORT_COLUMNS, values)):
+		kinds = {rec_kinds[k] for rec_kinds in cols.rep_kinds}
+		if 'obj' in kinds:
+			data[name] = _object_array(column)
+		elif 'float' in kinds:
+			data[name] = np.asarray([np.nan if v is None else float(v) for v in column], dtype=np.float64)
+		else:
+			data[name] = np.asarray(column, dtype=np.int64)
+	return pd.DataFrame(data, columns=REPORT_COLUMNS)
+
+
+# --- streaming export ---
+
+# Only the fields the export reads; keeps raw OCR text out of export cursors
+EXPORT_PROJECTION = {
+	"invoice.line_items": 1, "invoice.vendor": 1,
+	"po.line_items": 1, "po.vendor": 1, "po.Vendor": 1, "po.orderId": 1, "po.Order_ID": 1,
+	"result.matches": 1, "result.vendorScore": 1,
+}
+
+
+def _cell(v: Any) -> Any:
+	if v is None or (isinstance(v, float) and math.isnan(v)):
+		return ''
+	if isinstance(v, float):
+		return str(float(v))
+	return v
+
+
+def record_rows(rec: Dict[str, Any]) -> Tuple[List[List[Any]], List[List[Any]]]:
+	"""Corrected rows (with the GRAND TOTAL row) and report rows for one record, typed as its own
+	compare_and_fix_for_export frames would be."""
+	inv = rec.get("invoice", {})
+	po = rec.get("po", {})
+	if not inv or not po:
+		return [], []
+	corrected_items, mismatches = _correct(po, inv, rec.get("result"))
+	if not corrected_items:
+		return [], []
+
+	qty, price, total, grand_total = _line_numbers(corrected_items)
+	po_order_id = po.get("orderId") or po.get("Order_ID") or ""
+	po_vendor = po.get("vendor") or po.get("Vendor") or ""
+
+	corrected = [
+		[it.get("Item"), q, p, t, it.get("Status"), po_order_id, po_vendor, grand_total]
+		for it, q, p, t in zip(corrected_items, qty, price, total)
+	]
+	corrected.append(["GRAND TOTAL", "", "", grand_total, "", po_order_id, po_vendor, grand_total])
+
+	report: List[List[Any]] = []
+	if mismatches:
+		report = [list(r) for r in zip(*(_report_column([m[k] for m in mismatches])[0] for k in range(4)))]
+	return corrected, report
+
+
+def iter_csv_export(records: Iterable[Dict[str, Any]], export_type: str = "corrected", flush_rows: int = 1000) -> Iterator[str]:
+	"""Yield the export CSV incrementally, one chunk per ``flush_rows`` rows.
+
+	Consumes ``records`` lazily (e.g. a Mongo cursor), so memory stays flat regardless of the number
+	of records. Rows are formatted per record; the only difference from generate_csv_from_records is
+	where pandas widens a column across records (e.g. totals of an all-integer record are written as
+	7 here but 7.0 there when another record has fractional totals).
+	"""
+	columns = REPORT_COLUMNS if export_type == "report" else CORRECTED_COLUMNS
+	t0 = time.perf_counter()
+	buf = StringIO()
+	writer = csv.writer(buf, lineterminator=os.linesep)
+	writer.writerow(columns)
+	pending = 0
+	n_records = n_rows = 0
+	for rec in records:
+		n_records += 1
+		try:
+			corrected, report = record_rows(rec)
+		except Exception as e:
+			logger.warning("Export failed for record %s: %s", rec.get("_id"), e)
+			continue
+		for row in (report if export_type == "report" else corrected):
+			writer.writerow([_cell(v) for v in row])
+			pending += 1
+			n_rows += 1
+		if pending >= flush_rows:
+			yield buf.getvalue()
+			buf.seek(0)
+			buf.truncate()
+			pending = 0
+	if buf.tell():
+		yield buf.getvalue()
+	EXPORT_RECORDS.inc(n_records, format="csv_stream")
+	EXPORT_ROWS.inc(n_rows, format="csv_stream", type=export_type)
+	EXPORT_SECONDS.observe(time.perf_counter() - t0, format="csv_stream")
+
+
+def gzip_chunks(chunks: Iterable[str], level: int = 6) -> Iterator[bytes]:
+	"""Gzip-compress a stream of text chunks on the fly."""
+	z = zlib.compressobj(level, zlib.DEFLATED, 31)
+	for chunk in chunks:
+		data = z.compress(chunk.encode('utf-8'))
+		if data:
+			yield data
+	yield z.flush()
+
+
+# --- columnar (Parquet / Arrow IPC) export ---
+
+COLUMNAR_FORMATS = {"parquet": ("application/vnd.apache.parquet", "parquet"), "arrow": ("application/vnd.apache.arrow.file", "arrow")}
+COLUMNAR_TABLES = ("lines", "summary", "report")
+
+
+def columnar_schema(table: str):
+	"""Typed schemas: line rows, per-record summaries and mismatches are separate tables."""
+	dict_str = pa.dictionary(pa.int32(), pa.string())
+	if table == "summary":
+		return pa.schema([("Record_ID", pa.string()), ("Order_ID", pa.string()), ("Vendor", dict_str), ("Lines", pa.int32()), ("Grand_Total", pa.float64())])
+	if table == "report":
+		return pa.schema([("Record_ID", pa.string()), ("Segment", pa.string()), ("Attribute", dict_str), ("Invoice_Value", pa.string()), ("Corrected_Value", pa.string())])
+	return pa.schema([
+		("Record_ID", pa.string()), ("Order_ID", pa.string()), ("Vendor", dict_str), ("Item", pa.string()),
+		("Quantity", pa.int64()), ("Price", pa.float64()), ("Total", pa.float64()), ("Status", dict_str), ("Grand_Total", pa.float64()),
+	])
+
+
+class _DictEncoder:
+	"""Append-only dictionary shared by all batches of a column, so the writer only emits deltas."""
+
+	def __init__(self):
+		self.index: Dict[str, int] = {}
+		self.values: List[str] = []
+
+	def encode(self, values: List[Any]):
+		idx = []
+		for v in values:
+			if v is None:
+				idx.append(None)
+				continue
+			v = str(v)
+			i = self.index.get(v)
+			if i is None:
+				i = self.index[v] = len(self.values)
+				self.values.append(v)
+			idx.append(i)
+		return pa.DictionaryArray.from_arrays(pa.array(idx, type=pa.int32()), pa.array(self.values, type=pa.string()))
+
+
+def _str_or_none(values: List[Any]) -> List[str | None]:
+	return [None if (v is None or (isinstance(v, float) and math.isnan(v))) else str(v) for v in values]
+
+
+def _columnar_batch(cols: ExportColumns, table: str, encoders: Dict[str, _DictEncoder]):
+	schema = columnar_schema(table)
+	if not cols.rec_lines:
+		return schema.empty_table()
+	if table == "report":
+		return pa.table([
+			pa.array([cols.rec_id[r] for r in cols.rep_rec], type=pa.string()),
+			pa.array(_str_or_none(cols.rep_segment), type=pa.string()),
+			encoders["Attribute"].encode(cols.rep_attribute),
+			pa.array(_str_or_none(cols.rep_invoice), type=pa.string()),
+			pa.array(_str_or_none(cols.rep_corrected), type=pa.string()),
+		], schema=schema)
+	lens = np.asarray(cols.rec_lines, dtype=np.int64)
+	if table == "summary":
+		return pa.table([
+			pa.array(cols.rec_id, type=pa.string()),
+			pa.array(_str_or_none(cols.rec_order_id), type=pa.string()),
+			encoders["Vendor"].encode(cols.rec_vendor),
+			pa.array(lens.astype(np.int32)),
+			pa.array(cols.rec_grand, type=pa.float64()),
+		], schema=schema)
+
+	def per_line(values: List[Any]) -> List[Any]:
+		return np.repeat(_object_array(values), lens).tolist()
+
+	return pa.table([
+		pa.array(per_line(cols.rec_id), type=pa.string()),
+		pa.array(_str_or_none(per_line(cols.rec_order_id)), type=pa.string()),
+		encoders["Vendor"].encode(per_line(cols.rec_vendor)),
+		pa.array(_str_or_none(cols.line_item), type=pa.string()),
+		pa.array(cols.line_qty, type=pa.int64()),
+		pa.array(cols.line_price, type=pa.float64()),
+		pa.array(cols.line_total, type=pa.float64()),
+		encoders["Status"].encode(cols.line_status),
+		pa.array(np.repeat(np.asarray(cols.rec_grand, dtype=np.float64), lens)),
+	], schema=schema)
+
+
+def write_columnar_export(records: Iterable[Dict[str, Any]], sink: Any, fmt: str = "parquet", table: str = "lines", batch_records: int = 5000) -> int:
+	"""Write one export table as Parquet or Arrow IPC (file format) to ``sink``; returns rows written.
+
+	Records are consumed ``batch_records`` at a time (each batch goes through the columnar engine), so
+	memory is bounded by the batch rather than the export. Parquet row groups hold up to
+	PARQUET_ROW_GROUP_ROWS rows; Vendor/Status/Attribute are dictionary-encoded in both formats.
+	"""
+	if pa is None:
+		raise RuntimeError('pyarrow is required for Parquet/Arrow export')
+	if fmt not in COLUMNAR_FORMATS:
+		raise ValueError('Unsupported export format: ' + fmt)
+	if table not in COLUMNAR_TABLES:
+		raise ValueError('Unsupported export table: ' + table)
+	schema = columnar_schema(table)
+	if fmt == "parquet":
+		writer = pq.ParquetWriter(sink, schema, compression='zstd', use_dictionary=True)
 	else:
-		if not all_corrected:
-			return ""
-		combined = pd.concat(all_corrected, ignore_index=True)
+		writer = pa_ipc.new_file(sink, schema, options=pa_ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+	encoders = {name: _DictEncoder() for name in ("Vendor", "Status", "Attribute")}
+	t0 = time.perf_counter()
+	rows = n_records = 0
+	pending: List[Any] = []
+	pending_rows = 0
 
-	output = StringIO()
-	combined.to_csv(output, index=False)
-	return output.getvalue()
+	def _flush():
+		nonlocal pending, pending_rows
+		if pending:
+			writer.write_table(pa.concat_tables(pending), row_group_size=PARQUET_ROW_GROUP_ROWS)
+		pending, pending_rows = [], 0
 
+	it = iter(records)
+	try:
+		while True:
+			chunk = list(islice(it, batch_records))
+			if not chunk:
+				break
+			n_records += len(chunk)
+			batch = _columnar_batch(gather_export_columns(chunk), table, encoders)
+			if not batch.num_rows:
+				continue
+			rows += batch.num_rows
+			if fmt == "parquet":
+				# accumulate full row groups instead of one small group per batch
+				pending.append(batch)
+				pending_rows += batch.num_rows
+				if pending_rows >= PARQUET_ROW_GROUP_ROWS:
+					_flush()
+			else:
+				writer.write_table(batch)
+		_flush()
+	finally:
+		writer.close()
+	EXPORT_RECORDS.inc(n_records, format=fmt)
+	EXPORT_ROWS.inc(rows, format=fmt, type=table)
+	EXPORT_SECONDS.observe(time.perf_counter() - t0, format=fmt)
+	return rows
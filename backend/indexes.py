@@ -0,0 +1,78 @@
+import os
+import logging
+from typing import Any, Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+
+from jobs import VERIFY_JOB_TTL_SEC
+
+logger = logging.getLogger('indexes')
+
+MONGO_ENSURE_INDEXES = os.getenv('MONGO_ENSURE_INDEXES', '1') == '1'
+
+# collection -> [(keys, options)]
+INDEXES: Dict[str, List[Tuple[List[Tuple[str, int]], Dict[str, Any]]]] = {
+	"verifications": [
+		# /api/records keyset pagination and every export sort
+		([("createdAt", DESCENDING), ("_id", DESCENDING)], {"name": "createdAt_id"}),
+		# export filters on status, optionally with a date range
+		([("result.status", ASCENDING), ("createdAt", DESCENDING)], {"name": "status_createdAt"}),
+		# storage.py: is a blob still referenced before it is deleted (multikey)
+		([("artifacts", ASCENDING)], {"name": "artifacts"}),
+	],
+	"exports": [
+		([("createdAt", DESCENDING)], {"name": "createdAt"}),
+	],
+	"users": [
+		([("email", ASCENDING)], {"name": "email_unique", "unique": True}),
+	],
+	"po_index": [
+		# auto-pairing: exact order id, then vendor trigrams (multikey) among open POs
+		([("orderKey", ASCENDING), ("status", ASCENDING)], {"name": "orderKey_status"}),
+		([("vendorGrams", ASCENDING), ("status", ASCENDING), ("createdAt", DESCENDING)], {"name": "vendorGrams_status_createdAt"}),
+		([("artifacts", ASCENDING)], {"name": "artifacts"}),
+	],
+	"verify_jobs": [
+		# shared async job state (jobs.py), dropped VERIFY_JOB_TTL_SEC after it finished; finishedAt is
+		# null while a job is queued/running, and TTL indexes skip non-date values
+		([("finishedAt", ASCENDING)], {"name": "finishedAt_ttl", "expireAfterSeconds": VERIFY_JOB_TTL_SEC}),
+		# jobs.recover(): pending jobs at startup
+		([("status", ASCENDING), ("host", ASCENDING)], {"name": "status_host"}),
+	],
+	"stats_counters": [
+		([("kind", ASCENDING), ("key", DESCENDING)], {"name": "kind_key"}),
+		([("kind", ASCENDING), ("total", DESCENDING)], {"name": "kind_total"}),
+	],
+}
+
+
+# indexes replaced by the ones above, dropped by ensure_indexes
+OBSOLETE_INDEXES: Dict[str, List[str]] = {
+	# expired jobs that were still queued; the TTL is on finishedAt now
+	"verify_jobs": ["submittedAt_ttl"],
+}
+
+
+def ensure_indexes(db) -> List[str]:
+	"""Create the indexes the API's queries rely on (idempotent); returns the names ensured.
+
+	A failing index (e.g. duplicate emails blocking the unique one) is logged and skipped so
+	the app still starts.
+	"""
+	created = []
+	for coll, names in OBSOLETE_INDEXES.items():
+		for name in names:
+			try:
+				if name in db[coll].index_information():
+					db[coll].drop_index(name)
+					logger.info("Dropped obsolete index %s on %s", name, coll)
+			except Exception as e:
+				logger.warning("Could not drop index %s on %s: %s", name, coll, e)
+	for coll, specs in INDEXES.items():
+		for keys, opts in specs:
+			try:
+				created.append(f"{coll}.{db[coll].create_index(keys, **opts)}")
+			except Exception as e:
+				logger.warning("Could not create index %s on %s: %s", opts.get("name"), coll, e)
+	logger.info("Ensured %d indexes", len(created))
+	return created
@@ -0,0 +1,242 @@
+import os
+import time
+import uuid
+import socket
+import queue
+import threading
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger('jobs')
+
+VERIFY_WORKERS = int(os.getenv('VERIFY_WORKERS', '2'))
+VERIFY_QUEUE_MAX = int(os.getenv('VERIFY_QUEUE_MAX', '32'))
+VERIFY_JOB_TTL_SEC = int(os.getenv('VERIFY_JOB_TTL_SEC', '3600'))
+# seconds between heartbeats; the owning process refreshes updatedAt of its queued/running stored jobs
+VERIFY_JOB_HEARTBEAT_SEC = float(os.getenv('VERIFY_JOB_HEARTBEAT_SEC', '30'))
+# a stored job still queued/running without a heartbeat for this long is failed by recover(), on any host
+VERIFY_JOB_STALE_SEC = int(os.getenv('VERIFY_JOB_STALE_SEC', '600'))
+
+HOST = socket.gethostname()
+PENDING = ("queued", "running")
+TIME_FIELDS = ("submittedAt", "startedAt", "finishedAt", "updatedAt")
+
+
+def _utc(v: Any) -> Any:
+	# pymongo returns naive UTC datetimes
+	return v.replace(tzinfo=timezone.utc) if isinstance(v, datetime) and v.tzinfo is None else v
+
+
+def _pid_alive(pid) -> bool:
+	if not isinstance(pid, int):
+		return False
+	try:
+		os.kill(pid, 0)
+	except ProcessLookupError:
+		return False
+	except PermissionError:
+		return True  # exists, owned by another user
+	except OSError:
+		return False
+	return True
+
+
+class QueueFull(Exception):
+	"""Raised by JobQueue.submit when the pending queue is at capacity."""
+
+
+class JobQueue:
+	"""Bounded in-process job queue drained by a pool of worker threads.
+
+	Jobs are kept in memory; finished jobs are dropped after ``ttl`` seconds.
+	Workers are started lazily on the first submit so importing the module is cheap.
+	With a ``store`` collection every state change is also written there, so ``get`` answers for
+	jobs queued by other server processes (a poll may land on any worker). Stored jobs record the
+	host and pid that run them, and the owner refreshes their ``updatedAt`` (and ``queueDepth``)
+	every VERIFY_JOB_HEARTBEAT_SEC while they are pending; ``recover`` fails the ones a dead process
+	left unfinished. A job's final state is only stored while it is still pending there.
+	"""
+
+	def __init__(self, workers: int = VERIFY_WORKERS, maxsize: int = VERIFY_QUEUE_MAX, ttl: int = VERIFY_JOB_TTL_SEC, name: str = 'verify', store=None):
+		self.workers = max(1, workers)
+		self.maxsize = max(1, maxsize)
+		self.ttl = ttl
+		self.name = name
+		self.store = store
+		self._q: queue.Queue = queue.Queue(maxsize=self.maxsize)
+		self._jobs: Dict[str, Dict[str, Any]] = {}
+		self._lock = threading.Lock()
+		self._threads: List[threading.Thread] = []
+		self._stopping = threading.Event()
+
+	def _start(self) -> None:
+		if self._threads:
+			return
+		self._stopping.clear()
+		for i in range(self.workers):
+			t = threading.Thread(target=self._worker, name=f"{self.name}-worker-{i}", daemon=True)
+			t.start()
+			self._threads.append(t)
+		if self.store is not None:
+			t = threading.Thread(target=self._heartbeat, name=f"{self.name}-heartbeat", daemon=True)
+			t.start()
+			self._threads.append(t)
+		logger.info("Started %d %s workers (queue max=%d)", self.workers, self.name, self.maxsize)
+
+	def submit(self, fn: Callable[..., Any], *args, **kwargs) -> str:
+		with self._lock:
+			self._start()
+			self._prune()
+			job_id = uuid.uuid4().hex
+			job = {
+				"id": job_id,
+				"status": "queued",
+				"submittedAt": datetime.now(timezone.utc),
+				"startedAt": None,
+				"finishedAt": None,
+				"result": None,
+				"error": None,
+			}
+			try:
+				self._q.put_nowait((job_id, fn, args, kwargs))
+			except queue.Full:
+				raise QueueFull(f"{self.name} queue is full ({self.maxsize} pending)")
+			self._jobs[job_id] = job
+			snapshot = dict(job)
+		self._persist(snapshot)
+		logger.info("Queued %s job id=%s depth=%d", self.name, job_id, self._q.qsize())
+		return job_id
+
+	def _persist(self, job: Dict[str, Any]) -> bool:
+		"""Store a state change; False if the stored job had already been finished elsewhere."""
+		if self.store is None:
+			return True
+		try:
+			doc = {"_id": job["id"], **{k: v for k, v in job.items() if k != "id"}, "host": HOST, "pid": os.getpid(),
+				"updatedAt": datetime.now(timezone.utc), "queueDepth": self.depth()}
+			if job["status"] == "queued":
+				self.store.replace_one({"_id": job["id"]}, doc, upsert=True)
+			elif not self.store.replace_one({"_id": job["id"], "status": {"$in": list(PENDING)}}, doc).matched_count:
+				# recover() in another process gave up on it (or it was never stored); keep that answer
+				logger.warning("Stored %s job %s is no longer pending; not storing %s", self.name, job["id"], job["status"])
+				return False
+		except Exception as e:
+			# the local copy stays authoritative for polls on this process
+			logger.warning("Could not store %s job %s: %s", self.name, job["id"], e)
+		return True
+
+	def _heartbeat(self) -> None:
+		while not self._stopping.wait(VERIFY_JOB_HEARTBEAT_SEC):
+			with self._lock:
+				pending = [jid for jid, j in self._jobs.items() if j["status"] in PENDING]
+			if not pending:
+				continue
+			try:
+				self.store.update_many({"_id": {"$in": pending}, "status": {"$in": list(PENDING)}},
+					{"$set": {"updatedAt": datetime.now(timezone.utc), "queueDepth": self.depth()}})
+			except Exception as e:
+				logger.warning("Could not refresh %d stored %s jobs: %s", len(pending), self.name, e)
+
+	def get(self, job_id: str) -> Dict[str, Any] | None:
+		"""The job, with ``queueDepth`` of the process that owns it (as of its last heartbeat if remote)."""
+		with self._lock:
+			job = self._jobs.get(job_id)
+			if job:
+				return {**job, "queueDepth": self.depth()}
+		if self.store is None:
+			return None
+		doc = self.store.find_one({"_id": job_id})
+		if doc is None:
+			return None
+		doc["id"] = doc.pop("_id")
+		doc.pop("host", None)
+		doc.pop("pid", None)
+		doc.pop("updatedAt", None)
+		for k in TIME_FIELDS:
+			if k in doc:
+				doc[k] = _utc(doc[k])
+		return doc
+
+	def recover(self) -> int:
+		"""Fail stored jobs that can no longer finish; returns how many were failed.
+
+		Called at process start. A job is abandoned if it is queued/running on this host under a
+		pid that no longer exists (a restarted or killed worker), or if its owner, on any host, has
+		not refreshed it for VERIFY_JOB_STALE_SEC. Without this a poll would report it queued forever.
+		"""
+		if self.store is None:
+			return 0
+		now = datetime.now(timezone.utc)
+		dead = []
+		for doc in self.store.find({"status": {"$in": list(PENDING)}, "host": HOST}, {"pid": 1}):
+			if doc.get("pid") != os.getpid() and not _pid_alive(doc.get("pid")):
+				dead.append(doc["_id"])
+		cutoff = datetime.fromtimestamp(now.timestamp() - VERIFY_JOB_STALE_SEC, timezone.utc)
+		query = {"status": {"$in": list(PENDING)}, "$or": [
+			{"_id": {"$in": dead}},
+			{"updatedAt": {"$lt": cutoff}},
+			{"updatedAt": {"$exists": False}, "submittedAt": {"$lt": cutoff}},
+		]}
+		try:
+			n = self.store.update_many(query, {"$set": {"status": "failed", "error": "interrupted: the server process stopped", "finishedAt": now}}).modified_count
+		except Exception as e:
+			logger.warning("Could not recover stale %s jobs: %s", self.name, e)
+			return 0
+		if n:
+			logger.warning("Marked %d abandoned %s jobs failed", n, self.name)
+		return n
+
+	def depth(self) -> int:
+		return self._q.qsize()
+
+	def _prune(self) -> None:
+		cutoff = time.time() - self.ttl
+		stale = [jid for jid, j in self._jobs.items() if j["finishedAt"] is not None and j["finishedAt"].timestamp() < cutoff]
+		for jid in stale:
+			del self._jobs[jid]
+
+	def _worker(self) -> None:
+		while not self._stopping.is_set():
+			try:
+				job_id, fn, args, kwargs = self._q.get(timeout=0.5)
+			except queue.Empty:
+				continue
+			with self._lock:
+				job = self._jobs.get(job_id)
+				if job is not None:
+					job["status"] = "running"
+					job["startedAt"] = datetime.now(timezone.utc)
+					snapshot = dict(job)
+			if job is not None:
+				self._persist(snapshot)
+			try:
+				out = fn(*args, **kwargs)
+				update = {"status": "done", "result": out}
+			except Exception as e:
+				logger.exception("%s job %s failed: %s", self.name, job_id, e)
+				update = {"status": "failed", "error": str(e)}
+			finally:
+				self._q.task_done()
+			with self._lock:
+				job = self._jobs.get(job_id)
+				if job is not None:
+					job.update(update)
+					job["finishedAt"] = datetime.now(timezone.utc)
+					snapshot = dict(job)
+			if job is not None and not self._persist(snapshot):
+				# every poll must see the same outcome: take over the stored one
+				stored = self.store.find_one({"_id": job_id}, {"status": 1, "error": 1, "result": 1, "finishedAt": 1}) or {}
+				with self._lock:
+					job.update({k: stored.get(k) for k in ("status", "error", "result")})
+					job["finishedAt"] = _utc(stored.get("finishedAt")) or job["finishedAt"]
+
+	def shutdown(self, wait: bool = True, drain: bool = False) -> None:
+		"""Stop the workers; with ``drain`` the jobs already queued are finished first."""
+		if drain and self._threads:
+			self._q.join()
+		self._stopping.set()
+		if wait:
+			for t in self._threads:
+				t.join()
+		self._threads = []
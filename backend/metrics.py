@@ -0,0 +1,352 @@
+import os
+import glob
+import json
+import atexit
+import bisect
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+METRICS_PREFIX = os.getenv('METRICS_PREFIX', 'invosync')
+# Multi-process servers (serve.py sets it): every process writes its values to a file in this
+# directory and render() merges them, so one scrape covers all workers. Unset = this process only.
+METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR', '')
+# how often a process rewrites its file (and always at exit and before rendering)
+METRICS_FLUSH_SEC = float(os.getenv('METRICS_FLUSH_SEC', '2'))
+
+logger = logging.getLogger('metrics')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+	return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+	parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+	if extra:
+		parts.append(extra)
+	return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _fmt(v: float) -> str:
+	if v == float('inf'):
+		return '+Inf'
+	return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric:
+	kind = 'untyped'
+
+	def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+		self.name = f"{METRICS_PREFIX}_{name}" if METRICS_PREFIX else name
+		self.help = help
+		self.labelnames = tuple(labelnames)
+		self._lock = threading.Lock()
+
+	def _key(self, labels: Dict[str, str]) -> LabelKey:
+		return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+	def header(self) -> List[str]:
+		return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+	kind = 'counter'
+
+	def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+		super().__init__(name, help, labelnames)
+		self._values: Dict[LabelKey, float] = {}
+
+	def inc(self, value: float = 1, **labels) -> None:
+		if not METRICS_ENABLED:
+			return
+		key = self._key(labels)
+		with self._lock:
+			self._values[key] = self._values.get(key, 0) + value
+		_touch()
+
+	def render(self) -> List[str]:
+		with self._lock:
+			items = sorted(self._values.items())
+		return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+	def snapshot(self) -> Dict[str, Any]:
+		with self._lock:
+			values = [[list(k), v] for k, v in self._values.items()]
+		return {"type": "counter", "help": self.help, "labelnames": list(self.labelnames), "values": values}
+
+	def merge(self, values: List[Any]) -> None:
+		for key, v in values:
+			key = tuple(key)
+			self._values[key] = self._values.get(key, 0) + v
+
+
+class Histogram(_Metric):
+	kind = 'histogram'
+
+	def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+		super().__init__(name, help, labelnames)
+		self.buckets = tuple(sorted(buckets))
+		# per label set: [bucket counts..., sum, count]
+		self._values: Dict[LabelKey, List[float]] = {}
+
+	def observe(self, value: float, **labels) -> None:
+		if not METRICS_ENABLED:
+			return
+		key = self._key(labels)
+		i = bisect.bisect_left(self.buckets, value)
+		with self._lock:
+			row = self._values.get(key)
+			if row is None:
+				row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+			if i < len(self.buckets):
+				row[i] += 1
+			row[-2] += value
+			row[-1] += 1
+		_touch()
+
+	@contextmanager
+	def time(self, **labels) -> Iterator[None]:
+		t0 = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.observe(time.perf_counter() - t0, **labels)
+
+	def render(self) -> List[str]:
+		with self._lock:
+			items = sorted((k, list(v)) for k, v in self._values.items())
+		out = self.header()
+		for key, row in items:
+			cumulative = 0.0
+			for bound, n in zip(self.buckets, row):
+				cumulative += n
+				le = 'le="%s"' % _fmt(bound)
+				out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {_fmt(cumulative)}")
+			le = 'le="+Inf"'
+			out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {_fmt(row[-1])}")
+			out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(row[-2])}")
+			out.append(f"{self.name}_count{_labels(self.labelnames, key)} {_fmt(row[-1])}")
+		return out
+
+	def snapshot(self) -> Dict[str, Any]:
+		with self._lock:
+			values = [[list(k), list(v)] for k, v in self._values.items()]
+		return {"type": "histogram", "help": self.help, "labelnames": list(self.labelnames), "buckets": list(self.buckets), "values": values}
+
+	def merge(self, values: List[Any]) -> None:
+		for key, row in values:
+			key = tuple(key)
+			mine = self._values.get(key)
+			self._values[key] = list(row) if mine is None else [a + b for a, b in zip(mine, row)]
+
+
+class CallbackMetric(_Metric):
+	"""Gauge or counter read at scrape time from ``fn`` (a number, or {label value: number})."""
+
+	def __init__(self, name: str, help: str, fn: Callable[[], float | Dict[str, float]], kind: str = 'gauge', labelname: str | None = None, aggregate: str = 'sum'):
+		super().__init__(name, help, (labelname,) if labelname else ())
+		self.kind = kind
+		self.fn = fn
+		# how values of several processes combine: 'sum' (per-process amounts) or 'max' (one shared value)
+		self.aggregate = aggregate
+
+	def _value(self) -> float | Dict[str, float] | None:
+		try:
+			return self.fn()
+		except Exception:
+			return None
+
+	def render(self, value: Any = None) -> List[str]:
+		value = self._value() if value is None else value
+		if value is None:
+			return []
+		if isinstance(value, dict):
+			rows = [f"{self.name}{_labels(self.labelnames, (k,))} {_fmt(v)}" for k, v in sorted(value.items())]
+		else:
+			rows = [f"{self.name} {_fmt(value)}"]
+		return self.header() + rows
+
+	def snapshot(self) -> Dict[str, Any]:
+		return {"type": "callback", "kind": self.kind, "help": self.help, "labelnames": list(self.labelnames),
+			"aggregate": self.aggregate, "value": self._value()}
+
+
+class Registry:
+	def __init__(self):
+		self._metrics: Dict[str, _Metric] = {}
+		self._lock = threading.Lock()
+
+	def register(self, metric):
+		with self._lock:
+			existing = self._metrics.get(metric.name)
+			if existing is not None:
+				if isinstance(metric, CallbackMetric):
+					# re-registration (e.g. app reloaded) replaces the callback
+					self._metrics[metric.name] = metric
+					return metric
+				return existing
+			self._metrics[metric.name] = metric
+			return metric
+
+	def render(self) -> str:
+		with self._lock:
+			metrics = list(self._metrics.values())
+		lines: List[str] = []
+		for m in metrics:
+			lines.extend(m.render())
+		return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+	return REGISTRY.register(Counter(name, help, labelnames))
+
+
+def histogram(name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+	return REGISTRY.register(Histogram(name, help, labelnames, buckets))
+
+
+def callback(name: str, help: str, fn: Callable[[], float | Dict[str, float]], kind: str = 'gauge', labelname: str | None = None, aggregate: str = 'sum') -> CallbackMetric:
+	return REGISTRY.register(CallbackMetric(name, help, fn, kind, labelname, aggregate))
+
+
+# --- multi-process mode (METRICS_MULTIPROC_DIR) ---
+
+_flush_lock = threading.Lock()
+_flusher_pid: int | None = None
+_file: str | None = None
+_dirty = threading.Event()
+
+
+def _touch() -> None:
+	if not METRICS_MULTIPROC_DIR:
+		return
+	_dirty.set()
+	if _flusher_pid != os.getpid():
+		_start_flusher()
+
+
+def _start_flusher() -> None:
+	"""One flush thread per process (a forked worker starts its own)."""
+	global _flusher_pid, _file
+	with _flush_lock:
+		if _flusher_pid == os.getpid():
+			return
+		_flusher_pid = os.getpid()
+		# start time in the name: a later process reusing the pid must not overwrite this file
+		_file = os.path.join(METRICS_MULTIPROC_DIR, f"{os.getpid()}_{time.time_ns()}.json")
+		threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+		atexit.register(flush)
+
+
+def _flush_loop() -> None:
+	while True:
+		_dirty.wait()
+		time.sleep(METRICS_FLUSH_SEC)
+		_dirty.clear()
+		flush()
+
+
+def flush() -> None:
+	"""Write this process's values to its file in METRICS_MULTIPROC_DIR (atomically)."""
+	if not METRICS_MULTIPROC_DIR or _flusher_pid != os.getpid() or _file is None:
+		return
+	with REGISTRY._lock:
+		metrics = dict(REGISTRY._metrics)
+	data = {"pid": os.getpid(), "metrics": {name: m.snapshot() for name, m in metrics.items()}}
+	tmp = _file + '.tmp'
+	try:
+		with _flush_lock:
+			with open(tmp, 'w') as f:
+				json.dump(data, f)
+			os.replace(tmp, _file)
+	except OSError as e:
+		logger.warning("Could not write metrics file %s: %s", _file, e)
+
+
+def _pid_alive(pid: int) -> bool:
+	try:
+		os.kill(pid, 0)
+	except ProcessLookupError:
+		return False
+	except OSError:
+		return True
+	return True
+
+
+def _render_multiprocess() -> str:
+	"""Counters and histograms summed over every process that wrote a file (exited ones included, so
+	totals never go backwards); callback gauges only over live processes."""
+	_start_flusher()
+	flush()
+	merged: Dict[str, _Metric] = {}
+	values: Dict[str, List[Any]] = {}
+	for path in sorted(glob.glob(os.path.join(METRICS_MULTIPROC_DIR, '*.json'))):
+		try:
+			with open(path) as f:
+				data = json.load(f)
+		except (OSError, ValueError):
+			continue  # being replaced, or not ours
+		alive = _pid_alive(data.get("pid", 0))
+		for name, spec in data.get("metrics", {}).items():
+			m = merged.get(name)
+			if m is None:
+				if spec["type"] == "counter":
+					m = Counter(name, spec["help"], spec["labelnames"])
+				elif spec["type"] == "histogram":
+					m = Histogram(name, spec["help"], spec["labelnames"], spec["buckets"])
+				else:
+					m = CallbackMetric(name, spec["help"], lambda: None, spec["kind"], (spec["labelnames"] or [None])[0], spec["aggregate"])
+				m.name = name  # already prefixed
+				merged[name] = m
+			if spec["type"] == "callback":
+				if spec["value"] is not None and (alive or spec["kind"] == "counter"):
+					values.setdefault(name, []).append(spec["value"])
+			else:
+				m.merge(spec["values"])
+	lines: List[str] = []
+	for name, m in merged.items():
+		if isinstance(m, CallbackMetric):
+			lines.extend(m.render(_combine(values.get(name, []), m.aggregate)) if values.get(name) else [])
+		else:
+			lines.extend(m.render())
+	return '\n'.join(lines) + '\n'
+
+
+def _combine(values: List[Any], aggregate: str) -> Any:
+	pick = max if aggregate == 'max' else sum
+	if isinstance(values[0], dict):
+		keys = {k for v in values for k in v}
+		return {k: pick(v.get(k, 0) for v in values) for k in keys}
+	return pick(values)
+
+
+def clear_multiprocess_dir(path: str) -> None:
+	"""Remove the files of a previous run (call before starting the workers)."""
+	os.makedirs(path, exist_ok=True)
+	for f in glob.glob(os.path.join(path, '*.json*')):
+		try:
+			os.remove(f)
+		except OSError:
+			pass
+
+
+def render() -> str:
+	"""Everything registered, in the Prometheus text exposition format: this process's values, or
+	all processes' with METRICS_MULTIPROC_DIR."""
+	if METRICS_MULTIPROC_DIR:
+		return _render_multiprocess()
+	return REGISTRY.render()
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
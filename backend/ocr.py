@@ -1,19 +1,13 @@
 import os
-from typing import List, Dict, Tuple
-from io import BytesIO
+import time
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Tuple, Any, Iterator, Union
 import logging
 
-# Prefer pytesseract pipeline from provided project; keep PaddleOCR optional fallback
-try:
-	import pytesseract  # type: ignore
-	# Configure executable path if not on PATH
-	exe_hint = os.getenv('TESSERACT_EXE') or r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
-	if os.path.exists(exe_hint):
-		pytesseract.pytesseract.tesseract_cmd = exe_hint  # type: ignore
-		logging.getLogger('ocr').info("Using Tesseract exe: %s", exe_hint)
-except Exception:
-	pytesseract = None  # type: ignore
-
 try:
 	from pdf2image import convert_from_path  # type: ignore
 except Exception:  # pragma: no cover
@@ -26,6 +20,10 @@ except Exception:  # pragma: no cover
 
 from PIL import Image, ImageEnhance, ImageFilter
 
+from ocr_cache import get_cache, file_sha256
+from ocr_engine import get_engine, tesseract_version
+import metrics
+
 # Optional OpenCV / NumPy for preprocessing and zonal crops
 try:
 	import cv2  # type: ignore
@@ -36,10 +34,33 @@ except Exception:  # pragma: no cover
 
 logger = logging.getLogger('ocr')
 
+OCR_PAGES = metrics.counter('ocr_pages_total', 'Pages returned by ocr_uploads, by source (ocr or cache)', ['source'])
+OCR_PAGE_ERRORS = metrics.counter('ocr_page_errors_total', 'Pages whose OCR failed')
+OCR_CHARS = metrics.counter('ocr_chars_total', 'Characters of text extracted by OCR (cached pages included)')
+OCR_PAGE_SECONDS = metrics.histogram('ocr_page_seconds', 'Render + OCR time of one uncached page')
+
+# Number of OCR worker processes; 0 keeps OCR serial on the calling thread
+OCR_PROCESSES = int(os.getenv('OCR_PROCESSES', '0'))
+
 
-def preprocess_image_basic(image_path: str) -> Image.Image:
-	"""Enhance image for better OCR accuracy (from user's ref)."""
-	img = Image.open(image_path)
+# A page to OCR: a raster image path, or (pdf_path, page_index) rendered on demand
+PageRef = Union[str, Tuple[str, int]]
+
+# resolution PDF pages are rendered at for OCR, with either renderer (pdf2image's default)
+PDF_RENDER_DPI = int(os.getenv('PDF_RENDER_DPI', '200'))
+PDF_RENDER_ZOOM = PDF_RENDER_DPI / 72
+
+# Default preprocessing engine ('basic' = PIL sharpen/contrast, 'cv' = OpenCV binarize/deskew)
+OCR_PREPROCESS = os.getenv('OCR_PREPROCESS', 'basic')
+# cv: pages scanned above this resolution are downscaled to it (never upscaled)
+OCR_TARGET_DPI = int(os.getenv('OCR_TARGET_DPI', '300'))
+# cv: skew search range in degrees
+OCR_DESKEW_MAX_ANGLE = float(os.getenv('OCR_DESKEW_MAX_ANGLE', '5'))
+
+
+def preprocess_image_basic(image: str | Image.Image) -> Image.Image:
+	"""Enhance image for better OCR accuracy (from user's ref). Accepts a path or an in-memory image."""
+	img = Image.open(image) if isinstance(image, str) else image
 	img = img.convert("L")
 	img = img.filter(ImageFilter.SHARPEN)
 	enhancer = ImageEnhance.Contrast(img)
@@ -47,73 +68,357 @@ def preprocess_image_basic(image_path: str) -> Image.Image:
 	return img
 
 
-def _pdf_to_images_pymupdf(path: str) -> List[Image.Image]:
+def _page_dpi(img: Image.Image) -> float | None:
+	dpi = img.info.get('dpi')
+	try:
+		return float(dpi[0]) if dpi else None
+	except (TypeError, ValueError, IndexError):
+		return None
+
+
+def _crop_borders(gray: "np.ndarray", pad: int = 10) -> "np.ndarray":
+	"""Trim blank margins and solid scanner edges (rows/cols almost entirely dark or entirely light)."""
+	dark = gray < 128
+	rows = dark.mean(axis=1)
+	cols = dark.mean(axis=0)
+	keep_r = np.flatnonzero((rows > 0) & (rows < 0.9))
+	keep_c = np.flatnonzero((cols > 0) & (cols < 0.9))
+	if keep_r.size == 0 or keep_c.size == 0:
+		return gray
+	r0, r1 = max(keep_r[0] - pad, 0), min(keep_r[-1] + pad + 1, gray.shape[0])
+	c0, c1 = max(keep_c[0] - pad, 0), min(keep_c[-1] + pad + 1, gray.shape[1])
+	return gray[r0:r1, c0:c1]
+
+
+def _skew_angle(gray: "np.ndarray") -> float:
+	"""Text skew in degrees, by maximizing the row projection variance of a small binarized copy."""
+	scale = min(1.0, 800.0 / max(gray.shape))
+	small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+	_, ink = cv2.threshold(small, 0, 1, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+	ink = ink.astype(np.float32)
+	h, w = ink.shape
+	center = (w / 2, h / 2)
+
+	def score(angle: float) -> float:
+		m = cv2.getRotationMatrix2D(center, angle, 1.0)
+		rotated = cv2.warpAffine(ink, m, (w, h), flags=cv2.INTER_NEAREST, borderValue=0)
+		return float(np.var(rotated.sum(axis=1)))
+
+	# coarse 1 degree steps, then refine to 0.1 around the best
+	best = max(np.arange(-OCR_DESKEW_MAX_ANGLE, OCR_DESKEW_MAX_ANGLE + 0.01, 1.0), key=score)
+	return float(max(np.arange(best - 0.9, best + 0.91, 0.1), key=score))
+
+
+def preprocess_image_cv(image: str | Image.Image) -> Image.Image:
+	"""Vectorized preprocessing: downscale to OCR_TARGET_DPI, crop borders, deskew, adaptive binarize."""
+	if cv2 is None or np is None:
+		return preprocess_image_basic(image)
+	img = Image.open(image) if isinstance(image, str) else image
+	dpi = _page_dpi(img)
+	gray = np.asarray(img.convert("L"))
+	if dpi and dpi > OCR_TARGET_DPI:
+		f = OCR_TARGET_DPI / dpi
+		gray = cv2.resize(gray, None, fx=f, fy=f, interpolation=cv2.INTER_AREA)
+	gray = _crop_borders(gray)
+	angle = _skew_angle(gray)
+	if abs(angle) >= 0.2:
+		h, w = gray.shape
+		m = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+		gray = cv2.warpAffine(gray, m, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+	gray = cv2.medianBlur(gray, 3)
+	block = max(15, (min(gray.shape) // 40) | 1)
+	binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, block, 15)
+	return Image.fromarray(binary)
+
+
+PREPROCESSORS = {
+	'basic': preprocess_image_basic,
+	'cv': preprocess_image_cv,
+}
+
+
+def _pixmap_to_image(pix) -> Image.Image:
+	"""Wrap pixmap samples as a PIL image without copying (valid while ``pix`` is alive)."""
+	mode = 'RGB' if pix.n == 3 else 'L'
+	im = Image.frombuffer(mode, (pix.width, pix.height), pix.samples_mv, 'raw', mode, pix.stride, 1)
+	im.info['dpi'] = (PDF_RENDER_DPI, PDF_RENDER_DPI)
+	return im
+
+
+def _render_pdf_page(page):
+	return page.get_pixmap(matrix=fitz.Matrix(PDF_RENDER_ZOOM, PDF_RENDER_ZOOM), alpha=False)
+
+
+def _iter_pdf_pages_pymupdf(path: str, indices: List[int] | None = None) -> Iterator[Tuple[int, Image.Image]]:
+	"""Lazily render PDF pages; only the page being consumed is held in memory."""
 	if fitz is None:
 		raise RuntimeError('PyMuPDF not available to render PDF')
-	logger.info("Rendering PDF via PyMuPDF: %s", path)
 	doc = fitz.open(path)
-	imgs: List[Image.Image] = []
-	for i, page in enumerate(doc):
-		pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-		buf = BytesIO(pix.tobytes("png"))
-		im = Image.open(buf).convert('RGB')
-		logger.info("Page %d size=%s", i, im.size)
-		imgs.append(im)
-	doc.close()
-	return imgs
-
-
-def pdf_to_images(path: str) -> List[Image.Image]:
-	if convert_from_path is not None:
-		try:
-			logger.info("Rendering PDF via pdf2image: %s", path)
-			imgs = convert_from_path(path, fmt='png')
-			for i, im in enumerate(imgs):
-				logger.info("pdf2image page %d size=%s", i, im.size)
-			return imgs
-		except Exception as e:
-			logger.warning("pdf2image failed, fallback to PyMuPDF: %s", e)
-	return _pdf_to_images_pymupdf(path)
-
-
-def image_paths_from_upload(path: str) -> List[str]:
-	root, ext = os.path.splitext(path.lower())
-	if ext == '.pdf':
-		images = pdf_to_images(path)
-		out_paths = []
-		for i, im in enumerate(images):
-			out = f"{root}_p{i}.png"
-			im.save(out)
-			logger.info("Saved page image %s", out)
-			out_paths.append(out)
-		return out_paths
+	try:
+		for i in (range(len(doc)) if indices is None else indices):
+			pix = _render_pdf_page(doc[i])
+			im = _pixmap_to_image(pix)
+			logger.info("Page %d size=%s", i, im.size)
+			yield i, im
+			del im, pix
+	finally:
+		doc.close()
+
+
+def pdf_page_count(path: str) -> int:
+	if fitz is not None:
+		with fitz.open(path) as doc:
+			return len(doc)
+	from pdf2image import pdfinfo_from_path  # type: ignore
+	return int(pdfinfo_from_path(path)["Pages"])
+
+
+def load_page_image(ref: PageRef) -> Image.Image:
+	"""Materialize one page: open a raster path, or render a single PDF page in memory."""
+	if isinstance(ref, str):
+		return Image.open(ref)
+	path, index = ref
+	if fitz is not None:
+		for _, im in _iter_pdf_pages_pymupdf(path, [index]):
+			return im.copy()
+	if convert_from_path is None:
+		raise RuntimeError('No PDF renderer available')
+	return convert_from_path(path, dpi=PDF_RENDER_DPI, first_page=index + 1, last_page=index + 1)[0]
+
+
+def page_refs_from_upload(path: str) -> List[PageRef]:
+	"""Describe the pages of an upload without rendering them."""
+	if os.path.splitext(path)[1].lower() == '.pdf':
+		return page_refs_for_count(path, pdf_page_count(path))
+	return [path]
+
+
+def page_refs_for_count(path: str, count: int) -> List[PageRef]:
+	if os.path.splitext(path)[1].lower() == '.pdf':
+		return [(path, i) for i in range(count)]
+	return [path]
+
+
+def _ref_label(ref: PageRef) -> str:
+	return ref if isinstance(ref, str) else f"{ref[0]}#p{ref[1]}"
+
+
+def _ocr_image(img: Image.Image, label: str, t0: float, preprocess: str = OCR_PREPROCESS) -> Dict[str, Any]:
+	try:
+		text = get_engine().image_to_string(PREPROCESSORS[preprocess](img))
+		error = None
+		logger.info("OCR extracted %d chars from %s", len(text), label)
+	except Exception as e:
+		logger.exception("OCR failed on %s: %s", label, e)
+		text = ''
+		error = str(e)
+	return {"source": label, "text": text, "ms": int((time.perf_counter() - t0) * 1000), "error": error}
+
+
+def _ocr_page(ref: PageRef, preprocess: str = OCR_PREPROCESS) -> Dict[str, Any]:
+	"""OCR a single page. Runs in the caller or in a pool worker; never raises."""
+	t0 = time.perf_counter()
+	label = _ref_label(ref)
+	try:
+		img = load_page_image(ref)
+	except Exception as e:
+		logger.exception("Loading page failed on %s: %s", label, e)
+		return {"source": label, "text": '', "ms": int((time.perf_counter() - t0) * 1000), "error": str(e)}
+	return _ocr_image(img, label, t0, preprocess)
+
+
+def _is_whole_pdf(refs: List[PageRef]) -> bool:
+	return bool(refs) and all(not isinstance(r, str) and r[0] == refs[0][0] and r[1] == i for i, r in enumerate(refs))
+
+
+def _ocr_serial(refs: List[PageRef], preprocess: str = OCR_PREPROCESS) -> List[Dict[str, Any]]:
+	"""OCR pages on the calling thread, streaming whole PDFs page by page through one open document."""
+	if fitz is None or not _is_whole_pdf(refs):
+		return [_ocr_page(r, preprocess) for r in refs]
+	out: List[Dict[str, Any]] = []
+	path = refs[0][0]
+	t0 = time.perf_counter()
+	try:
+		for i, im in _iter_pdf_pages_pymupdf(path):
+			out.append(_ocr_image(im, _ref_label((path, i)), t0, preprocess))
+			t0 = time.perf_counter()
+	except Exception as e:
+		logger.exception("Rendering failed on %s page %d: %s", path, len(out), e)
+	# a render failure only costs the pages it touched; retry the rest one by one
+	out.extend(_ocr_page(r, preprocess) for r in refs[len(out):])
+	return out
+
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor | None:
+	global _pool
+	if OCR_PROCESSES <= 0:
+		return None
+	with _pool_lock:
+		if _pool is None:
+			# spawn: the web process is threaded, forking it is not safe
+			_pool = ProcessPoolExecutor(max_workers=OCR_PROCESSES, mp_context=multiprocessing.get_context('spawn'))
+			logger.info("Started OCR process pool with %d workers", OCR_PROCESSES)
+		return _pool
+
+
+def shutdown_pool() -> None:
+	global _pool
+	with _pool_lock:
+		if _pool is not None:
+			_pool.shutdown(wait=True, cancel_futures=True)
+			_pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def ocr_pages(refs: List[PageRef], preprocess: str = OCR_PREPROCESS) -> List[Dict[str, Any]]:
+	"""OCR every page, in parallel when OCR_PROCESSES > 0. Results keep the input order.
+
+	Pool workers render their own PDF pages, so only page references cross the process boundary.
+	"""
+	if get_engine() is None:
+		logger.warning("No OCR engine available; returning empty text")
+		return [{"source": _ref_label(r), "text": '', "ms": 0, "error": "no OCR engine available"} for r in refs]
+	pool = _get_pool() if len(refs) > 1 else None
+	if pool is None:
+		return [_ocr_page(r, preprocess) for r in refs]
+	try:
+		return list(pool.map(_ocr_page, refs, [preprocess] * len(refs)))
+	except BrokenProcessPool as e:
+		logger.error("OCR process pool broken, retrying serially: %s", e)
+		shutdown_pool()
+		return [_ocr_page(r, preprocess) for r in refs]
+
+
+def ocr_documents(docs: List[List[PageRef]], preprocess: str = OCR_PREPROCESS, zonal=None) -> List[Tuple[str, List[Dict[str, Any]]]]:
+	"""OCR several documents at once, fanning all their pages out together.
+
+	``zonal`` (a zonal.ZonalOcr) OCRs each document's regions of interest instead, one document
+	per pool worker (see ZonalOcr.ocr_documents).
+	Returns (joined text, per-page results) for each document, in input order.
+	"""
+	if get_engine() is not None and zonal is not None:
+		per_doc = zonal.ocr_documents(docs, preprocess)
+		return [('\n'.join(r["text"] for r in pages), pages) for pages in per_doc]
+	if get_engine() is not None and _get_pool() is None:
+		results = [r for refs in docs for r in _ocr_serial(refs, preprocess)]
 	else:
-		logger.info("Using raster image %s", path)
-		return [path]
+		results = ocr_pages([r for refs in docs for r in refs], preprocess)
+	out: List[Tuple[str, List[Dict[str, Any]]]] = []
+	i = 0
+	for paths in docs:
+		pages = results[i:i + len(paths)]
+		i += len(paths)
+		out.append(('\n'.join(r["text"] for r in pages), pages))
+	return out
+
 
+# Bump when preprocessing or OCR behaviour changes so cached text is not reused
+OCR_PIPELINE_VERSION = 'basic-1'
+_tesseract_version: str | None = None
 
-def ocr_text_from_paths(paths: List[str]) -> str:
-	"""Run OCR using pytesseract over provided page/image paths and return text with newlines."""
-	text_parts: List[str] = []
-	if pytesseract is None:
-		logger.warning("pytesseract not available; returning empty text")
-		return ''
-	for p in paths:
+
+def ocr_config_fingerprint(preprocess: str = OCR_PREPROCESS, zonal: bool = False) -> str:
+	"""Identify everything that changes OCR output besides the input bytes."""
+	global _tesseract_version
+	if _tesseract_version is None:
 		try:
-			# use lightweight preprocessing tuned for OCR
-			img = preprocess_image_basic(p)
-			text = pytesseract.image_to_string(img)
-			logger.info("OCR extracted %d chars from %s", len(text or ''), p)
-			text_parts.append(text or '')
-		except Exception as e:
-			logger.exception("OCR failed on %s: %s", p, e)
-			text_parts.append('')
-	return '\n'.join(text_parts)
+			engine = get_engine()
+			_tesseract_version = f"{tesseract_version() or 'unknown'}|eng={engine.name}" if engine is not None else 'none'
+		except Exception:
+			_tesseract_version = 'unknown'
+	fp = f"{OCR_PIPELINE_VERSION}|pdfdpi={PDF_RENDER_DPI}|tess={_tesseract_version}|pre={preprocess}"
+	if preprocess == 'cv':
+		fp += f"|dpi={OCR_TARGET_DPI}|skew={OCR_DESKEW_MAX_ANGLE}"
+	if zonal:
+		# zonal text holds only the header and table regions; never serve it to full-page requests
+		fp += "|zonal"
+	return fp
+
+
+def _cached_page(label: str, text: str) -> Dict[str, Any]:
+	return {"source": label, "text": text, "ms": 0, "error": None, "cached": True}
+
+
+def _observe_pages(docs: List[Tuple[str, List[Dict[str, Any]]]]) -> None:
+	for _, pages in docs:
+		for pg in pages:
+			cached = pg.get("cached", False)
+			OCR_PAGES.inc(source='cache' if cached else 'ocr')
+			if pg.get("error"):
+				OCR_PAGE_ERRORS.inc()
+			elif not cached:
+				OCR_PAGE_SECONDS.observe(pg.get("ms", 0) / 1000)
+			OCR_CHARS.inc(len(pg.get("text") or ''))
+
+
+def ocr_uploads(paths: List[str], preprocess: str | None = None, zonal=None) -> List[Tuple[str, List[Dict[str, Any]]]]:
+	"""OCR uploaded files (PDF or raster) through the content-addressed cache.
+
+	A repeat upload whose pages are all cached skips rasterization and OCR entirely; partially
+	cached documents only OCR the missing pages. ``preprocess`` picks a PREPROCESSORS engine
+	(default OCR_PREPROCESS); ``zonal`` switches to region-of-interest OCR (see ocr_documents).
+	Returns (joined text, per-page results) per upload.
+	"""
+	preprocess = preprocess or OCR_PREPROCESS
+	if preprocess not in PREPROCESSORS:
+		raise ValueError('Unknown preprocess mode: ' + preprocess)
+	cache = get_cache()
+	if cache is None or get_engine() is None:
+		out = ocr_documents([page_refs_from_upload(p) for p in paths], preprocess, zonal)
+		_observe_pages(out)
+		return out
+	fp = ocr_config_fingerprint(preprocess, zonal is not None)
+	hashes = [file_sha256(p) for p in paths]
+	pages: List[List[Dict[str, Any] | None]] = []
+	todo: List[List[PageRef]] = []
+	from_first: List[bool] = []
+	full_hit: List[bool] = []
+	for path, h in zip(paths, hashes):
+		texts = cache.get_document(h, fp)
+		full_hit.append(texts is not None)
+		if texts is not None:
+			logger.info("OCR cache hit for %s (%d pages)", path, len(texts))
+			pages.append([_cached_page(_ref_label(r), t) for r, t in zip(page_refs_for_count(path, len(texts)), texts)])
+			todo.append([])
+			from_first.append(False)
+			continue
+		refs = page_refs_from_upload(path)
+		cached = cache.get_pages(h, fp, len(refs))
+		pages.append([_cached_page(_ref_label(r), t) if t is not None else None for r, t in zip(refs, cached)])
+		todo.append([r for r, t in zip(refs, cached) if t is None])
+		from_first.append(bool(refs) and cached[0] is None)
+	fresh: List[Tuple[str, List[Dict[str, Any]]]] = [('', []) for _ in todo]
+	# zonal OCR treats a document's first page as page 1: when page 1 is cached, OCR the rest whole
+	for first, engine in ((True, zonal), (False, None)):
+		idx = [i for i, refs in enumerate(todo) if refs and from_first[i] == first]
+		if idx:
+			for i, res in zip(idx, ocr_documents([todo[i] for i in idx], preprocess, engine)):
+				fresh[i] = res
+	out: List[Tuple[str, List[Dict[str, Any]]]] = []
+	for h, hit, doc_pages, (_, new_pages) in zip(hashes, full_hit, pages, fresh):
+		it = iter(new_pages)
+		for i, pg in enumerate(doc_pages):
+			if pg is None:
+				pg = doc_pages[i] = next(it)
+				if not pg["error"]:
+					cache.put_page(h, fp, i, pg["text"])
+		if not hit:
+			cache.put_manifest(h, fp, len(doc_pages))
+		out.append(('\n'.join(pg["text"] for pg in doc_pages), doc_pages))  # type: ignore[index]
+	_observe_pages(out)
+	return out
 
 
 def ocr_zonal_from_image_path(image_path: str, zones: Dict[str, List[int]]) -> Dict[str, str]:
 	out: Dict[str, str] = {}
-	if pytesseract is None or cv2 is None or np is None:
+	engine = get_engine()
+	if engine is None or cv2 is None or np is None:
 		return out
 	img = cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), cv2.IMREAD_COLOR)
 	if img is None:
@@ -122,7 +427,7 @@ def ocr_zonal_from_image_path(image_path: str, zones: Dict[str, List[int]]) -> D
 		try:
 			y1, y2, x1, x2 = coords
 			crop = img[y1:y2, x1:x2]
-			text = pytesseract.image_to_string(crop)
+			text = engine.image_to_string(Image.fromarray(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)))
 			out[field] = (text or '').strip()
 			logger.info("Zonal OCR %s -> '%s'", field, out[field])
 		except Exception as e:
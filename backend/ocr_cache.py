@@ -0,0 +1,173 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import logging
+from typing import Dict, List
+
+logger = logging.getLogger('ocr_cache')
+
+OCR_CACHE_ENABLED = os.getenv('OCR_CACHE_ENABLED', '1') == '1'
+OCR_CACHE_DIR = os.getenv('OCR_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'ocr_cache'))
+OCR_CACHE_MAX_MB = int(os.getenv('OCR_CACHE_MAX_MB', '512'))
+OCR_CACHE_MAX_AGE_DAYS = int(os.getenv('OCR_CACHE_MAX_AGE_DAYS', '30'))
+# run an eviction sweep after this many writes
+OCR_CACHE_SWEEP_EVERY = int(os.getenv('OCR_CACHE_SWEEP_EVERY', '100'))
+
+
+# uploads.py names stored uploads <dir>/<sha[:2]>/<sha256><ext>: their hash is their name
+_CONTENT_NAME_RE = re.compile(r'^([0-9a-f]{64})\.[A-Za-z0-9]+$')
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+	m = _CONTENT_NAME_RE.match(os.path.basename(path))
+	if m and os.path.basename(os.path.dirname(path)) == m.group(1)[:2]:
+		return m.group(1)
+	h = hashlib.sha256()
+	with open(path, 'rb') as f:
+		for chunk in iter(lambda: f.read(chunk_size), b''):
+			h.update(chunk)
+	return h.hexdigest()
+
+
+def _key(*parts) -> str:
+	return hashlib.sha256(':'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+
+class OcrCache:
+	"""Content-addressed on-disk cache of OCR text.
+
+	Page entries are keyed by (file hash, page index, OCR config fingerprint); a per-document
+	manifest records the page count so a full hit needs neither rasterization nor OCR.
+	Entries are evicted by age and, beyond the size budget, least recently used first
+	(hits refresh the file mtime).
+	"""
+
+	def __init__(self, root: str = OCR_CACHE_DIR, max_bytes: int = OCR_CACHE_MAX_MB * 1024 * 1024, max_age_sec: int = OCR_CACHE_MAX_AGE_DAYS * 86400):
+		self.root = root
+		self.max_bytes = max_bytes
+		self.max_age_sec = max_age_sec
+		self._lock = threading.Lock()
+		self._writes = 0
+		self.counters: Dict[str, int] = {"hits": 0, "misses": 0, "pageHits": 0, "pageMisses": 0, "writes": 0, "evictions": 0}
+		os.makedirs(self.root, exist_ok=True)
+
+	def _path(self, key: str, suffix: str) -> str:
+		return os.path.join(self.root, key[:2], key + suffix)
+
+	def _read(self, path: str) -> str | None:
+		try:
+			with open(path, 'r', encoding='utf-8') as f:
+				data = f.read()
+			os.utime(path)
+			return data
+		except FileNotFoundError:
+			return None
+
+	def _write(self, path: str, data: str) -> None:
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+		with open(tmp, 'w', encoding='utf-8') as f:
+			f.write(data)
+		os.replace(tmp, path)
+
+	def _count(self, name: str, n: int = 1) -> None:
+		with self._lock:
+			self.counters[name] += n
+
+	def get_document(self, file_hash: str, fingerprint: str) -> List[str] | None:
+		"""Return every page's text for a document, or None unless all pages are cached."""
+		raw = self._read(self._path(_key(file_hash, fingerprint), '.json'))
+		if raw is None:
+			self._count("misses")
+			return None
+		pages = self.get_pages(file_hash, fingerprint, json.loads(raw)["pages"])
+		if any(p is None for p in pages):
+			self._count("misses")
+			return None
+		self._count("hits")
+		return pages  # type: ignore[return-value]
+
+	def get_pages(self, file_hash: str, fingerprint: str, page_count: int) -> List[str | None]:
+		out = [self._read(self._path(_key(file_hash, i, fingerprint), '.txt')) for i in range(page_count)]
+		hits = sum(1 for t in out if t is not None)
+		self._count("pageHits", hits)
+		self._count("pageMisses", len(out) - hits)
+		return out
+
+	def put_page(self, file_hash: str, fingerprint: str, index: int, text: str) -> None:
+		self._write(self._path(_key(file_hash, index, fingerprint), '.txt'), text)
+		self._after_write()
+
+	def put_manifest(self, file_hash: str, fingerprint: str, page_count: int) -> None:
+		self._write(self._path(_key(file_hash, fingerprint), '.json'), json.dumps({"pages": page_count, "createdAt": time.time()}))
+		self._after_write()
+
+	def _after_write(self) -> None:
+		with self._lock:
+			self.counters["writes"] += 1
+			self._writes += 1
+			due = self._writes >= OCR_CACHE_SWEEP_EVERY
+			if due:
+				self._writes = 0
+		if due:
+			self.evict()
+
+	def evict(self) -> int:
+		"""Drop entries older than max age, then least recently used ones until under the size budget."""
+		entries = []
+		for dirpath, _, files in os.walk(self.root):
+			for name in files:
+				p = os.path.join(dirpath, name)
+				try:
+					st = os.stat(p)
+				except FileNotFoundError:
+					continue
+				entries.append((st.st_mtime, st.st_size, p))
+		now = time.time()
+		removed = 0
+		total = 0
+		keep = []
+		for mtime, size, p in entries:
+			if now - mtime > self.max_age_sec:
+				removed += self._unlink(p)
+			else:
+				keep.append((mtime, size, p))
+				total += size
+		keep.sort()
+		for mtime, size, p in keep:
+			if total <= self.max_bytes:
+				break
+			removed += self._unlink(p)
+			total -= size
+		if removed:
+			self._count("evictions", removed)
+			logger.info("OCR cache evicted %d entries (%.1f MB left)", removed, total / 1e6)
+		return removed
+
+	def _unlink(self, path: str) -> int:
+		try:
+			os.remove(path)
+			return 1
+		except FileNotFoundError:
+			return 0
+
+	def stats(self) -> Dict[str, int]:
+		with self._lock:
+			return dict(self.counters)
+
+
+_cache: OcrCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> OcrCache | None:
+	global _cache
+	if not OCR_CACHE_ENABLED:
+		return None
+	with _cache_lock:
+		if _cache is None:
+			_cache = OcrCache()
+		return _cache
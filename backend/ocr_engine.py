@@ -0,0 +1,276 @@
+import os
+import time
+import atexit
+import queue
+import threading
+import multiprocessing
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+from PIL import Image
+
+# Prefer pytesseract pipeline from provided project; keep PaddleOCR optional fallback
+try:
+	import pytesseract  # type: ignore
+	# Configure executable path if not on PATH
+	exe_hint = os.getenv('TESSERACT_EXE') or r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
+	if os.path.exists(exe_hint):
+		pytesseract.pytesseract.tesseract_cmd = exe_hint  # type: ignore
+		logging.getLogger('ocr').info("Using Tesseract exe: %s", exe_hint)
+except Exception:
+	pytesseract = None  # type: ignore
+
+# Optional tesserocr: Tesseract's C API, initialized once and fed images in memory
+try:
+	import tesserocr  # type: ignore
+except Exception:  # pragma: no cover
+	tesserocr = None  # type: ignore
+
+import metrics
+
+logger = logging.getLogger('ocr_engine')
+
+# 'auto' uses resident tesserocr engines when installed, else pytesseract (one process per call)
+OCR_ENGINE = os.getenv('OCR_ENGINE', 'auto')
+OCR_LANG = os.getenv('OCR_LANG', 'eng')
+# resident engines per process; 0 = one per CPU. OCR pool workers always keep a single engine
+OCR_ENGINE_POOL = int(os.getenv('OCR_ENGINE_POOL', '0'))
+# how long a page waits for a free engine before failing
+OCR_ENGINE_TIMEOUT_SEC = float(os.getenv('OCR_ENGINE_TIMEOUT_SEC', '120'))
+# an engine is re-created after this many images, bounding native memory growth
+OCR_ENGINE_MAX_USES = int(os.getenv('OCR_ENGINE_MAX_USES', '1000'))
+
+ENGINE_CALLS = metrics.counter('ocr_engine_calls_total', 'Recognition calls by engine and result', ['engine', 'result'])
+ENGINE_RESTARTS = metrics.counter('ocr_engine_restarts_total', 'Resident OCR engines discarded, by reason', ['reason'])
+ENGINE_WAIT_SECONDS = metrics.histogram('ocr_engine_wait_seconds', 'Time pages waited for a free resident OCR engine')
+
+# image_to_data output: pytesseract's Output.DICT columns the callers use
+DATA_KEYS = ("text", "conf", "block_num", "par_num", "line_num", "left", "top", "width", "height")
+
+
+class PytesseractEngine:
+	"""Runs the tesseract CLI per call (temp image file, language data reloaded each time)."""
+
+	name = 'pytesseract'
+
+	def image_to_string(self, img: Image.Image) -> str:
+		try:
+			text = pytesseract.image_to_string(img, lang=OCR_LANG) or ''
+		except Exception:
+			ENGINE_CALLS.inc(engine=self.name, result='error')
+			raise
+		ENGINE_CALLS.inc(engine=self.name, result='ok')
+		return text
+
+	def image_to_data(self, img: Image.Image) -> Dict[str, List[Any]]:
+		try:
+			d = pytesseract.image_to_data(img, lang=OCR_LANG, output_type=pytesseract.Output.DICT)
+		except Exception:
+			ENGINE_CALLS.inc(engine=self.name, result='error')
+			raise
+		ENGINE_CALLS.inc(engine=self.name, result='ok')
+		return {k: d[k] for k in DATA_KEYS}
+
+	def version(self) -> str:
+		return str(pytesseract.get_tesseract_version())
+
+	def health(self) -> Dict[str, Any]:
+		try:
+			return {"engine": self.name, "ok": True, "version": self.version()}
+		except Exception as e:
+			return {"engine": self.name, "ok": False, "error": str(e)}
+
+	def close(self) -> None:
+		pass
+
+
+class TesserocrEngine:
+	"""A pool of initialized Tesseract API handles, shared by the threads of one process.
+
+	Handles are created on demand up to ``size`` and checked out one per image, so language data
+	is loaded once per handle and images never touch disk. A handle that raises is discarded (it
+	may be in a bad state) and one that reaches OCR_ENGINE_MAX_USES is recycled; either way a fresh
+	one is created on the next checkout. tesserocr releases the GIL while recognizing, so threads
+	OCR in parallel.
+	"""
+
+	name = 'tesserocr'
+
+	def __init__(self, size: int, lang: str = OCR_LANG):
+		self.size = max(1, size)
+		self.lang = lang
+		self._idle: "queue.LifoQueue[List[Any]]" = queue.LifoQueue()  # most recently used first: warm caches
+		self._lock = threading.Lock()
+		self._created = 0
+		# fail fast if tessdata is missing, and keep that first handle
+		self._idle.put(self._new())
+
+	def _new(self) -> List[Any]:
+		with self._lock:
+			self._created += 1
+		try:
+			return [tesserocr.PyTessBaseAPI(lang=self.lang), 0]
+		except Exception:
+			with self._lock:
+				self._created -= 1
+			raise
+
+	def _discard(self, slot: List[Any], reason: str) -> None:
+		with self._lock:
+			self._created -= 1
+		ENGINE_RESTARTS.inc(reason=reason)
+		try:
+			slot[0].End()
+		except Exception:
+			pass
+
+	@contextmanager
+	def _engine(self) -> Iterator[Any]:
+		try:
+			slot = self._idle.get_nowait()
+		except queue.Empty:
+			with self._lock:
+				grow = self._created < self.size
+			if grow:
+				slot = self._new()
+			else:
+				t0 = time.perf_counter()
+				try:
+					slot = self._idle.get(timeout=OCR_ENGINE_TIMEOUT_SEC)
+				except queue.Empty:
+					raise RuntimeError(f"no OCR engine free after {OCR_ENGINE_TIMEOUT_SEC:.0f}s")
+				ENGINE_WAIT_SECONDS.observe(time.perf_counter() - t0)
+		try:
+			yield slot[0]
+		except Exception:
+			ENGINE_CALLS.inc(engine=self.name, result='error')
+			self._discard(slot, 'error')
+			raise
+		ENGINE_CALLS.inc(engine=self.name, result='ok')
+		slot[1] += 1
+		if slot[1] >= OCR_ENGINE_MAX_USES:
+			self._discard(slot, 'recycled')
+		else:
+			self._idle.put(slot)
+
+	def image_to_string(self, img: Image.Image) -> str:
+		with self._engine() as api:
+			api.SetImage(img)
+			return api.GetUTF8Text() or ''
+
+	def image_to_data(self, img: Image.Image) -> Dict[str, List[Any]]:
+		RIL = tesserocr.RIL
+		out: Dict[str, List[Any]] = {k: [] for k in DATA_KEYS}
+		with self._engine() as api:
+			api.SetImage(img)
+			api.Recognize()
+			it = api.GetIterator()
+			block = par = line = 0
+			while it is not None:
+				if it.IsAtBeginningOf(RIL.BLOCK):
+					block, par, line = block + 1, 0, 0
+				if it.IsAtBeginningOf(RIL.PARA):
+					par, line = par + 1, 0
+				if it.IsAtBeginningOf(RIL.TEXTLINE):
+					line += 1
+				box = it.BoundingBox(RIL.WORD)
+				if box is not None:
+					x0, y0, x1, y1 = box
+					for k, v in (("text", it.GetUTF8Text(RIL.WORD) or ''), ("conf", it.Confidence(RIL.WORD)),
+							("block_num", block), ("par_num", par), ("line_num", line),
+							("left", x0), ("top", y0), ("width", x1 - x0), ("height", y1 - y0)):
+						out[k].append(v)
+				if not it.Next(RIL.WORD):
+					break
+		return out
+
+	def version(self) -> str:
+		# "tesseract 5.3.0\n leptonica-1.82.0 ..." -> "5.3.0"
+		first = tesserocr.tesseract_version().split('\n', 1)[0].split()
+		return first[-1] if first else 'unknown'
+
+	def health(self) -> Dict[str, Any]:
+		"""Recognize a blank image on a pooled handle; a broken handle is replaced by the check itself."""
+		t0 = time.perf_counter()
+		try:
+			self.image_to_string(Image.new('L', (64, 32), 255))
+			ok, error = True, None
+		except Exception as e:
+			ok, error = False, str(e)
+		with self._lock:
+			created = self._created
+		out = {"engine": self.name, "ok": ok, "version": self.version(), "size": self.size, "created": created,
+			"idle": self._idle.qsize(), "checkMs": round((time.perf_counter() - t0) * 1000, 1)}
+		if error:
+			out["error"] = error
+		return out
+
+	def close(self) -> None:
+		while True:
+			try:
+				slot = self._idle.get_nowait()
+			except queue.Empty:
+				return
+			self._discard(slot, 'closed')
+
+
+def _pool_size() -> int:
+	if multiprocessing.parent_process() is not None:
+		return 1  # an OCR pool worker handles one page at a time
+	return OCR_ENGINE_POOL or os.cpu_count() or 1
+
+
+def _create_engine():
+	if OCR_ENGINE in ('auto', 'tesserocr'):
+		if tesserocr is not None:
+			try:
+				engine = TesserocrEngine(_pool_size())
+				logger.info("Using resident tesserocr engines (up to %d, lang=%s)", engine.size, OCR_LANG)
+				return engine
+			except Exception as e:
+				logger.warning("tesserocr could not initialize (%s); falling back to pytesseract", e)
+		elif OCR_ENGINE == 'tesserocr':
+			logger.warning("OCR_ENGINE=tesserocr but tesserocr is not installed; falling back to pytesseract")
+	if pytesseract is not None:
+		return PytesseractEngine()
+	logger.warning("No OCR engine available (install pytesseract or tesserocr)")
+	return None
+
+
+_engine = None
+_engine_ready = False
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+	"""This process's OCR engine (created on first use), or None when no OCR library is installed."""
+	global _engine, _engine_ready
+	if not _engine_ready:
+		with _engine_lock:
+			if not _engine_ready:
+				_engine = _create_engine()
+				_engine_ready = True
+	return _engine
+
+
+def close_engine() -> None:
+	global _engine, _engine_ready
+	with _engine_lock:
+		if _engine is not None:
+			_engine.close()
+		_engine, _engine_ready = None, False
+
+
+atexit.register(close_engine)
+
+
+def tesseract_version() -> str | None:
+	"""Version of the Tesseract behind the active engine, or None if it cannot run."""
+	engine = get_engine()
+	if engine is None:
+		return None
+	try:
+		return engine.version()
+	except Exception:
+		return None
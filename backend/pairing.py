@@ -0,0 +1,117 @@
+import os
+import re
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from pymongo import DESCENDING, ReturnDocument
+from rapidfuzz import fuzz
+
+from blobstore import blob_names
+
+logger = logging.getLogger('pairing')
+
+# best candidate must reach this score to be paired automatically
+AUTO_PAIR_MIN_SCORE = float(os.getenv('AUTO_PAIR_MIN_SCORE', '80'))
+# most recent open POs sharing a vendor trigram that are scored per lookup
+AUTO_PAIR_CANDIDATE_LIMIT = int(os.getenv('AUTO_PAIR_CANDIDATE_LIMIT', '500'))
+
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9]')
+_PO_PREFIX_RE = re.compile(r'^po(?=\d)')
+_VENDOR_NOISE_RE = re.compile(r'[^a-z0-9 ]+')
+_SPACES_RE = re.compile(r'\s+')
+
+# fields of a po_index entry a lookup needs to score and pair it
+_CANDIDATE_PROJECTION = {"orderId": 1, "orderKey": 1, "vendor": 1, "vendorNorm": 1, "po.total": 1, "po.date": 1, "createdAt": 1}
+
+
+def normalize_order_id(order_id: str | None) -> str:
+	"""'PO-0042', 'po 42' and '42' all index as '42'."""
+	key = _PO_PREFIX_RE.sub('', _NON_ALNUM_RE.sub('', (order_id or '').lower()))
+	return key.lstrip('0') or key
+
+
+def normalize_vendor(vendor: str | None) -> str:
+	return _SPACES_RE.sub(' ', _VENDOR_NOISE_RE.sub(' ', (vendor or '').lower())).strip()
+
+
+def vendor_grams(vendor_norm: str) -> List[str]:
+	"""Character trigrams of the padded vendor name (the fuzzy lookup keys)."""
+	if not vendor_norm:
+		return []
+	padded = f" {vendor_norm} "
+	return sorted({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+class PoIndex:
+	"""Persistent index of parsed POs for pairing invoices that arrive without one.
+
+	Each ``po_index`` entry keeps the parsed PO plus two lookup keys backed by Mongo indexes:
+	the normalized ``orderKey`` (exact lookup) and the vendor's trigrams (multikey, fuzzy
+	lookup). A lookup touches only index-selected entries and scores at most
+	AUTO_PAIR_CANDIDATE_LIMIT of them, so its cost does not grow with the number of open POs.
+	"""
+
+	def __init__(self, db, name: str = 'po_index'):
+		self.coll = db[name]
+
+	def add(self, po_data: Dict[str, Any], blobs: Dict[str, Any] | None = None, source_name: str = '') -> Dict[str, Any]:
+		"""Index a parsed PO; re-ingesting the same order id replaces the open entry."""
+		vendor_norm = normalize_vendor(po_data.get("vendor"))
+		entry = {
+			"orderId": po_data.get("orderId") or '',
+			"orderKey": normalize_order_id(po_data.get("orderId")),
+			"vendor": po_data.get("vendor") or '',
+			"vendorNorm": vendor_norm,
+			"vendorGrams": vendor_grams(vendor_norm),
+			"po": {k: v for k, v in po_data.items() if k != "raw"},
+			"blobs": blobs or {},
+			"artifacts": blob_names(blobs),
+			"sourceName": source_name,
+			"status": "open",
+			"createdAt": datetime.now(timezone.utc),
+		}
+		if entry["orderKey"]:
+			return self.coll.find_one_and_replace(
+				{"orderKey": entry["orderKey"], "status": "open"}, entry, upsert=True, return_document=ReturnDocument.AFTER)
+		entry["_id"] = self.coll.insert_one(entry).inserted_id
+		return entry
+
+	def _score(self, inv: Dict[str, Any], cand: Dict[str, Any], order_key: str, vendor_norm: str) -> float:
+		score = 0.0
+		if order_key and cand.get("orderKey") == order_key:
+			score += 60
+		if vendor_norm and cand.get("vendorNorm"):
+			score += 0.4 * fuzz.token_sort_ratio(vendor_norm, cand["vendorNorm"])
+		po = cand.get("po") or {}
+		if inv.get("total") is not None and po.get("total") is not None and abs(inv["total"] - po["total"]) <= 0.01:
+			score += 20
+		return min(score, 100.0)
+
+	def candidates(self, inv_data: Dict[str, Any], limit: int = 5) -> List[Dict[str, Any]]:
+		"""Open POs most likely to belong to an invoice, best first, each with a ``score``."""
+		order_key = normalize_order_id(inv_data.get("orderId"))
+		vendor_norm = normalize_vendor(inv_data.get("vendor"))
+		found: Dict[Any, Dict[str, Any]] = {}
+		if order_key:
+			for c in self.coll.find({"orderKey": order_key, "status": "open"}, _CANDIDATE_PROJECTION):
+				found[c["_id"]] = c
+		grams = vendor_grams(vendor_norm)
+		if grams:
+			cursor = self.coll.find({"vendorGrams": {"$in": grams}, "status": "open"}, _CANDIDATE_PROJECTION) \
+				.sort("createdAt", DESCENDING).limit(AUTO_PAIR_CANDIDATE_LIMIT)
+			for c in cursor:
+				found.setdefault(c["_id"], c)
+		scored = [{**c, "score": self._score(inv_data, c, order_key, vendor_norm)} for c in found.values()]
+		scored.sort(key=lambda c: c["score"], reverse=True)
+		return scored[:limit]
+
+	def claim(self, po_id, verification_id=None) -> Dict[str, Any] | None:
+		"""Mark an open PO as paired; returns the full entry, or None if it was taken meanwhile."""
+		return self.coll.find_one_and_update(
+			{"_id": po_id, "status": "open"},
+			{"$set": {"status": "paired", "pairedAt": datetime.now(timezone.utc), "verificationId": verification_id}},
+			return_document=ReturnDocument.AFTER)
+
+	def attach_verification(self, po_id, verification_id) -> None:
+		self.coll.update_one({"_id": po_id}, {"$set": {"verificationId": verification_id}})
@@ -1,10 +1,44 @@
 import re
 from typing import Dict, Any, List, Tuple
 from datetime import datetime
+from functools import lru_cache
 import logging
 
+import metrics
+
 logger = logging.getLogger('parse')
 
+PARSE_DOCS = metrics.counter('parse_documents_total', 'Documents run through parse_fields')
+PARSE_LINE_ITEMS = metrics.counter('parse_line_items_total', 'Line items extracted by parse_fields')
+PARSE_MISSING = metrics.counter('parse_missing_fields_total', 'Header fields parse_fields could not find', ['field'])
+
+# --- precompiled patterns ---
+
+_MONTHS = {'jan':'01','feb':'02','mar':'03','apr':'04','may':'05','jun':'06','jul':'07','aug':'08','sep':'09','oct':'10','nov':'11','dec':'12'}
+_MONTH_DATE_RE = re.compile(r"([A-Za-z]+)\s+(\d{1,2})\s*,?\s*(\d{4})")
+# same field rules strptime applies for %d/%m/%Y and %Y/%m/%d
+_D = r"(3[01]|[12]\d|0[1-9]|[1-9]| [1-9])"
+_M = r"(1[0-2]|0[1-9]|[1-9])"
+_DMY_RE = re.compile(r"%s/%s/(\d{4})" % (_D, _M))
+_YMD_RE = re.compile(r"(\d{4})/%s/%s" % (_M, _D))
+
+_SPLIT_ALNUM_RE = re.compile(r"([A-Za-z])(\[?\d)")
+_STRIP_CHARS_RE = re.compile(r"[^A-Za-z0-9\s\.\-\(\)]")
+# line items: "[n] name qty price total"; _match_item applies this without regex backtracking
+_ITEM_RE = re.compile(r"^(?:\d+\s+)?([A-Za-z0-9\s\-\(\)]+?)\s+(\d+)\s+([\d,]*\.?\d+)\s+([\d,]*\.?\d+)\s*$")
+_NUM_RE = re.compile(r"[\d,]*\.?\d+")
+_ASCII_DIGITS = frozenset('0123456789')
+
+# all four header patterns in one alternation so the text is scanned once
+_HEADER_RE = re.compile(
+	r"\bVendor\s*[:\-]\s*(?P<vendor>.+)"
+	r"|\bInvoice\s*number\s*[:\-]\s*(?P<invoiceNo>[A-Za-z0-9\-_/\.]+)"
+	r"|\bPO\s*number\s*[:\-]\s*(?P<orderId>[A-Za-z0-9\-_/\.]+)"
+	r"|\b(?:Invoice\s*date|date\s*issued)\s*[:\-]\s*(?P<date>[A-Za-z]+\s+\d{1,2}\s*,?\s*\d{4}|\d{1,2}[\-/]\d{1,2}[\-/]\d{2,4})",
+	re.I,
+)
+
+
 # --- helpers from user style ---
 
 def _safe_float(v: Any) -> float | None:
@@ -14,74 +48,125 @@ def _safe_float(v: Any) -> float | None:
 		return None
 
 
+@lru_cache(maxsize=4096)
 def _normalize_date_str(s: str) -> str:
 	s = s.strip()
-	m = re.match(r"([A-Za-z]+)\s+(\d{1,2})\s*,?\s*(\d{4})", s)
+	m = _MONTH_DATE_RE.match(s)
 	if m:
-		mon = m.group(1)[:3].lower()
-		day = m.group(2)
-		year = m.group(3)
-		months = {'jan':'01','feb':'02','mar':'03','apr':'04','may':'05','jun':'06','jul':'07','aug':'08','sep':'09','oct':'10','nov':'11','dec':'12'}
-		mm = months.get(mon)
+		mm = _MONTHS.get(m.group(1)[:3].lower())
 		if mm:
-			return f"{day.zfill(2)}/{mm}/{year}"
-	for fmt in ["%d/%m/%Y","%Y/%m/%d","%d-%m-%Y"]:
-		try:
-			return datetime.strptime(s.replace('-', '/'), fmt).strftime('%d/%m/%Y')
-		except Exception:
-			pass
-	return ''
+			return f"{m.group(2).zfill(2)}/{mm}/{m.group(3)}"
+	s = s.replace('-', '/')
+	m = _DMY_RE.fullmatch(s)
+	if m:
+		d, mo, y = m.group(1), m.group(2), m.group(3)
+	else:
+		m = _YMD_RE.fullmatch(s)
+		if not m:
+			return ''
+		y, mo, d = m.group(1), m.group(2), m.group(3)
+	try:
+		dt = datetime(int(y), int(mo), int(d))
+	except ValueError:
+		return ''
+	return f"{dt.day:02d}/{dt.month:02d}/{dt.year}"
 
 
 def _clean_line(line: str) -> str:
-	line = re.sub(r"([A-Za-z])(\[?\d)", r"\1 \2", line)
-	line = re.sub(r"[^A-Za-z0-9\s\.\-\(\)]", "", line)
+	line = _SPLIT_ALNUM_RE.sub(r"\1 \2", line)
+	line = _STRIP_CHARS_RE.sub("", line)
 	return line.strip()
 
 
+def _match_item(cleaned: str) -> Tuple[str,int,float,float] | None:
+	"""Match a cleaned line against _ITEM_RE by splitting off its last three tokens.
+
+	In a cleaned line qty/price/total are necessarily the last three whitespace-separated tokens, so
+	the lazy name group of _ITEM_RE reduces to "everything before them" (minus an optional leading
+	row number). Equivalent to ``_ITEM_RE.search(cleaned)`` but several times faster.
+	"""
+	# every item line ends in a number; skip everything else early
+	if not cleaned or cleaned[-1] not in _ASCII_DIGITS:
+		return None
+	parts = cleaned.rsplit(None, 3)
+	if len(parts) != 4:
+		return None
+	head, qty, price, sub = parts
+	# cleaning leaves only [A-Za-z0-9 whitespace . - ( )]; '.' is the one char the name may not hold
+	if '.' in head or not qty.isdigit() or not qty.isascii() or not _NUM_RE.fullmatch(price) or not _NUM_RE.fullmatch(sub):
+		return None
+	i = 0
+	while i < len(head) and head[i] in _ASCII_DIGITS:
+		i += 1
+	if 0 < i < len(head) and head[i].isspace():
+		head = head[i:]
+	elif i == len(head):
+		# bare row number: the regex takes it as the prefix when 3+ blanks follow, leaving a blank name
+		gap = cleaned[len(head):]
+		if len(gap) - len(gap.lstrip()) >= 3:
+			head = ''
+	return (head.strip(), int(qty), _safe_float(price) or 0.0, _safe_float(sub) or 0.0)
+
+
 def _parse_items(text: str) -> List[Tuple[str,int,float,float]]:
 	items: List[Tuple[str,int,float,float]] = []
-	lines = [_clean_line(l) for l in text.splitlines() if l.strip()]
-	pat = re.compile(r"^(?:\d+\s+)?([A-Za-z0-9\s\-\(\)]+?)\s+(\d+)\s+([\d,]*\.?\d+)\s+([\d,]*\.?\d+)\s*$")
-	for ln in lines:
-		m = pat.search(ln)
-		if not m:
+	for l in text.splitlines():
+		if not l.strip():
 			continue
-		item = m.group(1).strip()
-		qty = int(m.group(2))
-		price = _safe_float(m.group(3)) or 0.0
-		sub = _safe_float(m.group(4)) or 0.0
-		items.append((item, qty, price, sub))
+		item = _match_item(_clean_line(l))
+		if item:
+			items.append(item)
 	return items
 
 
-# --- main parse ---
+def _scan_headers(text: str) -> Dict[str, str]:
+	"""First match of each header field from a single left-to-right scan of the text.
 
-def parse_fields(text: str) -> Dict[str, Any]:
-	if not text:
-		return {"vendor":"","invoiceNo":"","orderId":"","date":"","total":None,"quantities":[],"line_items":[],"raw":text}
+	Stops as soon as all four fields are found (normally within the first lines). Each search resumes
+	at the start of the previous value, so a label inside a value (e.g. after ``Vendor:``) is still seen,
+	exactly as the separate per-field searches would.
+	"""
+	found: Dict[str, str] = {}
+	search = _HEADER_RE.search
+	pos = 0
+	while len(found) < 4:
+		m = search(text, pos)
+		if not m:
+			break
+		field = m.lastgroup
+		if field not in found:
+			found[field] = m.group(field)
+		pos = m.start(field)
+	return found
 
-	vendor = ''
-	m = re.search(r"\bVendor\s*[:\-]\s*(.+)", text, re.I)
-	if m:
-		vendor = m.group(1).strip()
 
-	invoice_no = ''
-	m = re.search(r"\bInvoice\s*number\s*[:\-]\s*([A-Za-z0-9\-_/\.]+)", text, re.I)
-	if m:
-		invoice_no = m.group(1).strip()
+def scan_headers(text: str) -> Dict[str, str]:
+	"""Header fields (vendor, invoiceNo, orderId, date) as written, without parsing line items."""
+	return {k: v.strip() for k, v in _scan_headers(text).items()}
 
-	order_id = ''
-	m = re.search(r"\bPO\s*number\s*[:\-]\s*([A-Za-z0-9\-_/\.]+)", text, re.I)
-	if m:
-		order_id = m.group(1).strip()
 
-	date = ''
-	m = re.search(r"\b(Invoice\s*date|date\s*issued)\s*[:\-]\s*([A-Za-z]+\s+\d{1,2}\s*,?\s*\d{4}|\d{1,2}[\-/]\d{1,2}[\-/]\d{2,4})", text, re.I)
+def classify_line(line: str) -> str | None:
+	"""What parse_fields would take from one line: a header field name, 'item', or None."""
+	m = _HEADER_RE.search(line)
 	if m:
-		date = _normalize_date_str(m.group(2))
+		return m.lastgroup
+	return 'item' if _match_item(_clean_line(line)) else None
+
 
+# --- main parse ---
+
+def parse_fields(text: str) -> Dict[str, Any]:
+	PARSE_DOCS.inc()
+	if not text:
+		return {"vendor":"","invoiceNo":"","orderId":"","date":"","total":None,"quantities":[],"line_items":[],"raw":text}
+
+	found = _scan_headers(text)
 	items = _parse_items(text)
+	vendor = (found.get('vendor') or '').strip()
+	invoice_no = (found.get('invoiceNo') or '').strip()
+	order_id = (found.get('orderId') or '').strip()
+	date = _normalize_date_str(found['date']) if found.get('date') else ''
+
 	quantities = [q for _, q, _, _ in items]
 	total = None
 	if items:
@@ -97,5 +182,9 @@ def parse_fields(text: str) -> Dict[str, Any]:
 		"line_items": items,
 		"raw": text,
 	}
+	PARSE_LINE_ITEMS.inc(len(items))
+	for field in ("vendor", "invoiceNo", "orderId", "date"):
+		if not result[field]:
+			PARSE_MISSING.inc(field=field)
 	logger.info("parse_fields -> vendor=%s invoiceNo=%s orderId=%s date=%s total=%s items=%d", result['vendor'], result['invoiceNo'], result['orderId'], result['date'], result['total'], len(items))
 	return result
\ No newline at end of file
@@ -0,0 +1,124 @@
+import base64
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Mapping, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+# JSON shapes of stored documents, shared by the Flask app (app.py) and the async read API
+# (async_api.py) so both return identical payloads.
+
+RECORD_LIST_PROJECTION = {
+	"invoice.vendor": 1, "invoice.invoiceNo": 1, "invoice.orderId": 1, "invoice.date": 1, "invoice.total": 1,
+	"po.vendor": 1, "po.invoiceNo": 1, "po.orderId": 1,
+	"result.status": 1, "createdAt": 1,
+}
+# upper bound on /api/records ?limit= (it used to be unbounded); larger values are clamped, not rejected
+RECORDS_MAX_LIMIT = 200
+
+
+def iso(value: datetime | None) -> str | None:
+	return value.isoformat() if value else None
+
+
+def encode_cursor(d: Dict[str, Any]) -> str:
+	"""Opaque page token for a record: its (createdAt, _id) sort key."""
+	created = d["createdAt"]
+	if created.tzinfo is None:
+		created = created.replace(tzinfo=timezone.utc)
+	raw = f"{int(created.timestamp() * 1000)}:{d['_id']}"
+	return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> tuple:
+	raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+	ms, oid = raw.split(':', 1)
+	return datetime.fromtimestamp(int(ms) / 1000, timezone.utc), ObjectId(oid)
+
+
+def records_query(args: Mapping[str, str]) -> Tuple[Dict[str, Any], List[Tuple[str, int]], int, str | None, str | None]:
+	"""(filter, sort, limit, after, before) of a /api/records request; raises on a bad limit or cursor.
+
+	?after=<nextCursor> pages towards older records, ?before=<prevCursor> towards newer ones;
+	both seek on the (createdAt, _id) index so deep pages cost the same as the first.
+	"""
+	limit = min(max(int(args.get('limit', '20')), 1), RECORDS_MAX_LIMIT)
+	after = args.get('after')
+	before = args.get('before')
+	query: Dict[str, Any] = {}
+	if after or before:
+		created, oid = decode_cursor(after or before)
+		op = "$lt" if after else "$gt"
+		query = {"$or": [{"createdAt": {op: created}}, {"createdAt": created, "_id": {op: oid}}]}
+	order = DESCENDING if not before else ASCENDING
+	return query, [("createdAt", order), ("_id", order)], limit, after, before
+
+
+def records_page(docs: List[Dict[str, Any]], limit: int, after: str | None, before: str | None) -> Dict[str, Any]:
+	"""Payload of /api/records from up to ``limit + 1`` documents fetched with records_query."""
+	has_more = len(docs) > limit
+	docs = docs[:limit]
+	if before:
+		docs.reverse()
+
+	items = []
+	for d in docs:
+		inv = d.get("invoice", {})
+		po = d.get("po", {})
+		items.append({
+			"id": str(d["_id"]),
+			"vendor": (inv.get("vendor") or po.get("vendor") or ""),
+			"invoiceNo": inv.get("invoiceNo") or po.get("invoiceNo"),
+			"orderId": inv.get("orderId") or po.get("orderId"),
+			"invoiceDate": inv.get("date"),
+			"amount": inv.get("total"),
+			"status": d.get("result", {}).get("status"),
+			"createdAt": iso(d.get("createdAt")),
+		})
+	# older records remain after this page when paging forward (or whenever we came back via before)
+	more_older = has_more if not before else True
+	more_newer = has_more if before else bool(after)
+	return {
+		"items": items,
+		"nextCursor": encode_cursor(docs[-1]) if docs and more_older else None,
+		"prevCursor": encode_cursor(docs[0]) if docs and more_newer else None,
+	}
+
+
+def record_projection(with_raw: bool) -> Dict[str, int] | None:
+	return None if with_raw else {"invoice.raw": 0, "po.raw": 0}
+
+
+def raw_refs(d: Dict[str, Any]) -> Dict[str, Any]:
+	"""Blob refs of the raw OCR text a ?raw=1 detail still has to load, by side."""
+	blobs = d.get("blobs") or {}
+	return {side: blobs.get(side + "Raw") for side in ("invoice", "po") if "raw" not in (d.get(side) or {})}
+
+
+def record_detail(d: Dict[str, Any], raw: Dict[str, str | None] | None = None) -> Dict[str, Any]:
+	"""Payload of /api/records/<rid>; ``raw`` holds the text loaded for raw_refs (with ?raw=1)."""
+	blobs = d.get("blobs") or {}
+	inv, po = d.get("invoice") or {}, d.get("po") or {}
+	for side, text in (raw or {}).items():
+		(inv if side == "invoice" else po)["raw"] = text
+	return {
+		"id": str(d["_id"]),
+		"invoice": inv,
+		"po": po,
+		"result": d.get("result"),
+		"createdAt": iso(d.get("createdAt")),
+		"sources": {side: bool(blobs.get(side + "Source")) for side in ("invoice", "po")},
+	}
+
+
+def export_item(d: Dict[str, Any]) -> Dict[str, Any]:
+	return {
+		"id": str(d["_id"]),
+		"type": d.get("type"),
+		"recordCount": d.get("recordCount", 0),
+		"createdAt": iso(d.get("createdAt")),
+	}
+
+
+def user_info(user: Dict[str, Any]) -> Dict[str, Any]:
+	return {"id": str(user['_id']), "email": user['email'], "name": user.get('name', '')}
@@ -0,0 +1,79 @@
+import re
+import time
+import logging
+from typing import Dict, Any, List
+
+from ocr import ocr_uploads
+from parse import parse_fields
+from compare import compare_docs
+
+logger = logging.getLogger('pipeline')
+
+
+def _from_name(name: str, pats: List[str]) -> str:
+	for p in pats:
+		m = re.search(p, name, re.I)
+		if m:
+			return m.group(1)
+	return ''
+
+
+def fill_from_filenames(inv_data: Dict[str, Any], po_data: Dict[str, Any], inv_name: str, po_name: str) -> None:
+	"""Heuristics from file names if fields missing (mutates the parsed dicts)."""
+	if not inv_data.get('invoiceNo'):
+		inv_data['invoiceNo'] = _from_name(inv_name, [r"inv(?:oice)?[_-]?([A-Za-z0-9-_/]+)", r"([A-Za-z]{2,}-?\d+)"])
+	if not inv_data.get('orderId'):
+		inv_data['orderId'] = _from_name(inv_name, [r"po[_-]?([A-Za-z0-9-_/]+)"])
+	if not po_data.get('orderId'):
+		po_data['orderId'] = _from_name(po_name, [r"po[_-]?([A-Za-z0-9-_/]+)", r"order[_-]?id[_-]?([A-Za-z0-9-_/]+)"])
+	if not po_data.get('invoiceNo'):
+		po_data['invoiceNo'] = _from_name(po_name, [r"inv(?:oice)?[_-]?([A-Za-z0-9-_/]+)"])
+
+
+def extract_document(path: str, preprocess: str | None = None, zonal=None) -> Dict[str, Any]:
+	"""OCR and parse a single upload (an invoice or PO on its own)."""
+	(text, pages), = ocr_uploads([path], preprocess, zonal)
+	return {"text": text, "data": parse_fields(text), "ocrPages": pages}
+
+
+def run_pipeline(inv_path: str, po_path: str, inv_name: str = '', po_name: str = '', stage: Dict[str, float] | None = None, preprocess: str | None = None, zonal=None) -> Dict[str, Any]:
+	"""Images -> OCR -> parse -> compare for one saved invoice/PO pair.
+
+	Stage timestamps are written into ``stage`` (same keys verify() uses for debug timings).
+	``preprocess`` selects the OCR preprocessing engine (see ocr.PREPROCESSORS); ``zonal`` (a
+	zonal.ZonalOcr) OCRs only the header and line-item regions of known vendor layouts.
+	"""
+	stage = stage if stage is not None else {}
+
+	# pages are rendered lazily inside the OCR stage (and skipped on a cache hit), so the
+	# images stage is folded into OCR
+	stage['t_images'] = time.perf_counter()
+
+	# both documents' pages go to the OCR engine together so they share the worker pool
+	(inv_text, inv_pages), (po_text, po_pages) = ocr_uploads([inv_path, po_path], preprocess, zonal)
+	logger.info("OCR text lens inv=%d po=%d", len(inv_text or ''), len(po_text or ''))
+	# Log first few lines for quick inspection
+	logger.info("OCR inv head: %s", (inv_text or '').splitlines()[:5])
+	logger.info("OCR po head: %s", (po_text or '').splitlines()[:5])
+	stage['t_ocr'] = time.perf_counter()
+
+	inv_data = parse_fields(inv_text)
+	po_data = parse_fields(po_text)
+	logger.info("Parsed invoice fields: %s", {k: inv_data.get(k) for k in ['vendor','invoiceNo','orderId','date','total']})
+	logger.info("Parsed PO fields: %s", {k: po_data.get(k) for k in ['vendor','invoiceNo','orderId','date','total']})
+	stage['t_parse'] = time.perf_counter()
+
+	fill_from_filenames(inv_data, po_data, inv_name or '', po_name or '')
+
+	result = compare_docs(inv_data, po_data)
+	logger.info("Compare result: status=%s, discrepancies=%d", result.get('status'), len(result.get('discrepancies', [])))
+	stage['t_compare'] = time.perf_counter()
+
+	return {
+		"invoiceText": inv_text,
+		"poText": po_text,
+		"invoice": inv_data,
+		"po": po_data,
+		"result": result,
+		"ocrPages": {"invoice": inv_pages, "po": po_pages},
+	}
@@ -0,0 +1,274 @@
+"""Production server: python serve.py [--role all|api|ocr|async]
+
+Runs the app under gunicorn as worker pools, each its own gunicorn arbiter:
+
+  api  threaded workers (gthread) for the cheap JSON routes: auth, records, stats, exports, job polls
+  ocr  process workers (sync, one request each) for the OCR routes in OCR_ROUTES. Each worker OCRs
+       in its own process (OCR_PROCESSES=0), gets a long timeout and is recycled every
+       SERVE_OCR_MAX_REQUESTS requests, which bounds native OCR memory.
+  async  uvicorn workers running async_api.py (Starlette + Motor) for the read routes in
+       async_api.ASYNC_ROUTES: records, record detail, stats, export history, auth/me.
+
+A reverse proxy sends OCR_ROUTES to SERVE_OCR_PORT, ASYNC_ROUTES to SERVE_ASYNC_PORT and the
+rest to PORT (README has an nginx example). The api and ocr pools serve every route, so either
+one alone is a complete server; the async pool is optional. With ``--role all`` (the default)
+the api and ocr pools are started, plus the async pool when uvicorn is installed, and the storage
+sweeper runs once in this launcher instead of in every worker. SIGTERM/SIGINT stop everything gracefully: workers finish
+in-flight requests and queued verifications within SERVE_GRACEFUL_TIMEOUT_SEC.
+
+Every pool has several worker processes, so metrics are written to METRICS_MULTIPROC_DIR (a fresh
+temporary directory unless set) and /api/metrics on any pool merges all of them.
+
+Without gunicorn (e.g. on Windows) the app runs on Werkzeug's threaded server instead.
+"""
+import os
+import sys
+import time
+import signal
+import argparse
+import shutil
+import tempfile
+import subprocess
+import logging
+from typing import Any, Dict, List
+
+from dotenv import load_dotenv
+
+try:
+	from gunicorn.app.base import BaseApplication  # type: ignore
+except Exception:  # pragma: no cover
+	BaseApplication = None  # type: ignore
+
+logger = logging.getLogger('serve')
+
+load_dotenv()
+
+SERVE_HOST = os.getenv('SERVE_HOST', '0.0.0.0')
+PORT = int(os.getenv('PORT', '5000'))
+SERVE_OCR_PORT = int(os.getenv('SERVE_OCR_PORT', '5001'))
+# api pool: processes x threads per process
+SERVE_API_WORKERS = int(os.getenv('SERVE_API_WORKERS', '2'))
+SERVE_API_THREADS = int(os.getenv('SERVE_API_THREADS', '16'))
+SERVE_API_TIMEOUT_SEC = int(os.getenv('SERVE_API_TIMEOUT_SEC', '60'))
+# ocr pool: concurrent OCR requests (one per process); 0 = one per CPU
+SERVE_OCR_WORKERS = int(os.getenv('SERVE_OCR_WORKERS', '0'))
+SERVE_OCR_TIMEOUT_SEC = int(os.getenv('SERVE_OCR_TIMEOUT_SEC', '300'))
+# an OCR worker is replaced after this many requests (0 = never)
+SERVE_OCR_MAX_REQUESTS = int(os.getenv('SERVE_OCR_MAX_REQUESTS', '200'))
+# async pool: event-loop processes (each serves many concurrent reads)
+SERVE_ASYNC_PORT = int(os.getenv('SERVE_ASYNC_PORT', '5002'))
+SERVE_ASYNC_WORKERS = int(os.getenv('SERVE_ASYNC_WORKERS', '2'))
+SERVE_GRACEFUL_TIMEOUT_SEC = int(os.getenv('SERVE_GRACEFUL_TIMEOUT_SEC', '60'))
+
+# path patterns (nginx/PCRE) the proxy routes to the ocr pool
+OCR_ROUTES = (
+	r'^/api/verify(/batch|/auto)?$',
+	r'^/api/pos$',
+	r'^/api/records/[^/]+/pages/',
+)
+
+ROLES = ('api', 'ocr', 'async')
+
+
+def _has_uvicorn() -> bool:
+	try:
+		import uvicorn  # type: ignore  # noqa: F401
+		return True
+	except Exception:
+		return False
+
+
+def _role_env(role: str) -> Dict[str, str]:
+	"""Environment defaults a pool's workers start with (explicit settings win)."""
+	if role == 'ocr':
+		# the sync worker is the OCR process; a nested OCR pool per worker would oversubscribe the CPUs
+		return {"OCR_PROCESSES": "0"}
+	return {}
+
+
+def _options(role: str) -> Dict[str, Any]:
+	common = {
+		"graceful_timeout": SERVE_GRACEFUL_TIMEOUT_SEC,
+		"worker_exit": _worker_exit,
+		# workers import the app after fork: no Mongo client, OCR engine or thread crosses a fork
+		"preload_app": False,
+		"accesslog": os.getenv('SERVE_ACCESS_LOG') or None,
+	}
+	if role == 'async':
+		# the app's lifespan closes its clients; app.shutdown_app is for the Flask pools
+		common["worker_exit"] = _async_worker_exit
+		return {**common,
+			"bind": f"{SERVE_HOST}:{SERVE_ASYNC_PORT}",
+			"proc_name": "invosync-async",
+			"worker_class": "uvicorn.workers.UvicornWorker",
+			"workers": max(1, SERVE_ASYNC_WORKERS),
+			"timeout": SERVE_API_TIMEOUT_SEC,
+			"keepalive": 5,
+		}
+	if role == 'api':
+		return {**common,
+			"bind": f"{SERVE_HOST}:{PORT}",
+			"proc_name": "invosync-api",
+			"worker_class": "gthread",
+			"workers": max(1, SERVE_API_WORKERS),
+			"threads": max(1, SERVE_API_THREADS),
+			"timeout": SERVE_API_TIMEOUT_SEC,
+			"keepalive": 5,
+		}
+	return {**common,
+		"bind": f"{SERVE_HOST}:{SERVE_OCR_PORT}",
+		"proc_name": "invosync-ocr",
+		"worker_class": "sync",
+		"workers": SERVE_OCR_WORKERS or os.cpu_count() or 1,
+		"timeout": SERVE_OCR_TIMEOUT_SEC,
+		"max_requests": SERVE_OCR_MAX_REQUESTS,
+		"max_requests_jitter": SERVE_OCR_MAX_REQUESTS // 10,
+	}
+
+
+def _worker_exit(server, worker) -> None:
+	import app as appmod  # already imported by this worker
+	import metrics
+	appmod.shutdown_app()
+	metrics.flush()
+
+
+def _async_worker_exit(server, worker) -> None:
+	import metrics
+	metrics.flush()
+
+
+def _metrics_dir() -> str | None:
+	"""Give the pools one shared, empty METRICS_MULTIPROC_DIR (inherited by every worker).
+
+	Returns the directory if it is a temporary one the caller removes when the server stops.
+	"""
+	path = os.environ.get('METRICS_MULTIPROC_DIR')
+	if not path:
+		path = os.environ['METRICS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='invosync-metrics-')
+		return path
+	import metrics
+	metrics.clear_multiprocess_dir(path)
+	return None
+
+
+if BaseApplication is not None:
+	class _Pool(BaseApplication):
+		def __init__(self, options: Dict[str, Any], role: str):
+			self.options = options
+			self.role = role
+			super().__init__()
+
+		def load_config(self):
+			for key, value in self.options.items():
+				self.cfg.set(key, value)
+
+		def load(self):
+			if self.role == 'async':
+				from async_api import app
+				return app
+			from app import create_app
+			return create_app()
+
+
+def run_role(role: str) -> None:
+	"""Run one pool in this process until it is stopped."""
+	for key, value in _role_env(role).items():
+		os.environ.setdefault(key, value)
+	tmp = None if os.environ.get('INVOSYNC_LAUNCHED') else _metrics_dir()
+	try:
+		if BaseApplication is None:
+			if role == 'async':
+				_run_uvicorn()
+			else:
+				_run_werkzeug(PORT if role == 'api' else SERVE_OCR_PORT)
+			return
+		_Pool(_options(role), role).run()
+	finally:
+		if tmp:
+			shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _run_uvicorn() -> None:
+	import uvicorn  # type: ignore
+	uvicorn.run('async_api:app', host=SERVE_HOST, port=SERVE_ASYNC_PORT, workers=max(1, SERVE_ASYNC_WORKERS),
+		timeout_graceful_shutdown=SERVE_GRACEFUL_TIMEOUT_SEC)
+
+
+def _run_werkzeug(port: int) -> None:
+	from werkzeug.serving import run_simple
+	from app import create_app, shutdown_app
+
+	def interrupt(signum, _frame):
+		raise KeyboardInterrupt
+
+	logger.warning("gunicorn is not installed; serving with Werkzeug's threaded server (one process)")
+	signal.signal(signal.SIGTERM, interrupt)
+	try:
+		run_simple(SERVE_HOST, port, create_app(), threaded=True, use_reloader=False, use_debugger=False)
+	except KeyboardInterrupt:
+		pass
+	finally:
+		shutdown_app()
+
+
+def run_all() -> int:
+	"""Start both pools as child processes and supervise them; returns the exit code."""
+	if BaseApplication is None:
+		run_role('api')
+		return 0
+	tmp = _metrics_dir()
+	# swept here, once; the pools share this launcher's metrics directory
+	env = dict(os.environ, STORAGE_SWEEP_INTERVAL_SEC='0', INVOSYNC_LAUNCHED='1')
+	roles = [r for r in ROLES if r != 'async' or _has_uvicorn()]
+	if 'async' not in roles:
+		logger.warning("uvicorn is not installed; the read routes stay on the api pool")
+	procs: List[subprocess.Popen] = [
+		subprocess.Popen([sys.executable, os.path.abspath(__file__), '--role', role], env=env) for role in roles]
+	stopping = []
+
+	def stop(signum, _frame):
+		stopping.append(signum)
+
+	signal.signal(signal.SIGTERM, stop)
+	signal.signal(signal.SIGINT, stop)
+	import app as appmod
+	appmod.storage.start()
+	logger.info("Serving: api pool on :%d, ocr pool on :%d%s (pids %s)", PORT, SERVE_OCR_PORT,
+		f", async pool on :{SERVE_ASYNC_PORT}" if 'async' in roles else '', [p.pid for p in procs])
+	code = 0
+	while not stopping:
+		exited = [p for p in procs if p.poll() is not None]
+		if exited:
+			logger.error("Pool pid %d exited with %s; stopping the server", exited[0].pid, exited[0].returncode)
+			code = 1
+			break
+		time.sleep(0.5)
+	for p in procs:
+		if p.poll() is None:
+			p.send_signal(signal.SIGTERM)  # gunicorn: graceful shutdown
+	deadline = time.monotonic() + SERVE_GRACEFUL_TIMEOUT_SEC + 10
+	for p in procs:
+		try:
+			p.wait(timeout=max(0.1, deadline - time.monotonic()))
+		except subprocess.TimeoutExpired:
+			logger.warning("Pool pid %d did not stop in time; killing it", p.pid)
+			p.kill()
+	appmod.storage.stop()
+	if tmp:
+		shutil.rmtree(tmp, ignore_errors=True)
+	return code
+
+
+def main():
+	logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s %(name)s: %(message)s')
+	ap = argparse.ArgumentParser()
+	ap.add_argument('--role', choices=('all',) + ROLES, default='all')
+	args = ap.parse_args()
+	if args.role == 'all':
+		sys.exit(run_all())
+	run_role(args.role)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,211 @@
+import os
+import sys
+import time
+import threading
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List
+
+from pymongo import DESCENDING, ReplaceOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger('stats')
+
+# how long /api/stats may serve the in-process copy before re-reading the counters
+STATS_CACHE_TTL_SEC = float(os.getenv('STATS_CACHE_TTL_SEC', '5'))
+# how long the process materializing the counters may take before another one takes over (and
+# how long the others wait for it at startup)
+STATS_REBUILD_LEASE_SEC = float(os.getenv('STATS_REBUILD_LEASE_SEC', '600'))
+STATUSES = ("matched", "partial", "mismatch")
+
+GLOBAL_ID = "global"
+# marker document: who is materializing the counters and when they were last rebuilt
+META_ID = "meta"
+
+
+def _status(doc: Dict[str, Any]) -> str:
+	status = (doc.get("result") or {}).get("status")
+	return status if status in STATUSES else "other"
+
+
+def _vendor(doc: Dict[str, Any]) -> str:
+	inv = doc.get("invoice") or {}
+	po = doc.get("po") or {}
+	return (inv.get("vendor") or po.get("vendor") or "").strip()
+
+
+def _day(created: datetime | None) -> str | None:
+	return created.strftime('%Y-%m-%d') if created else None
+
+
+def _counter_ids(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+	"""Counter documents one verification contributes to: global, its day and its vendor."""
+	out = [{"_id": GLOBAL_ID, "kind": "global", "key": None}]
+	day = _day(doc.get("createdAt"))
+	if day:
+		out.append({"_id": f"day:{day}", "kind": "day", "key": day})
+	vendor = _vendor(doc)
+	out.append({"_id": f"vendor:{vendor.lower()}", "kind": "vendor", "key": vendor})
+	return out
+
+
+def summary_payload(doc: Dict[str, Any]) -> Dict[str, Any]:
+	"""Payload of /api/stats from the global counter document."""
+	last = doc.get("lastCreatedAt")
+	return {
+		"matched": doc.get("matched", 0),
+		"discrepancies": doc.get("partial", 0) + doc.get("mismatch", 0),
+		"pending": 0,
+		"lastExport": last.isoformat() if last else None,
+	}
+
+
+class StatsStore:
+	"""Materialized dashboard counters kept next to ``verifications``.
+
+	Each counter document holds per-status counts (``matched``, ``partial``, ``mismatch``,
+	``other``), ``total`` and ``lastCreatedAt``. There is one global document plus per-day and
+	per-vendor rollups. Writers ``$inc`` them as verifications are saved; ``summary()`` reads
+	the global document through a short in-process TTL cache so /api/stats never scans the
+	collection. ``rebuild()`` recomputes everything from ``verifications``; ``materialize()``
+	does that once per deployment, at startup, recorded in the ``meta`` document.
+	"""
+
+	def __init__(self, db, source: str = 'verifications', name: str = 'stats_counters', ttl: float = STATS_CACHE_TTL_SEC):
+		self.source = db[source]
+		self.counters = db[name]
+		self.ttl = ttl
+		self._lock = threading.Lock()
+		self._cached: Dict[str, Any] | None = None
+		self._cached_at = 0.0
+
+	def invalidate(self) -> None:
+		with self._lock:
+			self._cached = None
+
+	def record(self, docs: Iterable[Dict[str, Any]]) -> None:
+		"""Count newly inserted verifications (one bulk upsert per call)."""
+		ops = []
+		for doc in docs:
+			status = _status(doc)
+			created = doc.get("createdAt")
+			for ident in _counter_ids(doc):
+				update: Dict[str, Any] = {
+					"$inc": {status: 1, "total": 1},
+					"$setOnInsert": {"kind": ident["kind"], "key": ident["key"]},
+				}
+				if created:
+					update["$max"] = {"lastCreatedAt": created}
+				ops.append(UpdateOne({"_id": ident["_id"]}, update, upsert=True))
+		if ops:
+			self.counters.bulk_write(ops, ordered=False)
+		self.invalidate()
+
+	def reset(self) -> None:
+		"""Drop all counters (the collection they mirror was cleared)."""
+		self.counters.delete_many({"_id": {"$ne": META_ID}})
+		self.invalidate()
+
+	def rebuild(self) -> int:
+		"""Recompute every counter from the source collection; returns the number of verifications.
+
+		Counters are replaced in place (and ones nothing counts any more deleted), so concurrent
+		readers never see them missing and concurrent rebuilds cannot collide.
+		"""
+		before = {d["_id"] for d in self.counters.find({"_id": {"$ne": META_ID}}, {"_id": 1})}
+		rows: Dict[str, Dict[str, Any]] = {}
+		projection = {"result.status": 1, "invoice.vendor": 1, "po.vendor": 1, "createdAt": 1}
+		n = 0
+		for doc in self.source.find({}, projection).batch_size(1000):
+			n += 1
+			status = _status(doc)
+			created = doc.get("createdAt")
+			for ident in _counter_ids(doc):
+				row = rows.setdefault(ident["_id"], {**ident, **{s: 0 for s in STATUSES}, "other": 0, "total": 0, "lastCreatedAt": None})
+				row[status] += 1
+				row["total"] += 1
+				if created and (row["lastCreatedAt"] is None or created > row["lastCreatedAt"]):
+					row["lastCreatedAt"] = created
+		if rows:
+			self.counters.bulk_write([ReplaceOne({"_id": k}, row, upsert=True) for k, row in rows.items()], ordered=False)
+		gone = list(before - rows.keys())
+		if gone:
+			self.counters.delete_many({"_id": {"$in": gone}})
+		self.counters.update_one({"_id": META_ID}, {"$set": {"kind": "meta", "rebuiltAt": datetime.now(timezone.utc)}}, upsert=True)
+		self.invalidate()
+		logger.info("Rebuilt stats counters from %d verifications (%d counter docs)", n, len(rows))
+		return n
+
+	def _materialized(self) -> bool:
+		return self.counters.find_one({"_id": META_ID, "rebuiltAt": {"$ne": None}}, {"_id": 1}) is not None
+
+	def materialize(self, wait: float = STATS_REBUILD_LEASE_SEC) -> bool:
+		"""Build the counters from existing verifications once; True if this process built them.
+
+		Called at startup, before the process counts new verifications. The process that claims
+		the ``meta`` document rebuilds; the others wait up to ``wait`` seconds for it, so the
+		rebuild does not replace counts they add meanwhile. Counters written before the first
+		materialization (by a release without it) are replaced by the rebuild.
+		"""
+		if self._materialized():
+			return False
+		now = datetime.now(timezone.utc)
+		stale = now - timedelta(seconds=STATS_REBUILD_LEASE_SEC)
+		try:
+			self.counters.find_one_and_update(
+				{"_id": META_ID, "rebuiltAt": None, "$or": [{"claimedAt": None}, {"claimedAt": {"$lt": stale}}]},
+				{"$set": {"kind": "meta", "claimedAt": now}}, upsert=True)
+		except DuplicateKeyError:
+			# claimed by another process (or just rebuilt): wait for it
+			deadline = time.monotonic() + wait
+			while time.monotonic() < deadline:
+				if self._materialized():
+					return False
+				time.sleep(0.5)
+			logger.warning("Stats counters still not materialized after %.0fs; continuing", wait)
+			return False
+		self.rebuild()
+		return True
+
+	def _global(self) -> Dict[str, Any]:
+		return self.counters.find_one({"_id": GLOBAL_ID}) or {}
+
+	def summary(self) -> Dict[str, Any]:
+		"""Payload of /api/stats, served from the TTL cache when fresh."""
+		now = time.monotonic()
+		with self._lock:
+			if self._cached is not None and now - self._cached_at < self.ttl:
+				return self._cached
+		out = summary_payload(self._global())
+		with self._lock:
+			self._cached = out
+			self._cached_at = now
+		return out
+
+	def rollups(self, kind: str, limit: int = 30) -> List[Dict[str, Any]]:
+		"""Per-day (newest first) or per-vendor (largest first) counters."""
+		sort = [("key", DESCENDING)] if kind == "day" else [("total", DESCENDING)]
+		items = []
+		for d in self.counters.find({"kind": kind}).sort(sort).limit(limit):
+			last = d.get("lastCreatedAt")
+			items.append({
+				"key": d.get("key"),
+				"total": d.get("total", 0),
+				**{s: d.get(s, 0) for s in STATUSES},
+				"lastCreatedAt": last.isoformat() if last else None,
+			})
+		return items
+
+
+if __name__ == '__main__':
+	# python stats.py rebuild
+	from pymongo import MongoClient
+	from dotenv import load_dotenv
+
+	logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s %(name)s: %(message)s')
+	load_dotenv()
+	if sys.argv[1:] != ['rebuild']:
+		print("usage: python stats.py rebuild")
+		sys.exit(2)
+	client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/futurix'))
+	StatsStore(client.get_default_database()).rebuild()
@@ -0,0 +1,259 @@
+import os
+import sys
+import time
+import shutil
+import threading
+import logging
+from typing import Any, Dict, Iterable, List, Tuple
+
+import metrics
+from blobstore import blob_names
+from uploads import content_path
+
+logger = logging.getLogger('storage')
+
+# seconds between background sweeps; 0 disables the sweeper (POST /api/admin/storage/sweep still runs one)
+STORAGE_SWEEP_INTERVAL_SEC = int(os.getenv('STORAGE_SWEEP_INTERVAL_SEC', '900'))
+# uploads, batch files and rendered pages unused for this long are deleted; records keep theirs in the blob store
+STORAGE_RETENTION_HOURS = float(os.getenv('STORAGE_RETENTION_HOURS', '72'))
+# size budget of UPLOAD_DIR; beyond it the least recently used files go first. 0 = no quota
+STORAGE_UPLOAD_QUOTA_MB = int(os.getenv('STORAGE_UPLOAD_QUOTA_MB', '10240'))
+# nothing younger than this is deleted: queued jobs may still read an upload, a new blob may not be referenced yet
+STORAGE_MIN_AGE_SEC = int(os.getenv('STORAGE_MIN_AGE_SEC', '3600'))
+
+# upload parts being received (uploads.py) and per-batch working directories, under UPLOAD_DIR
+TMP_DIRNAME = '.tmp'
+BATCH_DIRNAME = 'batches'
+
+DELETED_FILES = metrics.counter('storage_deleted_files_total', 'Files deleted by the storage sweeper or record deletion', ['area', 'reason'])
+DELETED_BYTES = metrics.counter('storage_deleted_bytes_total', 'Bytes freed by the storage sweeper or record deletion', ['area'])
+SWEEP_SECONDS = metrics.histogram('storage_sweep_seconds', 'Duration of storage sweeps')
+
+
+def batch_dir(upload_dir: str, batch_id: str) -> str:
+	"""Working directory of one batch: <upload_dir>/batches/<id[:2]>/<id>."""
+	return os.path.join(upload_dir, BATCH_DIRNAME, batch_id[:2], batch_id)
+
+
+def _unlink(path: str) -> bool:
+	try:
+		os.remove(path)
+		return True
+	except FileNotFoundError:
+		return False
+
+
+class StorageManager:
+	"""Lifecycle of files on disk: the upload scratch area and blobs no record references.
+
+	Uploads, extracted batch files and rendered pages in ``upload_dir`` are working copies (a
+	record keeps its sources and text in the blob store), so they are deleted once unused for
+	the retention period and, above the quota, least recently used first (a repeat upload
+	refreshes the mtime). Blobs are shared by content between verifications and indexed POs,
+	which list the names they use in ``artifacts``; a blob is deleted only when no document
+	lists it any more.
+	"""
+
+	def __init__(self, db, blob_store, upload_dir: str, retention_sec: float = STORAGE_RETENTION_HOURS * 3600,
+			quota_bytes: int = STORAGE_UPLOAD_QUOTA_MB * 1024 * 1024, min_age_sec: int = STORAGE_MIN_AGE_SEC):
+		self.db = db
+		self.blob_store = blob_store
+		self.upload_dir = upload_dir
+		self.retention_sec = retention_sec
+		self.quota_bytes = quota_bytes
+		self.min_age_sec = min_age_sec
+		self.referrers = [db['verifications'], db['po_index']]
+		self._sweep_lock = threading.Lock()
+		self._stopping = threading.Event()
+		self._thread: threading.Thread | None = None
+		self.upload_bytes = 0  # at the last sweep
+
+	def _referenced(self, name: str) -> bool:
+		return any(coll.find_one({"artifacts": name}, {"_id": 1}) is not None for coll in self.referrers)
+
+	def _untracked(self) -> bool:
+		"""Whether documents written before artifact tracking exist (blob GC must wait for a backfill)."""
+		query = {"blobs": {"$exists": True}, "artifacts": {"$exists": False}}
+		return any(coll.find_one(query, {"_id": 1}) is not None for coll in self.referrers)
+
+	def _delete_blob(self, name: str, size: int, reason: str) -> bool:
+		if not self.blob_store.delete(name):
+			return False
+		DELETED_FILES.inc(area='blobs', reason=reason)
+		if size:
+			DELETED_BYTES.inc(size, area='blobs')
+		return True
+
+	def release(self, names: Iterable[str]) -> Dict[str, int]:
+		"""Delete the named blobs (and matching uploads) that no document references any more.
+
+		Like the sweeper, this leaves anything younger than ``min_age_sec`` alone: a request may have
+		just (re)written the blob for a document it has not inserted yet. The sweeper collects those
+		later if they stay unreferenced.
+		"""
+		out = {"blobs": 0, "uploads": 0}
+		cutoff = time.time() - self.min_age_sec
+		for name in set(names):
+			if self._referenced(name):
+				continue
+			mtime = self.blob_store.modified(name)
+			if mtime is not None and mtime < cutoff and self._delete_blob(name, 0, 'released'):
+				out["blobs"] += 1
+			# a source blob and its upload share the content hash
+			path = content_path(self.upload_dir, name[:64], name[64:])
+			try:
+				st = os.stat(path)
+			except FileNotFoundError:
+				continue
+			if st.st_mtime < cutoff and _unlink(path):
+				DELETED_FILES.inc(area='uploads', reason='released')
+				DELETED_BYTES.inc(st.st_size, area='uploads')
+				out["uploads"] += 1
+		return out
+
+	def delete_records(self, query: Dict[str, Any]) -> Dict[str, int]:
+		"""Delete verifications matching ``query`` together with the files only they used."""
+		names = set()
+		batches = set()
+		for d in self.db['verifications'].find(query, {"artifacts": 1, "blobs": 1, "batchId": 1}):
+			names.update(d.get("artifacts") or blob_names(d.get("blobs")))
+			if d.get("batchId"):
+				batches.add(d["batchId"])
+		deleted = self.db['verifications'].delete_many(query).deleted_count
+		out = {"deleted": deleted, **self.release(names)}
+		for batch_id in batches:
+			shutil.rmtree(batch_dir(self.upload_dir, batch_id), ignore_errors=True)
+		logger.info("Deleted %d verifications, %d blobs, %d uploads", deleted, out["blobs"], out["uploads"])
+		return out
+
+	def _sweep_uploads(self, now: float) -> Dict[str, int]:
+		entries: List[Tuple[float, int, str]] = []
+		for dirpath, _, files in os.walk(self.upload_dir):
+			for name in files:
+				p = os.path.join(dirpath, name)
+				try:
+					st = os.stat(p)
+				except FileNotFoundError:
+					continue
+				entries.append((st.st_mtime, st.st_size, p))
+		total = sum(size for _, size, _ in entries)
+		out = {"files": len(entries), "deleted": 0, "freedBytes": 0}
+
+		def drop(size: int, p: str, reason: str) -> None:
+			nonlocal total
+			if _unlink(p):
+				DELETED_FILES.inc(area='uploads', reason=reason)
+				DELETED_BYTES.inc(size, area='uploads')
+				out["deleted"] += 1
+				out["freedBytes"] += size
+				total -= size
+
+		keep = []
+		for mtime, size, p in entries:
+			if now - mtime > max(self.retention_sec, self.min_age_sec):
+				drop(size, p, 'retention')
+			else:
+				keep.append((mtime, size, p))
+		if self.quota_bytes:
+			keep.sort()
+			for mtime, size, p in keep:
+				if total <= self.quota_bytes or now - mtime < self.min_age_sec:
+					break
+				drop(size, p, 'quota')
+		self._prune_dirs()
+		self.upload_bytes = total
+		out["bytes"] = total
+		return out
+
+	def _prune_dirs(self) -> None:
+		keep = {self.upload_dir, os.path.join(self.upload_dir, TMP_DIRNAME), os.path.join(self.upload_dir, BATCH_DIRNAME)}
+		for dirpath, dirnames, files in os.walk(self.upload_dir, topdown=False):
+			if dirpath not in keep and not dirnames and not files:
+				try:
+					os.rmdir(dirpath)
+				except OSError:
+					pass  # a file arrived meanwhile
+
+	def _sweep_blobs(self, now: float) -> Dict[str, int]:
+		out = {"checked": 0, "deleted": 0, "freedBytes": 0}
+		if self._untracked():
+			logger.warning("Documents without 'artifacts' exist; skipping blob cleanup until `python storage.py backfill` runs")
+			out["skipped"] = 1
+			return out
+		for name, size in self.blob_store.names(now - self.min_age_sec):
+			out["checked"] += 1
+			if not self._referenced(name) and self._delete_blob(name, size, 'orphan'):
+				out["deleted"] += 1
+				out["freedBytes"] += size
+		return out
+
+	def sweep(self) -> Dict[str, Any]:
+		"""One pass over uploads and blobs; concurrent calls in a process are serialized."""
+		with self._sweep_lock:
+			t0 = time.perf_counter()
+			now = time.time()
+			report: Dict[str, Any] = {"uploads": self._sweep_uploads(now)}
+			try:
+				report["blobs"] = self._sweep_blobs(now)
+			except Exception as e:
+				logger.exception("Blob cleanup failed: %s", e)
+				report["blobs"] = {"error": str(e)}
+			elapsed = time.perf_counter() - t0
+			SWEEP_SECONDS.observe(elapsed)
+			report["ms"] = int(elapsed * 1000)
+			logger.info("Storage sweep: %s", report)
+			return report
+
+	def _run(self, interval: float) -> None:
+		while not self._stopping.wait(interval):
+			try:
+				self.sweep()
+			except Exception as e:
+				logger.exception("Storage sweep failed: %s", e)
+
+	def start(self, interval: float = STORAGE_SWEEP_INTERVAL_SEC) -> None:
+		"""Sweep every ``interval`` seconds on a daemon thread (no-op if 0 or already running)."""
+		if interval <= 0 or self._thread is not None:
+			return
+		self._stopping.clear()
+		self._thread = threading.Thread(target=self._run, args=(interval,), name='storage-sweeper', daemon=True)
+		self._thread.start()
+		logger.info("Storage sweeper every %ds (retention %.0fh, quota %d MB)", interval, self.retention_sec / 3600, self.quota_bytes // (1024 * 1024))
+
+	def stop(self) -> None:
+		self._stopping.set()
+		if self._thread is not None:
+			self._thread.join(timeout=5)
+			self._thread = None
+
+
+def backfill_artifacts(db, batch_size: int = 500) -> int:
+	"""List blob names in ``artifacts`` on documents written before it existed; returns docs updated."""
+	n = 0
+	for name in ('verifications', 'po_index'):
+		coll = db[name]
+		for d in coll.find({"artifacts": {"$exists": False}}, {"blobs": 1}).batch_size(batch_size):
+			coll.update_one({"_id": d["_id"]}, {"$set": {"artifacts": blob_names(d.get("blobs"))}})
+			n += 1
+	logger.info("Backfilled artifacts on %d documents", n)
+	return n
+
+
+if __name__ == '__main__':
+	# python storage.py backfill|sweep
+	from pymongo import MongoClient
+	from dotenv import load_dotenv
+	from blobstore import get_blob_store
+
+	logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s %(name)s: %(message)s')
+	load_dotenv()
+	if sys.argv[1:] not in (['backfill'], ['sweep']):
+		print("usage: python storage.py backfill|sweep")
+		sys.exit(2)
+	client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/futurix'))
+	db = client.get_default_database()
+	if sys.argv[1] == 'backfill':
+		backfill_artifacts(db)
+	else:
+		upload_dir = os.getenv('UPLOAD_DIR', os.path.join(os.path.dirname(__file__), 'uploads'))
+		StorageManager(db, get_blob_store(db), upload_dir).sweep()
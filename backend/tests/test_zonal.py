@@ -0,0 +1,123 @@
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+import ocr  # noqa: E402
+import zonal  # noqa: E402
+from parse import parse_fields  # noqa: E402
+
+LINE_PITCH = 20
+
+LEARNED = [
+	"Vendor: Acme Supplies",
+	"Invoice number: INV-1",
+	"Invoice date: 05/01/2024",
+	"12 Main Street",
+	"Springfield",
+	"Phone 555",
+	"Ship to: Warehouse",
+	"Attn Receiving",
+	"Widget 2 3.00 6.00",
+	"Gadget 1 4.50 4.50",
+	"Thank you",
+	"Page 1",
+]
+
+
+class FakeEngine:
+	"""Reads a page given as a list of text lines; crops are the line indices they cover."""
+
+	def __init__(self, page):
+		self.page = page
+
+	def image_to_string(self, img):
+		return '\n'.join(self.page[i] for i in img)
+
+	def image_to_data(self, img):
+		n = len(self.page)
+		return {"text": self.page, "block_num": [1] * n, "par_num": [1] * n, "line_num": list(range(n)),
+			"top": [i * LINE_PITCH for i in range(n)], "height": [12] * n}
+
+
+@pytest.fixture
+def page(monkeypatch):
+	"""Point zonal OCR at a fake page; returns a setter for the page's lines."""
+	engine = FakeEngine([])
+	monkeypatch.setattr(ocr, 'get_engine', lambda: engine)
+	monkeypatch.setattr(zonal, 'detect_lines', lambda img: [(i * LINE_PITCH, i * LINE_PITCH + 12, 10, 500) for i in range(len(engine.page))])
+	monkeypatch.setattr(zonal, '_crop', lambda img, lines: [l[0] // LINE_PITCH for l in lines])
+	monkeypatch.setattr(zonal, 'OCR_ZONAL_HEADER_LINES', 2)
+
+	def set_page(lines):
+		engine.page = lines
+	return set_page
+
+
+@pytest.fixture
+def zocr(page):
+	z = zonal.ZonalOcr(mongomock.MongoClient().db)
+	page(LEARNED)
+	text, outcome, _ = z._first_page(None)
+	assert outcome == 'no_template'
+	tpl = z.template('acme supplies')
+	assert (tpl["headerLines"], tpl["tableStart"], tpl["footerLines"]) == (3, 8, 2)
+	assert tpl["fields"] == ["date", "invoiceNo", "vendor"]
+	return z
+
+
+def test_same_layout_skips_address_lines(zocr, page):
+	page(LEARNED)
+	text, outcome, _ = zocr._first_page(None)
+	assert outcome == 'zonal'
+	assert "12 Main Street" not in text
+	assert len(parse_fields(text)["line_items"]) == 2
+
+
+def test_table_moved_up_reads_every_item(zocr, page):
+	page(LEARNED[:5] + ["Widget 2 3.00 6.00", "Gadget 1 4.50 4.50", "Sprocket 3 1.00 3.00", "Bolt 4 0.25 1.00"] + LEARNED[10:])
+	text, outcome, _ = zocr._first_page(None)
+	assert outcome == 'zonal'
+	fields = parse_fields(text)
+	assert [i[0] for i in fields["line_items"]] == ["Widget", "Gadget", "Sprocket", "Bolt"]
+	assert fields["date"] == "05/01/2024"
+	assert zocr.template('acme supplies')["tableStart"] == 5
+
+
+def test_header_field_moved_down_falls_back(zocr, page):
+	page(LEARNED[:2] + LEARNED[3:5] + [LEARNED[2]] + LEARNED[5:])
+	text, outcome, _ = zocr._first_page(None)
+	assert outcome == 'fallback'
+	assert parse_fields(text)["date"] == "05/01/2024"
+	assert zocr.template('acme supplies')["headerLines"] == 5
+
+
+def test_cached_first_page_is_not_read_as_zonal(monkeypatch):
+	class Cache:
+		def get_document(self, h, fp):
+			return None
+
+		def get_pages(self, h, fp, n):
+			return ["Vendor: Acme Supplies"] + [None] * (n - 1)
+
+		def put_page(self, *args):
+			pass
+
+		def put_manifest(self, *args):
+			pass
+
+	calls = []
+
+	def ocr_documents(docs, preprocess, zonal=None):
+		calls.append(([len(refs) for refs in docs], zonal))
+		return [('', [{"source": ocr._ref_label(r), "text": "page", "ms": 0, "error": None} for r in refs]) for refs in docs]
+
+	monkeypatch.setattr(ocr, 'get_cache', lambda: Cache())
+	monkeypatch.setattr(ocr, 'get_engine', lambda: FakeEngine([]))
+	monkeypatch.setattr(ocr, 'ocr_config_fingerprint', lambda preprocess, zonal=False: 'fp')
+	monkeypatch.setattr(ocr, 'file_sha256', lambda path: path)
+	monkeypatch.setattr(ocr, 'page_refs_from_upload', lambda path: [(path, i) for i in range(3)])
+	monkeypatch.setattr(ocr, 'ocr_documents', ocr_documents)
+	zocr = object()
+	(text, pages), = ocr.ocr_uploads(['a.pdf'], zonal=zocr)
+	assert calls == [([2], None)]
+	assert text.splitlines() == ["Vendor: Acme Supplies", "page", "page"]
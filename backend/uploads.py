@@ -0,0 +1,126 @@
+import os
+import hashlib
+import tempfile
+import logging
+from typing import Any, Iterable
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+import metrics
+
+logger = logging.getLogger('uploads')
+
+MB = 1024 * 1024
+# largest single uploaded document / zip archive, and largest multipart request body
+UPLOAD_MAX_FILE_MB = int(os.getenv('UPLOAD_MAX_FILE_MB', '64'))
+UPLOAD_MAX_ARCHIVE_MB = int(os.getenv('UPLOAD_MAX_ARCHIVE_MB', '1024'))
+UPLOAD_MAX_REQUEST_MB = int(os.getenv('UPLOAD_MAX_REQUEST_MB', '1100'))
+ARCHIVE_EXTS = {'.zip'}
+# parts are written here while the request is parsed; same filesystem as UPLOAD_DIR so finalizing is a rename
+UPLOAD_TMP_DIR = os.path.join(os.getenv('UPLOAD_DIR', os.path.join(os.path.dirname(__file__), 'uploads')), '.tmp')
+
+UPLOADS = metrics.counter('uploads_total', 'Uploaded files kept, by result (stored or deduplicated)', ['result'])
+UPLOAD_BYTES = metrics.counter('upload_bytes_total', 'Bytes received in uploaded files')
+
+
+class HashingUpload:
+	"""File part of a multipart body, written straight to a temp file while it is hashed and sized.
+
+	Werkzeug writes each chunk here as it parses the request, so an upload is never held in
+	memory or copied; ``finalize`` renames it to its content-addressed path. Reads, seeks etc.
+	go to the underlying file, so it also works as a normal FileStorage stream.
+	"""
+
+	def __init__(self, tmp_dir: str, limit: int):
+		os.makedirs(tmp_dir, exist_ok=True)
+		fd, self.tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix='.part')
+		self._f = os.fdopen(fd, 'w+b')
+		self._hash = hashlib.sha256()
+		self.size = 0
+		self.limit = limit
+		self.final_path: str | None = None
+
+	def write(self, data: bytes) -> int:
+		self.size += len(data)
+		if self.limit and self.size > self.limit:
+			self.close()
+			raise RequestEntityTooLarge(f"file exceeds {self.limit // MB} MB")
+		self._hash.update(data)
+		return self._f.write(data)
+
+	def __getattr__(self, name: str) -> Any:
+		return getattr(self._f, name)
+
+	@property
+	def sha256(self) -> str:
+		return self._hash.hexdigest()
+
+	def finalize(self, path: str) -> bool:
+		"""Move the upload to ``path``; returns False if identical bytes were already there."""
+		self._f.close()
+		self.final_path = path
+		if os.path.exists(path):
+			os.remove(self.tmp_path)
+			os.utime(path)  # last use, for storage.py's LRU eviction
+			return False
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		os.replace(self.tmp_path, path)
+		return True
+
+	def close(self) -> None:
+		"""Release the file; a part that was never finalized (failed or unused request) is deleted."""
+		self._f.close()
+		if self.final_path is None:
+			try:
+				os.remove(self.tmp_path)
+			except FileNotFoundError:
+				pass
+
+
+class UploadRequest(Request):
+	"""Flask request whose multipart file parts stream to disk through HashingUpload."""
+
+	# the app points this at its own UPLOAD_DIR (read after .env is loaded)
+	tmp_dir = UPLOAD_TMP_DIR
+
+	def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+		ext = os.path.splitext(filename or '')[1].lower()
+		limit = (UPLOAD_MAX_ARCHIVE_MB if ext in ARCHIVE_EXTS else UPLOAD_MAX_FILE_MB) * MB
+		spool = HashingUpload(self.tmp_dir, limit)
+		self.__dict__.setdefault('_upload_spools', []).append(spool)
+		return spool
+
+	def close(self) -> None:
+		super().close()
+		for spool in self.__dict__.get('_upload_spools', []):
+			spool.close()
+
+
+def content_path(dest: str, sha256: str, ext: str) -> str:
+	"""<dest>/<first two hex chars>/<sha256><ext>; see ocr_cache.file_sha256."""
+	return os.path.join(dest, sha256[:2], sha256 + ext)
+
+
+def store_upload(file, dest: str, allowed_exts: Iterable[str]) -> str:
+	"""Keep an uploaded FileStorage under its content hash in ``dest`` and return the path.
+
+	Identical bytes map to the same path, so a repeat upload costs no disk and every hash-keyed
+	cache (OCR, blobs) hits. Raises ValueError for a disallowed extension.
+	"""
+	name = file.filename or 'upload'
+	ext = os.path.splitext(name)[1].lower()
+	if ext not in allowed_exts:
+		raise ValueError('Unsupported file type: ' + ext)
+	spool = file.stream
+	if not isinstance(spool, HashingUpload):
+		# not parsed by UploadRequest (e.g. a FileStorage built by hand): hash while copying
+		spool = HashingUpload(UploadRequest.tmp_dir, 0)
+		for chunk in iter(lambda: file.stream.read(MB), b''):
+			spool.write(chunk)
+	path = content_path(dest, spool.sha256, ext)
+	stored = spool.finalize(path)
+	UPLOADS.inc(result='stored' if stored else 'deduplicated')
+	UPLOAD_BYTES.inc(spool.size)
+	logger.info("Upload %s (%d bytes) %s as %s", name, spool.size, 'stored' if stored else 'deduplicated', os.path.basename(path))
+	return path
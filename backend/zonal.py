@@ -0,0 +1,315 @@
+import os
+import time
+import threading
+import bisect
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image
+from pymongo import ReturnDocument
+
+try:
+	import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+	np = None  # type: ignore
+
+import ocr
+import metrics
+from ocr import PageRef
+from parse import scan_headers, classify_line
+from pairing import normalize_vendor
+
+logger = logging.getLogger('zonal')
+
+# Default for ?zonal= on the verify/ingest endpoints
+OCR_ZONAL = os.getenv('OCR_ZONAL', '0') == '1'
+# text lines OCR'd from the top of page 1 to read the vendor before a template is chosen
+OCR_ZONAL_HEADER_LINES = int(os.getenv('OCR_ZONAL_HEADER_LINES', '6'))
+# how long a process may reuse a template (or its absence) before re-reading it
+OCR_ZONAL_TEMPLATE_TTL_SEC = float(os.getenv('OCR_ZONAL_TEMPLATE_TTL_SEC', '60'))
+# pixels of margin around each zone crop
+ZONE_PAD = 6
+TEMPLATE_PROJECTION = {"headerLines": 1, "tableStart": 1, "footerLines": 1, "fields": 1}
+
+ZONAL_PAGES = metrics.counter('ocr_zonal_pages_total', 'First pages OCR\'d in zonal mode, by outcome', ['outcome'])
+
+# a detected text line: (top, bottom, left, right) in page pixels
+Line = Tuple[int, int, int, int]
+
+def _otsu(gray: "np.ndarray") -> int:
+	hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+	w0 = np.cumsum(hist)
+	w1 = w0[-1] - w0
+	m = np.cumsum(hist * np.arange(256))
+	mu0 = m / np.maximum(w0, 1)
+	mu1 = (m[-1] - m) / np.maximum(w1, 1)
+	return int(np.argmax(w0 * w1 * (mu0 - mu1) ** 2))
+
+
+def detect_lines(img: Image.Image, min_height: int = 4) -> List[Line]:
+	"""Text lines from the horizontal ink profile, top to bottom (no OCR; a few ms per page).
+
+	Expects roughly upright pages; skewed scans should go through the 'cv' preprocessor first.
+	"""
+	gray = np.asarray(img.convert('L'))
+	ink = gray <= _otsu(gray)
+	width = ink.shape[1]
+	rows = np.concatenate(([False], ink.sum(axis=1) > max(2, width * 0.004), [False]))
+	edges = np.flatnonzero(rows[1:] != rows[:-1])
+	lines: List[Line] = []
+	for y0, y1 in zip(edges[::2], edges[1::2]):
+		if y1 - y0 < min_height:
+			continue
+		cols = np.flatnonzero(ink[y0:y1].sum(axis=0) > 1)
+		if cols.size:
+			lines.append((int(y0), int(y1), int(cols[0]), int(cols[-1]) + 1))
+	return lines
+
+
+def _crop(img: Image.Image, lines: List[Line]) -> Image.Image:
+	return img.crop((
+		max(0, min(l[2] for l in lines) - ZONE_PAD),
+		max(0, lines[0][0] - ZONE_PAD),
+		min(img.width, max(l[3] for l in lines) + ZONE_PAD),
+		min(img.height, lines[-1][1] + ZONE_PAD),
+	))
+
+
+def _ocr_lines(img: Image.Image) -> List[Tuple[str, int]]:
+	"""Full-page OCR as (line text, vertical centre) in reading order, from Tesseract's own layout."""
+	d = ocr.get_engine().image_to_data(img)
+	groups: Dict[Tuple[int, int, int], List[Any]] = {}
+	for i, word in enumerate(d["text"]):
+		if not str(word).strip():
+			continue
+		g = groups.setdefault((d["block_num"][i], d["par_num"][i], d["line_num"][i]), [[], 1 << 30, 0])
+		g[0].append(str(word))
+		g[1] = min(g[1], d["top"][i])
+		g[2] = max(g[2], d["top"][i] + d["height"][i])
+	return [(' '.join(words), (top + bottom) // 2) for words, top, bottom in groups.values()]
+
+
+def learn_zones(lines: List[Line], ocr_lines: List[Tuple[str, int]]) -> Dict[str, int] | None:
+	"""Zone template (in detected-line indices) from a full-page pass, or None if the layout does not fit.
+
+	``headerLines`` covers every header field, ``tableStart`` is the first item line and
+	``footerLines`` counts the lines after the last item. Tables grow with the item count, so the
+	table zone is anchored to both ends of the page rather than given a fixed height. ``fields``
+	names the header fields found, which zonal text must then contain too.
+	"""
+	if not lines:
+		return None
+	centres = [(l[0] + l[1]) // 2 for l in lines]
+	headers: List[int] = []
+	items: List[int] = []
+	fields = set()
+	for text, cy in ocr_lines:
+		kind = classify_line(text)
+		if kind is None:
+			continue
+		i = bisect.bisect_left(centres, cy)
+		if i == len(lines) or (i > 0 and cy - centres[i - 1] < centres[i] - cy):
+			i -= 1
+		if kind == 'item':
+			items.append(i)
+		else:
+			headers.append(i)
+			fields.add(kind)
+	if not headers or not items:
+		return None
+	header_lines, table_start = max(headers) + 1, min(items)
+	if table_start < header_lines:
+		return None
+	return {"headerLines": header_lines, "tableStart": table_start, "footerLines": len(lines) - max(items) - 1,
+		"fields": sorted(fields)}
+
+
+def _complete(text: str, fields=()) -> bool:
+	"""Whether zonal text has what verification needs.
+
+	That is vendor, date, a document number and items, plus every header field in ``fields`` (those
+	the vendor's full pages had when the template was learned).
+	"""
+	found = scan_headers(text)
+	if not found.get("vendor") or not found.get("date") or not (found.get("invoiceNo") or found.get("orderId")):
+		return False
+	if any(not found.get(f) for f in fields):
+		return False
+	return any(classify_line(l) == 'item' for l in text.splitlines())
+
+
+class ZonalOcr:
+	"""Region-of-interest OCR driven by per-vendor zone templates (``ocr_templates``).
+
+	Page 1 is OCR'd in pieces: the first OCR_ZONAL_HEADER_LINES text lines (to read the vendor),
+	then, if that vendor has a template, the rest of its header and its line-item table, with one
+	sentinel line above and below the table. When a sentinel reads as an item (or, above, a header
+	field) the layout has shifted: the lines beyond it are OCR'd too and the template widened.
+	Other addresses, notes, footers and margins are not OCR'd. When a vendor has no template, or
+	the zones miss a field parse_fields needs, the page falls back to a full-page pass whose word
+	boxes (re)learn the vendor's template. Later pages are always OCR'd whole.
+	"""
+
+	def __init__(self, db, name: str = 'ocr_templates', ttl: float = OCR_ZONAL_TEMPLATE_TTL_SEC):
+		self.coll = db[name]
+		self.ttl = ttl
+		self._cache: Dict[str, Tuple[float, Dict[str, Any] | None]] = {}
+		self._lock = threading.Lock()
+
+	def template(self, vendor_norm: str) -> Dict[str, Any] | None:
+		now = time.monotonic()
+		with self._lock:
+			hit = self._cache.get(vendor_norm)
+		if hit is not None and now - hit[0] < self.ttl:
+			return hit[1]
+		doc = self.coll.find_one({"_id": vendor_norm}, TEMPLATE_PROJECTION)
+		with self._lock:
+			self._cache[vendor_norm] = (now, doc)
+		return doc
+
+	def learn(self, vendor: str, zones: Dict[str, int]) -> None:
+		"""Merge one sample into the vendor's template; zones only ever widen across samples."""
+		vendor_norm = normalize_vendor(vendor)
+		if not vendor_norm:
+			return
+		doc = self.coll.find_one_and_update(
+			{"_id": vendor_norm},
+			{
+				"$max": {"headerLines": zones["headerLines"]},
+				"$min": {"tableStart": zones["tableStart"], "footerLines": zones["footerLines"]},
+				"$addToSet": {"fields": {"$each": zones.get("fields", [])}},
+				"$set": {"vendor": vendor, "updatedAt": datetime.now(timezone.utc)},
+				"$inc": {"samples": 1},
+			},
+			projection=TEMPLATE_PROJECTION,
+			upsert=True, return_document=ReturnDocument.AFTER)
+		with self._lock:
+			self._cache[vendor_norm] = (time.monotonic(), doc)
+		logger.info("Learned OCR zones for %s: %s", vendor, doc)
+
+	def _widen(self, vendor_norm: str, update: Dict[str, Any]) -> None:
+		"""Apply a $min/$max widening (from a sentinel line) to the vendor's template."""
+		doc = self.coll.find_one_and_update(
+			{"_id": vendor_norm}, update, projection=TEMPLATE_PROJECTION, return_document=ReturnDocument.AFTER)
+		with self._lock:
+			self._cache[vendor_norm] = (time.monotonic(), doc)
+
+	def _record(self, vendor_norm: str, outcome: str) -> None:
+		ZONAL_PAGES.inc(outcome=outcome)
+		if vendor_norm and outcome in ('zonal', 'fallback'):
+			self.coll.update_one({"_id": vendor_norm}, {"$inc": {"hits" if outcome == 'zonal' else "misses": 1}})
+
+	def _full_page(self, img: Image.Image, lines: List[Line]) -> str:
+		ocr_lines = _ocr_lines(img)
+		text = '\n'.join(t for t, _ in ocr_lines)
+		vendor = scan_headers(text).get("vendor")
+		zones = learn_zones(lines, ocr_lines) if vendor else None
+		if zones:
+			self.learn(vendor, zones)
+		return text
+
+	def _first_page(self, img: Image.Image) -> Tuple[str, str, int]:
+		"""(text, outcome, tesseract calls) for an already preprocessed first page."""
+		engine = ocr.get_engine()
+		lines = detect_lines(img)
+		if not lines:
+			self._record('', 'no_lines')
+			return engine.image_to_string(img) or '', 'no_lines', 1
+		head = lines[:OCR_ZONAL_HEADER_LINES]
+		parts = [engine.image_to_string(_crop(img, head)) or '']
+		vendor_norm = normalize_vendor(scan_headers(parts[0]).get("vendor"))
+		tpl = self.template(vendor_norm) if vendor_norm else None
+		if tpl is None:
+			outcome = 'no_template' if vendor_norm else 'no_vendor'
+			text = self._full_page(img, lines)
+			self._record(vendor_norm, outcome)
+			return text, outcome, 2
+		done = len(head)
+		if tpl["headerLines"] > done:
+			parts.append(engine.image_to_string(_crop(img, lines[done:tpl["headerLines"]])) or '')
+			done = tpl["headerLines"]
+		# one line on each side of the table is included as a sentinel: if it reads as an item (or,
+		# above, a header field) the table or header has moved into the lines the template skips
+		start = max(tpl["tableStart"] - 1, done)
+		end = min(len(lines), len(lines) - tpl["footerLines"] + 1)
+		table = lines[start:end]
+		if table:
+			text = engine.image_to_string(_crop(img, table)) or ''
+			rows = [l for l in text.splitlines() if l.strip()]
+			kind = classify_line(rows[0]) if rows and start > done else None
+			if kind is not None:
+				# the table starts (or a header field sits) above the learned zone: OCR the gap too
+				parts.append(engine.image_to_string(_crop(img, lines[done:start])) or '')
+				gap = [l for l in parts[-1].splitlines() if l.strip()]
+				if kind == 'item':
+					items = [i for i, l in enumerate(gap) if classify_line(l) == 'item']
+					self._widen(vendor_norm, {"$min": {"tableStart": done + items[0] if items else start}})
+				else:
+					self._widen(vendor_norm, {"$max": {"headerLines": start + 1}})
+			parts.append(text)
+			if rows and classify_line(rows[-1]) == 'item' and end < len(lines):
+				# the table runs into the learned footer: OCR the rest and shrink the footer
+				parts.append(engine.image_to_string(_crop(img, lines[end:])) or '')
+				rest = [l for l in parts[-1].splitlines() if l.strip()]
+				items = [i for i, l in enumerate(rest) if classify_line(l) == 'item']
+				self._widen(vendor_norm, {"$min": {"footerLines": len(rest) - items[-1] - 1 if items else len(rest)}})
+		text = '\n'.join(parts)
+		if _complete(text, tpl.get("fields") or ()):
+			self._record(vendor_norm, 'zonal')
+			return text, 'zonal', len(parts)
+		logger.info("Zonal OCR incomplete for %s; falling back to the full page", vendor_norm)
+		full = self._full_page(img, lines)
+		self._record(vendor_norm, 'fallback')
+		return full, 'fallback', len(parts) + 1
+
+	def ocr_document(self, refs: List[PageRef], preprocess: str = ocr.OCR_PREPROCESS) -> List[Dict[str, Any]]:
+		"""Per-page results like ocr.ocr_pages, each first page with a ``zonal`` outcome. Never raises."""
+		if not refs:
+			return []
+		if np is None:
+			return [ocr._ocr_page(r, preprocess) for r in refs]
+		t0 = time.perf_counter()
+		label = ocr._ref_label(refs[0])
+		try:
+			img = ocr.PREPROCESSORS[preprocess](ocr.load_page_image(refs[0]))
+			text, outcome, calls = self._first_page(img)
+			logger.info("Zonal OCR %s: %s, %d calls, %d chars", label, outcome, calls, len(text))
+			first = {"source": label, "text": text, "ms": int((time.perf_counter() - t0) * 1000), "error": None,
+				"zonal": {"outcome": outcome, "calls": calls}}
+		except Exception as e:
+			logger.exception("Zonal OCR failed on %s, using the full page: %s", label, e)
+			first = ocr._ocr_page(refs[0], preprocess)
+		return [first] + [ocr._ocr_page(r, preprocess) for r in refs[1:]]
+
+	def ocr_documents(self, docs: List[List[PageRef]], preprocess: str = ocr.OCR_PREPROCESS) -> List[List[Dict[str, Any]]]:
+		"""ocr_document for each document, on the OCR process pool when OCR_PROCESSES > 0.
+
+		Pool workers keep their own ZonalOcr on this collection of their process's database
+		(db.py); without a pool the documents run on threads here.
+		"""
+		pool = ocr._get_pool()
+		if pool is not None:
+			n = len(docs)
+			try:
+				return list(pool.map(_ocr_document_in_worker, docs, [preprocess] * n, [self.coll.name] * n, [self.ttl] * n))
+			except BrokenProcessPool as e:
+				logger.error("OCR process pool broken, running zonal OCR on threads: %s", e)
+				ocr.shutdown_pool()
+		with ThreadPoolExecutor(max_workers=max(1, len(docs))) as ex:
+			return list(ex.map(lambda refs: self.ocr_document(refs, preprocess), docs))
+
+
+_worker_zonal: ZonalOcr | None = None
+
+
+def _ocr_document_in_worker(refs: List[PageRef], preprocess: str, name: str, ttl: float) -> List[Dict[str, Any]]:
+	"""ZonalOcr.ocr_document in an OCR pool worker, with one template cache per worker process."""
+	global _worker_zonal
+	if _worker_zonal is None or _worker_zonal.coll.name != name:
+		import db as dbmod
+		_worker_zonal = ZonalOcr(dbmod.LazyDatabase(), name, ttl)
+	return _worker_zonal.ocr_document(refs, preprocess)